@@ -1,547 +1,616 @@
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 import json
-from fpdf import FPDF
-from typing import Optional
+from typing import Optional, Tuple
 from random import randint
 import requests
 import os
-from dotenv import load_dotenv
-import pyaudio
-import wave
-import speech_recognition as sr
-from datetime import datetime
-from gtts import gTTS
-import tempfile
-from playsound import playsound
+from datetime import date, datetime, timedelta
 import threading
+import uuid
+from concurrent.futures import Future, wait
+from functools import partial
+from gemini_scheduler import BACKGROUND, INTERACTIVE, get_scheduler
+from hedging import get_hedger
+from speech_pipeline import SpeechPipeline
+from diagnosis_cache import get_cache, make_key
+from diagnosis import build_diagnosis_payload
+from conversation import ConversationContext, Transcript
+from patient_store import get_store, normalize_patient_number
+from pdf_summary import get_pdf_renderer, render_pdf
+from task_graph import TaskGraph
+from speculation import Speculation
+from triage import (DIAGNOSIS_AFTER_TURNS, DOCTOR_ERROR_REPLY, DOCTOR_RETRY_REPLY, build_doctor_payload,
+                    diagnosis_from_response, doctor_reply, failed_diagnosis)
+from service_client import DIAGNOSIS_SERVICE_URL, get_service_client
 
-# Load environment variables
-load_dotenv()
+# Serve the text consultation only. The voice stack (voice, playback, speech backends)
+# is imported inside the functions that use it, so in this mode it is never loaded
+TEXT_ONLY = os.getenv("TEXT_ONLY", "0") == "1"
 
-# Gemini API configuration
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+# Stream doctor responses token by token and speak them sentence by sentence
+STREAM_DOCTOR_RESPONSES = os.getenv("STREAM_DOCTOR_RESPONSES", "1") == "1"
 
-# Audio recording parameters
-CHUNK = 1024
-FORMAT = pyaudio.paInt16
-CHANNELS = 1
-RATE = 44100
+# From then on, keep a speculative symptom analysis of the transcript running in the background
+SPECULATIVE_DIAGNOSIS = os.getenv("SPECULATIVE_DIAGNOSIS", "1") == "1"
 
-class AudioRecorder:
-    def __init__(self):
-        self.is_recording = False
-        self.frames = []
-        
-    def start_recording(self):
-        self.is_recording = True
-        self.frames = []
-        self.p = pyaudio.PyAudio()
-        self.stream = self.p.open(format=FORMAT,
-                                channels=CHANNELS,
-                                rate=RATE,
-                                input=True,
-                                frames_per_buffer=CHUNK)
-        
-        # Start recording in a separate thread
-        self.record_thread = threading.Thread(target=self._record)
-        self.record_thread.start()
-    
-    def _record(self):
-        while self.is_recording:
-            data = self.stream.read(CHUNK)
-            self.frames.append(data)
-    
-    def stop_recording(self):
-        self.is_recording = False
-        if hasattr(self, 'record_thread'):
-            self.record_thread.join()
-        
-        # Stop and close the stream
-        self.stream.stop_stream()
-        self.stream.close()
-        self.p.terminate()
-        
-        # Create a temporary file for the recording
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as fp:
-            temp_filename = fp.name
-            
-        # Save the recorded data as a WAV file
-        with wave.open(temp_filename, 'wb') as wf:
-            wf.setnchannels(CHANNELS)
-            wf.setsampwidth(self.p.get_sample_size(FORMAT))
-            wf.setframerate(RATE)
-            wf.writeframes(b''.join(self.frames))
-        
-        # Transcribe the recording
-        text = transcribe_audio(temp_filename)
-        os.remove(temp_filename)
-        return text
+# Fixed phrases spoken in every consultation; synthesized once and served from the TTS cache
+INITIAL_QUESTION = "Hello, I'm your AI doctor today. What brings you in today?"
+COMMON_PHRASES = [INITIAL_QUESTION]
+
+# Progress messages for the end-of-consultation tasks, shown as each one finishes
+CONSULTATION_TASK_LABELS = {
+    "diagnosis": "Diagnosis ready",
+    "save": "Consultation saved",
+    "summary": "Summary PDF ready",
+}
+
+# How long a page waits for a background PDF render before showing a placeholder
+PDF_WAIT_SECONDS = 2.0
+
+# How often a placeholder checks again for the finished PDF
+PDF_POLL_SECONDS = 1.0
+
+# How often the recording status checks whether the patient has finished speaking
+RECORDING_POLL_SECONDS = 0.3
+
+# Number of past consultations listed on the Previous Visits tab
+PREVIOUS_VISITS_LIMIT = 20
+
+# Failed patient number lookups allowed per session
+PATIENT_LOOKUP_ATTEMPTS = 5
+
+# Date inputs otherwise only reach back ten years
+EARLIEST_DOB = date(1900, 1, 1)
 
 def text_to_speech(text: str):
-    """Convert text to speech and play it"""
+    """Convert text to speech and queue it for background playback"""
+    from playback import get_playback_engine
+    from voice import synthesize_speech
+
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as fp:
-            temp_filename = fp.name
-        
-        tts = gTTS(text=text)
-        tts.save(temp_filename)
-        playsound(temp_filename)
-        os.remove(temp_filename)
+        get_playback_engine(st.session_state).enqueue(synthesize_speech(text))
     except Exception as e:
         st.error(f"Error in text-to-speech: {str(e)}")
 
-def transcribe_audio(filename):
-    """Transcribe the audio file using Google Speech Recognition"""
-    recognizer = sr.Recognizer()
-    with sr.AudioFile(filename) as source:
-        audio = recognizer.record(source)
-        try:
-            text = recognizer.recognize_google(audio)
-            return text
-        except sr.UnknownValueError:
-            return "Speech could not be recognized"
-        except sr.RequestError:
-            return "Could not request results"
-
-def get_doctor_response(conversation_history: list) -> str:
+def get_doctor_response(conversation_history: list, context: Optional[ConversationContext] = None) -> str:
     """Get AI doctor's response using Gemini API"""
-    headers = {
-        "Content-Type": "application/json"
-    }
-    
-    # Count patient responses to track conversation stage
-    patient_responses = len([entry for entry in conversation_history if entry['role'] == 'patient'])
-    
-    if patient_responses <= 2:
-        # Initial responses - ask key diagnostic questions
-        prompt = f"""You are a concise medical doctor. Based on the patient's symptoms, ask ONE critical follow-up question.
-        Focus on: severity, duration, or key distinguishing symptoms. Keep your response to 1-2 sentences maximum.
-        
-        Conversation history:
-        {[f"{'Doctor' if entry['role'] == 'doctor' else 'Patient'}: {entry['text']}" for entry in conversation_history]}
-        """
-    else:
-        # Provide diagnosis
-        prompt = f"""You are a concise medical doctor. Based on the symptoms described, provide a clear diagnosis with:
-        1. Medical term (in parentheses)
-        2. Simple explanation in everyday language
-        3. One key recommendation
-        
-        Keep the entire response under 4 short sentences. Be direct and clear.
-        
-        Conversation history:
-        {[f"{'Doctor' if entry['role'] == 'doctor' else 'Patient'}: {entry['text']}" for entry in conversation_history]}
-        """
-    
-    payload = {
-        "contents": [{
-            "parts": [{
-                "text": prompt
-            }]
-        }]
-    }
-
     try:
-        query_params = {"key": GEMINI_API_KEY}
-        response = requests.post(
-            GEMINI_API_URL,
-            params=query_params,
-            json=payload,
-            headers=headers
-        )
-        response.raise_for_status()
-        data = response.json()
-        
-        if 'candidates' in data and len(data['candidates']) > 0:
-            return data['candidates'][0]['content']['parts'][0]['text']
-        else:
-            return "I apologize, but I'm having trouble processing your response. Could you please repeat that?"
+        if DIAGNOSIS_SERVICE_URL:
+            return get_service_client().doctor_turn(conversation_history, context.id if context else None)
+        payload = build_doctor_payload(conversation_history, context)
+        # A stalled turn is re-sent (to the fallback model, if set) and the first answer wins;
+        # only the hedge skips coalescing, since sharing the stalled call would defeat it
+        data = get_hedger().call(lambda model, is_hedge: get_scheduler().generate_content(
+            payload, model, coalesce=not is_hedge))
+        return doctor_reply(data)
     except Exception as e:
-        return f"I apologize, but I'm experiencing some technical difficulties. Please try again or describe your symptoms in text."
+        return DOCTOR_ERROR_REPLY
 
-def process_symptoms(symptoms: str) -> dict:
-    """Process symptoms using Gemini API and return potential reasons and risk rating."""
-    headers = {
-        "Content-Type": "application/json"
-    }
-    
-    prompt = f"""Given these symptoms, please analyze:
-    Symptoms: {symptoms}
-    
-    Please respond in this format:
-    Potential Causes:
-    - [cause 1]
-    - [cause 2]
-    - [cause 3]
-    
-    Life-Threatening Assessment:
-    [Yes/No] - [brief explanation]
-    
-    Risk Rating: [1-10]
+def stream_doctor_response(conversation_history: list, pipeline: Optional[SpeechPipeline] = None,
+                           context: Optional[ConversationContext] = None):
+    """Yield the AI doctor's response as it streams in, feeding each chunk to a speech pipeline"""
+    received = False
+    fallback = None
+
+    try:
+        try:
+            if DIAGNOSIS_SERVICE_URL:
+                chunks = get_service_client().stream_doctor_turn(conversation_history,
+                                                                 context.id if context else None)
+            else:
+                payload = build_doctor_payload(conversation_history, context)
+                chunks = get_hedger().stream(
+                    lambda model, is_hedge: get_scheduler().stream_generate_content(payload, model))
+            for chunk in chunks:
+                received = True
+                if pipeline is not None:
+                    pipeline.feed(chunk)
+                yield chunk
+            if not received:
+                fallback = DOCTOR_RETRY_REPLY
+        except Exception as e:
+            if not received:
+                fallback = DOCTOR_ERROR_REPLY
+
+        if fallback is not None:
+            if pipeline is not None:
+                pipeline.feed(fallback)
+            yield fallback
+    finally:
+        if pipeline is not None:
+            pipeline.close()
+
+def analyze_symptoms(symptoms: str, lane: int = INTERACTIVE) -> Tuple[dict, Optional[str]]:
+    """Analyze symptoms with the Gemini API, returning the diagnosis and an error message if it failed.
+
+    Safe to call off the script thread: it never touches the Streamlit UI. Background
+    analyses pass ``lane=BACKGROUND`` so they queue behind interactive calls.
     """
-    
-    payload = {
-        "contents": [{
-            "parts": [{
-                "text": prompt
-            }]
-        }]
-    }
+    # Repeat queries are answered from the cache without calling the API
+    cache_key = make_key(symptoms)
+    cached = get_cache().get(cache_key)
+    if cached is not None:
+        return cached, None
 
     try:
-        query_params = {"key": GEMINI_API_KEY}
-        response = requests.post(
-            GEMINI_API_URL,
-            params=query_params,
-            json=payload,
-            headers=headers
-        )
-        
-        # Print response for debugging
-        print(f"Status Code: {response.status_code}")
-        print(f"Response: {response.text}")
-        
-        response.raise_for_status()
-        
-        data = response.json()
-        if 'candidates' in data and len(data['candidates']) > 0:
-            response_text = data['candidates'][0]['content']['parts'][0]['text']
-            
-            # Parse the response
-            reasons = []
-            risk_rating = 5  # Default risk rating
-            life_threatening = "No assessment available"
-            
-            sections = response_text.split('\n')
-            
-            # Extract information
-            for line in sections:
-                if line.strip().startswith('-'):
-                    reasons.append(line.strip('- ').capitalize())
-                elif 'risk rating:' in line.lower():
-                    try:
-                        risk_rating = int(''.join(filter(str.isdigit, line)))
-                    except ValueError:
-                        risk_rating = 5
-                elif 'life-threatening' in line.lower():
-                    life_threatening = line.split(':')[-1].strip()
-            
-            if not reasons:
-                reasons = ["No specific causes identified"]
-            
-            return {
-                "reasons": reasons,
-                "risk_rating": risk_rating,
-                "life_threatening": life_threatening
-            }
+        if DIAGNOSIS_SERVICE_URL:
+            diagnosis, error = get_service_client().analyze(symptoms, background=lane == BACKGROUND)
         else:
-            st.error("Unable to get a response from the AI service. Please try again.")
-            return {
-                "reasons": ["Unable to analyze symptoms. Please try again or contact support."],
-                "risk_rating": 0,
-                "life_threatening": "Assessment unavailable"
-            }
-            
+            data = get_scheduler().generate_content(build_diagnosis_payload(symptoms), lane=lane)
+            diagnosis, error = diagnosis_from_response(data)
     except requests.exceptions.RequestException as e:
-        st.error(f"Error connecting to the AI service: {str(e)}")
-        return {
-            "reasons": ["Unable to process symptoms. Please try again later."],
-            "risk_rating": 0,
-            "life_threatening": "Assessment unavailable"
-        }
+        return failed_diagnosis(e, connection=True)
     except Exception as e:
-        st.error(f"An unexpected error occurred: {str(e)}")
-        return {
-            "reasons": ["System error. Please try again or contact support."],
-            "risk_rating": 0,
-            "life_threatening": "Assessment unavailable"
-        }
+        return failed_diagnosis(e, connection=False)
+
+    if error is None:
+        get_cache().put(cache_key, diagnosis)
+    return diagnosis, error
+
+def process_symptoms(symptoms: str) -> dict:
+    """Process symptoms using Gemini API and return potential reasons and risk rating."""
+    diagnosis, error = analyze_symptoms(symptoms)
+    if error:
+        st.error(error)
+    return diagnosis
+
+def patient_symptoms(conversation_history: list) -> str:
+    """Everything the patient has said so far, as one symptom description"""
+    return " ".join([entry['text'] for entry in conversation_history if entry['role'] == 'patient'])
+
+def speculate_diagnosis(conversation_history: list):
+    """Refresh the background analysis of the transcript once the doctor is ready to diagnose"""
+    if 'speculative_diagnosis' not in st.session_state:
+        st.session_state.speculative_diagnosis = Speculation(partial(analyze_symptoms, lane=BACKGROUND))
+    patient_turns = sum(entry['role'] == 'patient' for entry in conversation_history)
+    if SPECULATIVE_DIAGNOSIS and patient_turns >= DIAGNOSIS_AFTER_TURNS:
+        st.session_state.speculative_diagnosis.update(patient_symptoms(conversation_history))
+
+def consultation_tasks(symptoms: str, kind: str, record, summary, diagnosis: Optional[Future] = None) -> TaskGraph:
+    """Diagnose, then save the consultation and render its PDF summary in parallel.
+
+    ``record(diagnosis)`` and ``summary(diagnosis)`` build the stored record and
+    the PDF content. A speculative ``diagnosis`` of the same symptoms is reused
+    if it finished without an error. One still pending is dropped and the
+    analysis is asked for again on the interactive lane, where it shares (and
+    promotes) the background call if that is already queued. The graph runs on
+    the task pool, so the caller can keep rendering and report progress while it completes.
+    """
+    patient_id = current_patient_id()
+    graph = TaskGraph()
+    if (diagnosis is not None and diagnosis.done() and not diagnosis.cancelled()
+            and diagnosis.exception() is None and not diagnosis.result()[1]):
+        graph.add_future("diagnosis", diagnosis)
+    else:
+        if diagnosis is not None:
+            diagnosis.cancel()  # only succeeds if it has not started
+        graph.add("diagnosis", analyze_symptoms, args=(symptoms,))
+    graph.add("save", lambda analysis: get_store().add_consultation(
+        patient_id, kind, record(analysis[0]), symptoms=symptoms, risk_rating=analysis[0]["risk_rating"]).result(),
+        deps=("diagnosis",))
+    graph.add("summary", lambda analysis: get_pdf_renderer().submit(summary(analysis[0])).result(),
+              deps=("diagnosis",))
+    return graph
 
-# Save patient information locally
+# Export patient information to a JSON file; records themselves live in the patient store
 def save_patient_info(data: dict, filename: str):
-    with open(filename, 'w') as file:
+    # Write to a temporary file first so a crash never leaves a half-written export
+    temp_filename = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_filename, 'w') as file:
         json.dump(data, file)
+    os.replace(temp_filename, filename)
+
+def current_patient_id() -> str:
+    """Opaque random key for this session's patient, never derived from their details"""
+    if 'patient_id' not in st.session_state:
+        st.session_state.patient_id = uuid.uuid4().hex
+    return st.session_state.patient_id
 
 # Generate PDF summary
 def generate_pdf_summary(data: dict, filename: str):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    pdf.cell(200, 10, txt="Patient History Summary", ln=True, align='C')
-    for key, value in data.items():
-        pdf.cell(200, 10, txt=f"{key}: {value}", ln=True)
-    pdf.output(filename)
-
-# Initialize session state for page navigation
-if 'page' not in st.session_state:
-    st.session_state.page = "User Info"
-
-# Multi-page app
-st.title(" AI Health Assistant")
-
-# Custom CSS
-st.markdown("""
-<style>
-    .stButton>button {
-        background-color: #2E7D32;
-        color: white;
-        border-radius: 8px;
-        padding: 0.5rem 1rem;
-        border: none;
-    }
-    .stButton>button:hover {
-        background-color: #1B5E20;
-    }
-    div.stRadio > div {
-        background-color: #F0F8F1;
-        padding: 1rem;
-        border-radius: 8px;
-    }
-    .stTextInput>div>div>input {
-        border-radius: 8px;
-    }
-    .stTextArea>div>div>textarea {
-        border-radius: 8px;
-    }
-    .main {
-        background-color: #FFFFFF;
-    }
-    .st-emotion-cache-18ni7ap {
-        background-color: #F0F8F1;
-    }
-    div[data-testid="stHeader"] {
-        background-color: #FFFFFF;
-    }
-    .css-10trblm {
-        color: #2E7D32;
-    }
-    div[data-baseweb="select"] > div {
-        border-radius: 8px;
-    }
-    /* Remove background color from slider */
-    div.stSlider > div[data-baseweb="slider"] > div {
-        background: transparent !important;
-    }
-</style>
-""", unsafe_allow_html=True)
-
-if st.session_state.page == "User Info":
+    with open(filename, 'wb') as file:
+        file.write(render_pdf(data))
+
+def show_summary_download(summary: Future, key: str):
+    """Offer the rendered summary PDF for download, polling in place while it is still rendering"""
+    # Only a box still waiting for its PDF reruns on a timer; it never reruns the page around it
+    poll = None if summary.done() else PDF_POLL_SECONDS
+    st.fragment(render_summary_download, run_every=poll)(summary, key, polling=poll is not None)
+
+def render_summary_download(summary: Future, key: str, polling: bool):
+    done, _ = wait([summary], timeout=PDF_WAIT_SECONDS)
+    if done and polling:
+        # The timer is fixed when the fragment is registered: rerun the app once to register it without one
+        st.rerun()
+    if not done:
+        st.caption("📄 Your summary PDF is still being prepared...")
+    elif summary.exception() is not None:
+        st.error(f"Error generating the summary PDF: {str(summary.exception())}")
+    else:
+        st.download_button("📄 Download Summary (PDF)", data=summary.result(), file_name="patient_summary.pdf",
+                           mime="application/pdf", key=key)
+
+def finish_recording():
+    """Transcribe the finished recording and let the doctor respond; the caller redraws the page"""
+    from playback import get_playback_engine
+    from voice import synthesize_speech
+
+    patient_response = st.session_state.recorder.stop_recording()
+    st.session_state.recording = False
+    
+    if patient_response and patient_response != "Speech could not be recognized":
+        # Add patient's response to conversation
+        st.session_state.conversation_history.append({
+            'role': 'patient',
+            'text': patient_response
+        })
+        # Analyze the transcript so far while the doctor responds; older analyses are discarded
+        speculate_diagnosis(st.session_state.conversation_history)
+        
+        # Get and speak doctor's response
+        if STREAM_DOCTOR_RESPONSES:
+            st.write("🤒 You:", patient_response)
+            st.write("👨‍⚕️ Doctor:")
+            pipeline = SpeechPipeline(synthesize_speech, get_playback_engine(st.session_state).enqueue)
+            doctor_response = st.write_stream(
+                stream_doctor_response(st.session_state.conversation_history, pipeline,
+                                       st.session_state.conversation_context))
+            # Only synthesis is awaited; playback continues in the background
+            pipeline.wait()
+            for error in pipeline.errors:
+                st.error(f"Error in text-to-speech: {str(error)}")
+        else:
+            doctor_response = get_doctor_response(st.session_state.conversation_history,
+                                                  st.session_state.conversation_context)
+        st.session_state.conversation_history.append({
+            'role': 'doctor',
+            'text': doctor_response
+        })
+        if not STREAM_DOCTOR_RESPONSES:
+            text_to_speech(doctor_response)
+
+def render_user_info_page():
     st.header("User Information")
     name = st.text_input("Enter your name:")
-    dob = st.date_input("Enter your date of birth:")
+    dob = st.date_input("Enter your date of birth:", min_value=EARLIEST_DOB, max_value="today")
     if st.button("Next"):
-        save_patient_info({"name": name, "dob": str(dob)}, "user_info.json")
+        store = get_store()
+        store.save_patient(current_patient_id(), name=name, dob=str(dob)).result()
+        st.session_state.patient_number = store.get_patient(current_patient_id())["patient_number"]
+        # Only a session that identified its patient may list their visits
+        st.session_state.patient_identified = bool(name.strip())
         st.session_state.page = "Insurance Info"
         st.rerun()
 
-elif st.session_state.page == "Insurance Info":
+    with st.expander("Returning patient? Find your record"):
+        number = st.text_input("Patient number:", key="lookup_number", placeholder="1234-5678")
+        lookup_dob = st.date_input("Date of birth:", key="lookup_dob", min_value=EARLIEST_DOB, max_value="today")
+        if st.button("Find my record"):
+            find_returning_patient(number, str(lookup_dob))
+
+def find_returning_patient(patient_number: str, dob: str):
+    """Switch this session to the patient with this number and date of birth, if there is one"""
+    attempts = st.session_state.get('lookup_attempts', 0)
+    if attempts >= PATIENT_LOOKUP_ATTEMPTS:
+        st.error("Too many attempts. Please contact the clinic to find your record.")
+        return
+    patient_id = get_store().find_patient(patient_number, dob)
+    if patient_id is None:
+        st.session_state.lookup_attempts = attempts + 1
+        st.error("No record matches that patient number and date of birth.")
+        return
+    st.session_state.patient_id = patient_id
+    st.session_state.patient_number = normalize_patient_number(patient_number)
+    st.session_state.patient_identified = True
+    st.session_state.page = "Symptoms"
+    st.rerun()
+
+def show_patient_number():
+    if st.session_state.get('patient_number'):
+        st.info(f"Your patient number is **{st.session_state.patient_number}**. "
+                "Keep it: with your date of birth it brings up your visits next time.")
+
+def render_insurance_page():
     st.header("Insurance Information")
+    show_patient_number()
     insurance_name = st.text_input("Enter your insurance name:")
     insurance_id = st.text_input("Enter your insurance ID:")
     if st.button("Next"):
-        save_patient_info({"insurance_name": insurance_name, "insurance_id": insurance_id}, "insurance_info.json")
+        get_store().save_patient(current_patient_id(), insurance_name=insurance_name, insurance_id=insurance_id)
         st.session_state.page = "Symptoms"
         st.rerun()
 
-elif st.session_state.page == "Symptoms":
-    st.header("Symptom Analysis")
+def rerun_panel():
+    """Rerun just the calling fragment, or the whole app if it ran as part of a full run"""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+def start_recording():
+    from playback import get_playback_engine
+
+    st.session_state.recording = True
+    st.session_state.pop('consultation_summary', None)
+    # Stop the doctor talking as soon as the patient starts
+    get_playback_engine(st.session_state).interrupt()
+    st.session_state.recorder.start_recording()
+
+def render_conversation_tab():
+    from voice import AudioRecorder
 
-    # Initialize conversation history if not exists
-    if 'conversation_history' not in st.session_state:
-        st.session_state.conversation_history = []
     if 'recorder' not in st.session_state:
         st.session_state.recorder = AudioRecorder()
         st.session_state.recording = False
+    if 'transcript' not in st.session_state:
+        st.session_state.transcript = Transcript()
 
-    # Add tabs for different input methods
-    tab1, tab2 = st.tabs(["💬 Talk to Doctor", "📝 Text Description"])
+    st.subheader("Have a Conversation with AI Doctor")
+    render_conversation_panel()
 
-    with tab1:
-        st.subheader("Have a Conversation with AI Doctor")
-        
-        # Display conversation history
-        for entry in st.session_state.conversation_history:
-            if entry['role'] == 'doctor':
-                st.write("👨‍⚕️ Doctor:", entry['text'])
-            else:
-                st.write("🤒 You:", entry['text'])
-        
-        # Initialize conversation if empty
-        if len(st.session_state.conversation_history) == 0:
-            initial_question = "Hello, I'm your AI doctor today. What brings you in today?"
-            st.session_state.conversation_history.append({
-                'role': 'doctor',
-                'text': initial_question
-            })
-            text_to_speech(initial_question)
+@st.fragment(run_every=RECORDING_POLL_SECONDS)
+def render_recording_status():
+    """Show the partial transcript while recording, and finish the turn once the recorder stops"""
+    recorder = st.session_state.recorder
+    if st.session_state.recording:
+        # Voice activity detection ends the turn; so does a recording thread that died on a device error
+        if recorder.is_recording and recorder.record_thread.is_alive():
+            transcriber = recorder.transcriber
+            partial = transcriber.partial_transcript() if transcriber is not None else ""
+            st.info("🎤 Recording in progress... (stops automatically when you pause)" +
+                    (f"\n\n{partial}" if partial else ""))
+            return
+        finish_recording()
+    # Rerun the app so the panel shows the new turn and this timer is dropped
+    st.rerun()
+
+@st.fragment
+def render_conversation_panel():
+    # Recording and each turn rerun only this panel, not the rest of the page
+    from playback import get_playback_engine
+
+    # Offer the summary of the consultation that just ended
+    if 'consultation_summary' in st.session_state:
+        st.success("Consultation completed! A summary has been saved.")
+        show_summary_download(st.session_state.consultation_summary, key="consultation_summary_download")
+
+    # Initialize conversation if empty
+    if len(st.session_state.conversation_history) == 0:
+        st.session_state.conversation_history.append({
+            'role': 'doctor',
+            'text': INITIAL_QUESTION
+        })
+        text_to_speech(INITIAL_QUESTION)
+
+    # Display conversation history; only turns added since the last run are formatted
+    for block in st.session_state.transcript.sync(st.session_state.conversation_history):
+        st.markdown(block)
+
+    # Report playback failures from the background engine
+    playback = get_playback_engine(st.session_state)
+    while playback.errors:
+        st.error(f"Error in text-to-speech: {str(playback.errors.pop(0))}")
+    if st.session_state.recorder.error is not None:
+        st.error(f"Recording stopped early: {str(st.session_state.recorder.error)}")
+
+    # Recording controls
+    col1, col2 = st.columns(2)
+    with col1:
+        st.button("🎤 Start Recording", disabled=st.session_state.recording, on_click=start_recording)
+
+    with col2:
+        if st.button("⏹️ Stop Recording", disabled=not st.session_state.recording):
+            finish_recording()
+            rerun_panel()
+
+    # Show recording status; it polls on its own timer so the rest of the page keeps rendering
+    if st.session_state.recording:
+        render_recording_status()
+
+    # End consultation button
+    if len(st.session_state.conversation_history) > 2:
+        if st.button("End Consultation"):
+            # Process all symptoms from the conversation
+            full_symptoms = patient_symptoms(st.session_state.conversation_history)
+            conversation = list(st.session_state.conversation_history)
+
+            # Diagnose, then save the consultation and render its summary side by side.
+            # The speculative analysis of this transcript is usually finished already.
+            speculation = st.session_state.get('speculative_diagnosis')
+            graph = consultation_tasks(
+                full_symptoms, "conversation",
+                record=lambda diagnosis: {"conversation": conversation, "diagnosis": diagnosis},
+                summary=lambda diagnosis: {"Conversation": conversation, "Final Diagnosis": diagnosis},
+                diagnosis=speculation.result_for(full_symptoms) if speculation is not None else None)
+            progress = st.progress(0.0, text="Wrapping up your consultation...")
+            for done, name in enumerate(graph.as_completed(), start=1):
+                progress.progress(done / len(graph.futures), text=CONSULTATION_TASK_LABELS[name])
+            progress.empty()
+
+            _, error = graph.result("diagnosis")
+            if error:
+                st.error(error)
+            if graph.futures["save"].exception() is not None:
+                st.error(f"Error saving the consultation: {str(graph.futures['save'].exception())}")
+            # The summary is offered for download on the next run
+            st.session_state.consultation_summary = graph.futures["summary"]
+
+            st.session_state.conversation_history = []
+            st.session_state.conversation_context.reset()
+            st.session_state.transcript.reset()
+            if speculation is not None:
+                speculation.reset()
+            # A full rerun, so Previous Visits lists the consultation just saved
             st.rerun()
-        
-        # Recording controls
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("🎤 Start Recording", disabled=st.session_state.recording):
-                st.session_state.recording = True
-                st.session_state.recorder.start_recording()
-                st.rerun()
-        
-        with col2:
-            if st.button("⏹️ Stop Recording", disabled=not st.session_state.recording):
-                patient_response = st.session_state.recorder.stop_recording()
-                st.session_state.recording = False
-                
-                if patient_response and patient_response != "Speech could not be recognized":
-                    # Add patient's response to conversation
-                    st.session_state.conversation_history.append({
-                        'role': 'patient',
-                        'text': patient_response
-                    })
-                    
-                    # Get and speak doctor's response
-                    doctor_response = get_doctor_response(st.session_state.conversation_history)
-                    st.session_state.conversation_history.append({
-                        'role': 'doctor',
-                        'text': doctor_response
-                    })
-                    text_to_speech(doctor_response)
-                    st.rerun()
-        
-        # Show recording status
-        if st.session_state.recording:
-            st.info("🎤 Recording in progress...")
-        
-        # End consultation button
-        if len(st.session_state.conversation_history) > 2:
-            if st.button("End Consultation"):
-                # Process all symptoms from the conversation
-                full_symptoms = " ".join([entry['text'] for entry in st.session_state.conversation_history if entry['role'] == 'patient'])
-                diagnosis = process_symptoms(full_symptoms)
-                
-                # Save consultation data
-                consultation_data = {
-                    "conversation": st.session_state.conversation_history,
-                    "diagnosis": diagnosis
-                }
-                save_patient_info(consultation_data, "patient_history.json")
-                
-                # Generate PDF summary
-                generate_pdf_summary({
-                    "Conversation": st.session_state.conversation_history,
-                    "Final Diagnosis": diagnosis
-                }, "patient_summary.pdf")
-                
-                st.success("Consultation completed! A summary has been saved.")
-                st.session_state.conversation_history = []
-                st.rerun()
 
-    
-    with tab2:
-        st.subheader("Describe Your Symptoms")
-        
-        # Symptom description
-        symptoms = st.text_area("Please describe your symptoms in detail:")
-        
-        # Symptom severity
-        severity = st.slider("On a scale of 1-10, how severe are your symptoms?", 1, 10, 5)
-        
-        # Duration
-        duration_unit = st.selectbox("How long have you been experiencing these symptoms?", 
-                                   ["Hours", "Days", "Weeks", "Months"])
-        duration_number = st.number_input("Number of " + duration_unit.lower(), 
-                                        min_value=1, max_value=100, value=1)
-        
-        full_description = f"{symptoms}\nSeverity: {severity}/10\nDuration: {duration_number} {duration_unit}"
-        
-        if st.button("Get Diagnosis"):
-            if symptoms:
-                diagnosis = process_symptoms(full_description)
-                
-                # Display diagnosis in a formatted box
-                st.markdown("""
-                    <style>
-                        .diagnosis-box { background-color: #f8f9fa; padding: 20px; border-radius: 10px; margin: 10px 0; }
-                        .risk-low { color: #28a745; }
-                        .risk-medium { color: #ffc107; }
-                        .risk-high { color: #dc3545; }
-                    </style>
-                """, unsafe_allow_html=True)
-                
-                st.markdown('<div class="diagnosis-box">', unsafe_allow_html=True)
-                
-                st.subheader("📋 Diagnosis Results")
-                
-                # Display potential causes with bullet points
-                st.write("**Potential Causes:**")
-                for reason in diagnosis["reasons"]:
-                    st.write(f"• {reason}")
-                
-                # Display risk assessment with color coding
-                risk_level = diagnosis["risk_rating"]
-                risk_class = "risk-high" if risk_level > 7 else "risk-medium" if risk_level > 4 else "risk-low"
-                st.markdown(f'<p><strong>Risk Level:</strong> <span class="{risk_class}">{risk_level}/10</span></p>', 
-                          unsafe_allow_html=True)
-                
-                # Display life-threatening assessment with emphasis
-                is_life_threatening = "Yes" in diagnosis["life_threatening"]
-                threat_class = "risk-high" if is_life_threatening else "risk-low"
-                st.markdown(f'<p><strong>Life-Threatening Assessment:</strong> <span class="{threat_class}">{diagnosis["life_threatening"]}</span></p>', 
-                          unsafe_allow_html=True)
-                
-                st.markdown('</div>', unsafe_allow_html=True)
-                
-                # Add scheduling section if risk is high or moderate
-                if risk_level > 4:
-                    st.markdown("""
-                        <style>
-                            .appointment-box {
-                                background-color: #e9ecef;
-                                padding: 20px;
-                                border-radius: 10px;
-                                margin: 20px 0;
-                                border-left: 5px solid #2E7D32;
-                            }
-                        </style>
-                    """, unsafe_allow_html=True)
-                    
-                    st.markdown(f"""
-                        <div class="appointment-box">
-                        <h3>📋 Appointment Details</h3>
-                        <p><strong>Doctor:</strong> Dr. AIbert</p>
-                        <p><strong>Consultation Type:</strong> Video Call</p>
-                        <p><strong>Available:</strong> Within 24 hours</p>
-                        </div>
-                    """, unsafe_allow_html=True)
-                    
-                    st.info("💡 A confirmation email will be sent with the video consultation link.")
-                    
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        if st.button("Schedule Consultation"):
-                            st.success("✅ Video consultation scheduled! Check your email for details.")
-                    with col2:
-                        if st.button("Urgent Care Locations"):
-                            st.info("🏥 Showing nearby urgent care facilities...")
-                
-                # Save the diagnosis
-                save_patient_info({
+def render_text_tab():
+    st.subheader("Describe Your Symptoms")
+
+    # Symptom description
+    symptoms = st.text_area("Please describe your symptoms in detail:")
+
+    # Symptom severity
+    severity = st.slider("On a scale of 1-10, how severe are your symptoms?", 1, 10, 5)
+
+    # Duration
+    duration_unit = st.selectbox("How long have you been experiencing these symptoms?", 
+                               ["Hours", "Days", "Weeks", "Months"])
+    duration_number = st.number_input("Number of " + duration_unit.lower(), 
+                                    min_value=1, max_value=100, value=1)
+
+    full_description = f"{symptoms}\nSeverity: {severity}/10\nDuration: {duration_number} {duration_unit}"
+
+    if st.button("Get Diagnosis"):
+        if symptoms:
+            # Saving and the PDF summary start as soon as the diagnosis lands and run while it is shown
+            st.session_state.text_diagnosis = consultation_tasks(
+                full_description, "symptoms",
+                record=lambda diagnosis: {
                     "symptoms": full_description,
                     "diagnosis": diagnosis,
                     "severity": severity,
                     "duration": f"{duration_number} {duration_unit}"
-                }, "patient_history.json")
-                
-                # Generate PDF summary
-                generate_pdf_summary({
+                },
+                summary=lambda diagnosis: {
                     "Symptoms": full_description,
                     "Diagnosis": diagnosis,
                     "Severity": f"{severity}/10",
                     "Duration": f"{duration_number} {duration_unit}"
-                }, "patient_summary.pdf")
-                
-            else:
-                st.warning("Please enter your symptoms first.")
-    
-elif st.session_state.page == "Appointment":
+                })
+        else:
+            st.session_state.pop('text_diagnosis', None)
+            st.warning("Please enter your symptoms first.")
+
+    # The last diagnosis stays on screen until the next one is requested
+    if 'text_diagnosis' in st.session_state:
+        render_diagnosis_box()
+
+@st.fragment
+def render_diagnosis_box():
+    # Scheduling buttons rerun only this box
+    graph = st.session_state.text_diagnosis
+    with st.spinner("Analyzing your symptoms..."):
+        diagnosis, error = graph.result("diagnosis")
+    if error:
+        st.error(error)
+
+    # Display diagnosis in a formatted box
+    st.markdown("""
+        <style>
+            .diagnosis-box { background-color: #f8f9fa; padding: 20px; border-radius: 10px; margin: 10px 0; }
+            .risk-low { color: #28a745; }
+            .risk-medium { color: #ffc107; }
+            .risk-high { color: #dc3545; }
+        </style>
+    """, unsafe_allow_html=True)
+
+    st.markdown('<div class="diagnosis-box">', unsafe_allow_html=True)
+
+    st.subheader("📋 Diagnosis Results")
+
+    # Display potential causes with bullet points
+    st.write("**Potential Causes:**")
+    for reason in diagnosis["reasons"]:
+        st.write(f"• {reason}")
+
+    # Display risk assessment with color coding
+    risk_level = diagnosis["risk_rating"]
+    risk_class = "risk-high" if risk_level > 7 else "risk-medium" if risk_level > 4 else "risk-low"
+    st.markdown(f'<p><strong>Risk Level:</strong> <span class="{risk_class}">{risk_level}/10</span></p>', 
+              unsafe_allow_html=True)
+
+    # Display life-threatening assessment with emphasis
+    is_life_threatening = "Yes" in diagnosis["life_threatening"]
+    threat_class = "risk-high" if is_life_threatening else "risk-low"
+    st.markdown(f'<p><strong>Life-Threatening Assessment:</strong> <span class="{threat_class}">{diagnosis["life_threatening"]}</span></p>', 
+              unsafe_allow_html=True)
+
+    st.markdown('</div>', unsafe_allow_html=True)
+
+    # Add scheduling section if risk is high or moderate
+    if risk_level > 4:
+        st.markdown("""
+            <style>
+                .appointment-box {
+                    background-color: #e9ecef;
+                    padding: 20px;
+                    border-radius: 10px;
+                    margin: 20px 0;
+                    border-left: 5px solid #2E7D32;
+                }
+            </style>
+        """, unsafe_allow_html=True)
+
+        st.markdown(f"""
+            <div class="appointment-box">
+            <h3>📋 Appointment Details</h3>
+            <p><strong>Doctor:</strong> Dr. AIbert</p>
+            <p><strong>Consultation Type:</strong> Video Call</p>
+            <p><strong>Available:</strong> Within 24 hours</p>
+            </div>
+        """, unsafe_allow_html=True)
+
+        st.info("💡 A confirmation email will be sent with the video consultation link.")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Schedule Consultation"):
+                st.success("✅ Video consultation scheduled! Check your email for details.")
+        with col2:
+            if st.button("Urgent Care Locations"):
+                st.info("🏥 Showing nearby urgent care facilities...")
+
+    # Offer the PDF summary once rendered and report a failed save
+    show_summary_download(graph.futures["summary"], key="diagnosis_summary")
+    if graph.futures["save"].exception() is not None:
+        st.error(f"Error saving the diagnosis: {str(graph.futures['save'].exception())}")
+
+def render_previous_visits_tab():
+    st.subheader("Previous Visits")
+    if not st.session_state.get('patient_identified'):
+        st.info("Enter your name on the User Information page, or find your record there with your "
+                "patient number, to see your previous visits.")
+        return
+    show_patient_number()
+    query = st.text_input("Search your visits:", placeholder="e.g. headache")
+    visits = get_store().search(patient_id=st.session_state.patient_id, text=query or None, limit=PREVIOUS_VISITS_LIMIT)
+    if not visits:
+        st.info("No previous visits found.")
+    for visit in visits:
+        diagnosis = visit["data"].get("diagnosis") or {}
+        visited = datetime.fromtimestamp(visit["created"]).strftime("%B %d, %Y %I:%M %p")
+        risk = f" — Risk {visit['risk_rating']}/10" if visit["risk_rating"] is not None else ""
+        with st.expander(f"{visited}{risk}"):
+            if visit["symptoms"]:
+                st.write("**Symptoms:**", visit["symptoms"])
+            for reason in diagnosis.get("reasons", []):
+                st.write(f"• {reason}")
+            if diagnosis.get("life_threatening"):
+                st.write("**Life-Threatening Assessment:**", diagnosis["life_threatening"])
+
+def render_symptoms_page():
+    st.header("Symptom Analysis")
+
+    # Initialize conversation history if not exists
+    if 'conversation_history' not in st.session_state:
+        st.session_state.conversation_history = []
+    if 'conversation_context' not in st.session_state:
+        st.session_state.conversation_context = ConversationContext()
+
+    # Add tabs for different input methods
+    if TEXT_ONLY:
+        text_tab, visits_tab = st.tabs(["📝 Text Description", "🗂️ Previous Visits"])
+    else:
+        talk_tab, text_tab, visits_tab = st.tabs(["💬 Talk to Doctor", "📝 Text Description", "🗂️ Previous Visits"])
+        with talk_tab:
+            render_conversation_tab()
+    with text_tab:
+        render_text_tab()
+    with visits_tab:
+        render_previous_visits_tab()
+
+def render_appointment_page():
     st.header("🗓️ Appointment Scheduled")
     
     # Generate random appointment details
@@ -552,7 +621,6 @@ elif st.session_state.page == "Appointment":
     appointment_time = f"{hour}:{minute:02d} {am_pm}"
     
     # Get tomorrow's date
-    from datetime import datetime, timedelta
     appointment_date = (datetime.now() + timedelta(days=1)).strftime("%A, %B %d, %Y")
     
     # Display appointment confirmation with styling
@@ -588,3 +656,75 @@ elif st.session_state.page == "Appointment":
         if st.button("Start Over"):
             st.session_state.page = "User Info"
             st.rerun()
+
+def main():
+    if not TEXT_ONLY:
+        from tts_cache import get_tts_cache
+
+        # Warm the speech cache with fixed phrases once per server process
+        get_tts_cache().warm_async(COMMON_PHRASES)
+
+    # Initialize session state for page navigation
+    if 'page' not in st.session_state:
+        st.session_state.page = "User Info"
+
+    # Multi-page app
+    st.title(" AI Health Assistant")
+
+    # Custom CSS
+    st.markdown("""
+    <style>
+        .stButton>button {
+            background-color: #2E7D32;
+            color: white;
+            border-radius: 8px;
+            padding: 0.5rem 1rem;
+            border: none;
+        }
+        .stButton>button:hover {
+            background-color: #1B5E20;
+        }
+        div.stRadio > div {
+            background-color: #F0F8F1;
+            padding: 1rem;
+            border-radius: 8px;
+        }
+        .stTextInput>div>div>input {
+            border-radius: 8px;
+        }
+        .stTextArea>div>div>textarea {
+            border-radius: 8px;
+        }
+        .main {
+            background-color: #FFFFFF;
+        }
+        .st-emotion-cache-18ni7ap {
+            background-color: #F0F8F1;
+        }
+        div[data-testid="stHeader"] {
+            background-color: #FFFFFF;
+        }
+        .css-10trblm {
+            color: #2E7D32;
+        }
+        div[data-baseweb="select"] > div {
+            border-radius: 8px;
+        }
+        /* Remove background color from slider */
+        div.stSlider > div[data-baseweb="slider"] > div {
+            background: transparent !important;
+        }
+    </style>
+    """, unsafe_allow_html=True)
+
+    if st.session_state.page == "User Info":
+        render_user_info_page()
+    elif st.session_state.page == "Insurance Info":
+        render_insurance_page()
+    elif st.session_state.page == "Symptoms":
+        render_symptoms_page()
+    elif st.session_state.page == "Appointment":
+        render_appointment_page()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""Private on-disk locations for patient data.
+
+Patient records and cached speech hold medical information, so by default
+they live under ``APP_DATA_DIR`` (``~/.ai_doctor``) rather than the working
+directory or the shared temp directory. Directories are created readable by
+the app's user only, and files are created with mode 0600.
+"""
+import os
+
+APP_DATA_DIR = os.getenv("APP_DATA_DIR", os.path.join(os.path.expanduser("~"), ".ai_doctor"))
+
+
+def private_dir(path: str) -> str:
+    """Create ``path`` (and its parents) for this user only if it does not exist yet, and return it"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    return path
+
+
+def private_file(path: str) -> str:
+    """Create an empty ``path`` with mode 0600 unless it already exists, and return it"""
+    private_dir(os.path.dirname(os.path.abspath(path)))
+    os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+    return path
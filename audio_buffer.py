@@ -0,0 +1,167 @@
+"""Bounded recording buffers with spill-to-disk and process-wide accounting.
+
+A recording keeps its PCM in one preallocated bytearray up to a per-session
+memory cap. Past the cap (or when the process-wide audio budget is used up) the
+buffer moves to a memory-mapped temporary file, so long recordings live in the
+page cache rather than on the Python heap. The total is bounded as a ring: once
+``max_bytes`` is reached the oldest audio is overwritten, so a forgotten
+recording cannot grow without limit in memory or on disk.
+"""
+import mmap
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from audio_processing import MAX_RECORDING_SECONDS
+
+AUDIO_SESSION_MEMORY_BYTES = int(os.getenv("AUDIO_SESSION_MEMORY_BYTES", str(2 * 1024 * 1024)))
+AUDIO_PROCESS_MEMORY_BYTES = int(os.getenv("AUDIO_PROCESS_MEMORY_BYTES", str(64 * 1024 * 1024)))
+AUDIO_SPILL_DIR = os.getenv("AUDIO_SPILL_DIR") or None
+
+_stats = {"buffers": 0, "memory_bytes": 0, "spilled_bytes": 0}
+_stats_lock = threading.Lock()
+
+
+def _account(buffers: int = 0, memory_bytes: int = 0, spilled_bytes: int = 0):
+    with _stats_lock:
+        _stats["buffers"] += buffers
+        _stats["memory_bytes"] += memory_bytes
+        _stats["spilled_bytes"] += spilled_bytes
+
+
+def audio_memory_stats() -> dict:
+    """Live recording buffers in this process and the bytes they hold in memory and on disk"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def max_recording_bytes(rate: int, channels: int = 1, sample_width: int = 2,
+                        seconds: float = MAX_RECORDING_SECONDS) -> int:
+    frame_size = channels * sample_width
+    return int(rate * seconds) * frame_size
+
+
+class AudioBuffer:
+    """Append-only PCM buffer holding at most the last ``max_bytes`` of audio"""
+
+    def __init__(self, max_bytes: int, memory_cap: int = AUDIO_SESSION_MEMORY_BYTES, initial_bytes: int = 0,
+                 process_budget: int = AUDIO_PROCESS_MEMORY_BYTES, spill_dir: str = AUDIO_SPILL_DIR):
+        self.max_bytes = max_bytes
+        self.memory_cap = memory_cap
+        self.process_budget = process_budget
+        self.spill_dir = spill_dir
+        self.length = 0
+        self.dropped = 0
+        self._start = 0  # offset of the oldest byte once the ring has wrapped
+        self._file = None
+        self._store = bytearray()
+        _account(buffers=1)
+        self._grow(min(initial_bytes, memory_cap, max_bytes))
+
+    @property
+    def capacity(self) -> int:
+        return len(self._store)
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None
+
+    def _grow(self, capacity: int):
+        if capacity <= self.capacity:
+            return
+        extra = capacity - self.capacity
+        if not self.spilled:
+            over_budget = audio_memory_stats()["memory_bytes"] + extra > self.process_budget
+            if capacity <= self.memory_cap and not over_budget:
+                self._store.extend(bytes(extra))
+                _account(memory_bytes=extra)
+                return
+            self._spill(capacity)
+            return
+        # Remap the spill file at the new size; data only ever grows while unwrapped
+        self._store.close()
+        self._file.truncate(capacity)
+        self._store = mmap.mmap(self._file.fileno(), capacity)
+        _account(spilled_bytes=extra)
+
+    def _spill(self, capacity: int):
+        self._file = tempfile.TemporaryFile(prefix="recording-", suffix=".pcm", dir=self.spill_dir)
+        self._file.truncate(capacity)
+        store = mmap.mmap(self._file.fileno(), capacity)
+        store[:self.length] = self._store[:self.length]
+        _account(memory_bytes=-self.capacity, spilled_bytes=capacity)
+        self._store = store
+
+    def write(self, data: bytes):
+        """Append captured audio, overwriting the oldest audio once ``max_bytes`` is held"""
+        if not data:
+            return
+        if len(data) > self.max_bytes:
+            self.dropped += len(data) - self.max_bytes
+            data = data[-self.max_bytes:]
+        needed = self.length + len(data)
+        if needed > self.capacity:
+            # Grow geometrically so long recordings stay amortized O(1) per chunk
+            self._grow(min(max(needed, 2 * self.capacity), self.max_bytes))
+
+        capacity = self.capacity
+        position = (self._start + self.length) % capacity
+        head = min(len(data), capacity - position)
+        self._store[position:position + head] = data[:head]
+        self._store[:len(data) - head] = data[head:]
+        if needed > capacity:
+            overflow = needed - capacity
+            self._start = (self._start + overflow) % capacity
+            self.dropped += overflow
+            self.length = capacity
+        else:
+            self.length = needed
+
+    def samples(self) -> np.ndarray:
+        """16-bit samples in recording order; a zero-copy view unless the ring has wrapped.
+
+        Delete the returned array before ``close`` so the storage can be released.
+        """
+        count = self.length // 2
+        if self._start + self.length <= self.capacity:
+            return np.frombuffer(self._store, dtype='<i2', count=count, offset=self._start)
+        return np.frombuffer(self.read(), dtype='<i2', count=count)
+
+    def read(self, start: int = 0, end: int = None) -> bytes:
+        """Copy out ``[start, end)`` of the held audio in recording order"""
+        end = self.length if end is None else min(end, self.length)
+        if start >= end:
+            return b""
+        first = (self._start + start) % self.capacity
+        last = first + (end - start)
+        with memoryview(self._store) as view:
+            if last <= self.capacity:
+                return view[first:last].tobytes()
+            return view[first:].tobytes() + view[:last - self.capacity].tobytes()
+
+    def clear(self):
+        """Drop the held audio but keep the storage for the next recording"""
+        self.length = 0
+        self._start = 0
+
+    def close(self):
+        """Release the memory or spill file behind this buffer"""
+        if self._store is None:
+            return
+        if self.spilled:
+            _account(buffers=-1, spilled_bytes=-self.capacity)
+            self._store.close()
+            self._file.close()
+            self._file = None
+        else:
+            _account(buffers=-1, memory_bytes=-self.capacity)
+        self._store = None
+        self.length = 0
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
@@ -0,0 +1,99 @@
+"""Process-wide audio device manager.
+
+PortAudio is initialized once, lazily, the first time a stream is needed, and
+input/output streams are pooled by their parameters. Starting a recording or a
+playback reuses an idle stream (stop/start) instead of re-initializing PyAudio
+and re-enumerating devices every time.
+"""
+import atexit
+import threading
+
+
+def _default_pyaudio():
+    import pyaudio  # PortAudio is only loaded when audio is actually used
+
+    return pyaudio.PyAudio()
+
+
+class AudioDeviceManager:
+    def __init__(self, pyaudio_factory=_default_pyaudio):
+        self.pyaudio_factory = pyaudio_factory
+        self._pa = None
+        self._idle = {}      # stream parameters -> idle streams
+        self._owner = {}     # id(stream) -> stream parameters
+        self._lock = threading.Lock()
+
+    @property
+    def pa(self):
+        if self._pa is None:
+            with self._lock:
+                if self._pa is None:
+                    self._pa = self.pyaudio_factory()
+        return self._pa
+
+    def _acquire(self, params: tuple):
+        direction, rate, channels, sample_width, frames_per_buffer = params
+        pa = self.pa
+        with self._lock:
+            idle = self._idle.get(params)
+            stream = idle.pop() if idle else None
+        if stream is None:
+            stream = pa.open(format=pa.get_format_from_width(sample_width),
+                             channels=channels,
+                             rate=rate,
+                             input=direction == "input",
+                             output=direction == "output",
+                             frames_per_buffer=frames_per_buffer)
+        elif stream.is_stopped():
+            stream.start_stream()
+        with self._lock:
+            self._owner[id(stream)] = params
+        return stream
+
+    def acquire_input(self, rate: int, channels: int = 1, sample_width: int = 2, frames_per_buffer: int = 1024):
+        """Hand out a started input stream with the given parameters"""
+        return self._acquire(("input", rate, channels, sample_width, frames_per_buffer))
+
+    def acquire_output(self, rate: int, channels: int = 1, sample_width: int = 2, frames_per_buffer: int = 8192):
+        """Hand out a started output stream with the given parameters"""
+        return self._acquire(("output", rate, channels, sample_width, frames_per_buffer))
+
+    def release(self, stream):
+        """Stop a stream and keep it for the next caller with the same parameters"""
+        with self._lock:
+            params = self._owner.pop(id(stream), None)
+        if params is None:
+            return
+        try:
+            stream.stop_stream()
+        except Exception:
+            stream.close()
+            return
+        with self._lock:
+            self._idle.setdefault(params, []).append(stream)
+
+    def close(self):
+        """Close pooled streams and terminate PortAudio"""
+        with self._lock:
+            streams = [s for idle in self._idle.values() for s in idle]
+            self._idle.clear()
+            pa, self._pa = self._pa, None
+        for stream in streams:
+            stream.close()
+        if pa is not None:
+            pa.terminate()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_audio_manager() -> AudioDeviceManager:
+    """Return the process-wide audio device manager, creating it on first use"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = AudioDeviceManager()
+                atexit.register(_manager.close)
+    return _manager
@@ -0,0 +1,335 @@
+"""Audio preprocessing before speech recognition.
+
+Captured audio is converted to 16 kHz mono with a vectorized FFT resampler and
+encoded to FLAC in-process, so each patient turn uploads roughly a third of the
+samples and no longer spawns the external ``flac`` binary. Energy-based voice
+activity detection ends a turn after trailing silence and trims the silence
+before it is uploaded.
+"""
+import hashlib
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+import speech_recognition as sr
+
+RECOGNITION_RATE = 16000
+FLAC_BLOCK_SIZE = 4096
+MAX_FIXED_ORDER = 4
+MAX_PARTITION_ORDER = 4
+
+# Voice activity detection
+VAD_FRAME_MS = 20
+VAD_MIN_RMS = float(os.getenv("VAD_MIN_RMS", "200"))
+VAD_SPEECH_RATIO = float(os.getenv("VAD_SPEECH_RATIO", "3.0"))
+VAD_SILENCE_SECONDS = float(os.getenv("VAD_SILENCE_SECONDS", "1.5"))
+VAD_PADDING_MS = int(os.getenv("VAD_PADDING_MS", "200"))
+MAX_RECORDING_SECONDS = float(os.getenv("MAX_RECORDING_SECONDS", "60"))
+
+
+def pcm_to_samples(pcm, channels: int = 1) -> np.ndarray:
+    """View 16-bit little-endian PCM as an int16 array, downmixing to mono"""
+    samples = np.frombuffer(pcm, dtype='<i2')
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels)
+        samples = samples.mean(axis=1).round().astype(np.int16)
+    return samples
+
+
+def resample(samples: np.ndarray, rate: int, target_rate: int = RECOGNITION_RATE) -> np.ndarray:
+    """Band-limited resampling by truncating (or padding) the spectrum"""
+    if rate == target_rate or len(samples) == 0:
+        return samples.astype(np.int16, copy=False)
+    n = len(samples)
+    m = max(1, int(round(n * target_rate / rate)))
+    spectrum = np.fft.rfft(samples.astype(np.float64))
+    bins = m // 2 + 1
+    if bins <= len(spectrum):
+        spectrum = spectrum[:bins]
+    else:
+        spectrum = np.concatenate([spectrum, np.zeros(bins - len(spectrum), dtype=spectrum.dtype)])
+    resampled = np.fft.irfft(spectrum, m) * (m / n)
+    return np.clip(np.round(resampled), -32768, 32767).astype(np.int16)
+
+
+# --- Voice activity detection -----------------------------------------------
+
+def frame_rms(samples: np.ndarray, frame_length: int) -> np.ndarray:
+    """Root-mean-square level of each complete frame"""
+    count = len(samples) // frame_length
+    frames = samples[:count * frame_length].astype(np.float64).reshape(count, frame_length)
+    return np.sqrt((frames ** 2).mean(axis=1))
+
+
+class Endpointer:
+    """Streaming end-of-turn detector fed with captured PCM chunks.
+
+    Tracks an adaptive noise floor. Once speech has been heard, ``update``
+    returns True after ``silence_seconds`` of trailing silence or when the
+    recording reaches ``max_seconds``.
+    """
+
+    def __init__(self, rate: int, silence_seconds: float = VAD_SILENCE_SECONDS,
+                 max_seconds: float = MAX_RECORDING_SECONDS, min_rms: float = VAD_MIN_RMS,
+                 speech_ratio: float = VAD_SPEECH_RATIO):
+        self.rate = rate
+        self.frame_length = rate * VAD_FRAME_MS // 1000
+        self.silence_samples = int(silence_seconds * rate)
+        self.max_samples = int(max_seconds * rate)
+        self.min_rms = min_rms
+        self.speech_ratio = speech_ratio
+        self.noise_floor = None
+        self.heard_speech = False
+        self.trailing_silence = 0
+        self.total = 0
+        self._pending = np.zeros(0, dtype=np.int16)
+
+    def is_speech(self, rms: float) -> bool:
+        # The floor follows quiet frames down at once and creeps up slowly, so it settles on room noise.
+        # It starts no higher than min_rms so a patient who speaks immediately is still heard.
+        if self.noise_floor is None:
+            self.noise_floor = min(rms, self.min_rms)
+        elif rms < self.noise_floor:
+            self.noise_floor = rms
+        else:
+            self.noise_floor += 0.002 * (rms - self.noise_floor)
+        return rms > max(self.min_rms, self.noise_floor * self.speech_ratio)
+
+    def update(self, pcm) -> bool:
+        """Feed a chunk of 16-bit mono PCM; return True when the turn should end"""
+        samples = np.concatenate([self._pending, np.frombuffer(pcm, dtype='<i2')])
+        self.total += len(samples) - len(self._pending)
+        usable = len(samples) - len(samples) % self.frame_length
+        self._pending = samples[usable:]
+
+        for rms in frame_rms(samples[:usable], self.frame_length):
+            if self.is_speech(rms):
+                self.heard_speech = True
+                self.trailing_silence = 0
+            else:
+                self.trailing_silence += self.frame_length
+
+        if self.total >= self.max_samples:
+            return True
+        return self.heard_speech and self.trailing_silence >= self.silence_samples
+
+
+def speech_bounds(samples: np.ndarray, rate: int, padding_ms: int = VAD_PADDING_MS,
+                  min_rms: float = VAD_MIN_RMS, speech_ratio: float = VAD_SPEECH_RATIO) -> Optional[Tuple[int, int]]:
+    """Sample range containing speech (plus padding), or None if there is none"""
+    frame_length = rate * VAD_FRAME_MS // 1000
+    levels = frame_rms(samples, frame_length)
+    if len(levels) == 0:
+        return None
+    noise_floor = np.percentile(levels, 10)
+    voiced = np.flatnonzero(levels > max(min_rms, noise_floor * speech_ratio))
+    if len(voiced) == 0:
+        return None
+    padding = rate * padding_ms // 1000
+    start = max(0, voiced[0] * frame_length - padding)
+    end = min(len(samples), (voiced[-1] + 1) * frame_length + padding)
+    return int(start), int(end)
+
+
+# --- FLAC encoder -----------------------------------------------------------
+
+def _crc_table(poly: int, width: int) -> list:
+    top = 1 << (width - 1)
+    mask = (1 << width) - 1
+    table = []
+    for byte in range(256):
+        crc = byte << (width - 8)
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) if crc & top else (crc << 1)
+        table.append(crc & mask)
+    return table
+
+
+_CRC8 = _crc_table(0x07, 8)
+_CRC16 = _crc_table(0x8005, 16)
+
+
+def _crc8(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc = _CRC8[crc ^ byte]
+    return crc
+
+
+def _crc16(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ _CRC16[(crc >> 8) ^ byte]
+    return crc
+
+
+class _BitWriter:
+    """Collects MSB-first bit fields as numpy bit arrays"""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, value: int, bits: int):
+        if bits:
+            self.parts.append(((value >> np.arange(bits - 1, -1, -1)) & 1).astype(np.uint8))
+
+    def write_signed(self, values: np.ndarray, bits: int):
+        values = values.astype(np.int64) & ((1 << bits) - 1)
+        shifts = np.arange(bits - 1, -1, -1)
+        self.parts.append(((values[:, None] >> shifts) & 1).astype(np.uint8).ravel())
+
+    def write_rice(self, folded: np.ndarray, k: int):
+        """Rice-code non-negative values: unary quotient, stop bit, k-bit remainder"""
+        quotients = folded >> k
+        lengths = quotients + 1 + k
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        bits = np.zeros(int(lengths.sum()), dtype=np.uint8)
+        bits[starts + quotients] = 1
+        for j in range(k):
+            bits[starts + quotients + 1 + j] = (folded >> (k - 1 - j)) & 1
+        self.parts.append(bits)
+
+    def align(self):
+        used = sum(len(p) for p in self.parts) % 8
+        if used:
+            self.write(0, 8 - used)
+
+    def getvalue(self) -> bytes:
+        return np.packbits(np.concatenate(self.parts)).tobytes() if self.parts else b""
+
+
+def _utf8_number(value: int) -> bytes:
+    """FLAC's UTF-8-style variable length frame number"""
+    if value < 0x80:
+        return bytes([value])
+    length = 2
+    while value >= 1 << (5 * length + 1):
+        length += 1
+    out = []
+    for _ in range(length - 1):
+        out.append(0x80 | (value & 0x3F))
+        value >>= 6
+    lead = (0xFF00 >> length) & 0xFF
+    return bytes([lead | value] + out[::-1])
+
+
+def _rice_cost(folded: np.ndarray, k: int) -> int:
+    return int((folded >> k).sum()) + len(folded) * (k + 1)
+
+
+def _best_rice_parameter(folded: np.ndarray) -> tuple:
+    mean = folded.mean() if len(folded) else 0
+    guess = int(np.log2(mean)) if mean >= 1 else 0
+    candidates = [k for k in (guess - 1, guess, guess + 1) if 0 <= k <= 30]
+    return min((_rice_cost(folded, k), k) for k in candidates)
+
+
+def _write_residual(writer: _BitWriter, residual: np.ndarray, block_size: int, order: int):
+    folded = np.where(residual >= 0, residual << 1, ((-residual) << 1) - 1)
+
+    # Pick the partition order with the cheapest total Rice cost
+    best = None
+    for partition_order in range(MAX_PARTITION_ORDER + 1):
+        if block_size % (1 << partition_order) or (block_size >> partition_order) <= order:
+            break
+        size = block_size >> partition_order
+        bounds = [0] + [size * (i + 1) - order for i in range(1 << partition_order)]
+        params = [_best_rice_parameter(folded[bounds[i]:bounds[i + 1]]) for i in range(1 << partition_order)]
+        cost = sum(c for c, _ in params) + 5 * len(params)
+        if best is None or cost < best[0]:
+            best = (cost, partition_order, bounds, [k for _, k in params])
+
+    _, partition_order, bounds, params = best
+    writer.write(0b01, 2)  # 5-bit Rice parameters
+    writer.write(partition_order, 4)
+    for i, k in enumerate(params):
+        writer.write(k, 5)
+        writer.write_rice(folded[bounds[i]:bounds[i + 1]], k)
+
+
+def _write_subframe(writer: _BitWriter, block: np.ndarray):
+    if np.all(block == block[0]):
+        writer.write(0b00000000, 8)  # CONSTANT
+        writer.write_signed(block[:1], 16)
+        return
+
+    # Choose the fixed predictor order with the smallest residual
+    residuals = [np.diff(block, n=order) if order else block
+                 for order in range(min(MAX_FIXED_ORDER, len(block) - 1) + 1)]
+    order = int(np.argmin([np.abs(r).sum() for r in residuals]))
+    residual = residuals[order]
+
+    if _rice_cost(np.abs(residual) << 1, _best_rice_parameter(np.abs(residual) << 1)[1]) >= len(block) * 16:
+        writer.write(0b00000010, 8)  # VERBATIM
+        writer.write_signed(block, 16)
+        return
+
+    writer.write(0b00010000 | (order << 1), 8)  # FIXED, no wasted bits
+    writer.write_signed(block[:order], 16)
+    _write_residual(writer, residual, len(block), order)
+
+
+def encode_flac(samples: np.ndarray, rate: int, block_size: int = FLAC_BLOCK_SIZE) -> bytes:
+    """Encode 16-bit mono samples as a FLAC stream using fixed linear predictors"""
+    samples = np.asarray(samples, dtype=np.int16)
+    wide = samples.astype(np.int64)
+
+    frames = []
+    for number, start in enumerate(range(0, len(wide), block_size)):
+        block = wide[start:start + block_size]
+        header = _BitWriter()
+        header.write(0b11111111111110, 14)  # sync code
+        header.write(0, 1)                  # reserved
+        header.write(0, 1)                  # fixed block size stream
+        header.write(0b0111, 4)             # block size stored as 16 bits at end of header
+        header.write(0b0000, 4)             # sample rate from STREAMINFO
+        header.write(0b0000, 4)             # mono
+        header.write(0b100, 3)              # 16 bits per sample
+        header.write(0, 1)                  # reserved
+        header_bytes = header.getvalue() + _utf8_number(number) + (len(block) - 1).to_bytes(2, 'big')
+        header_bytes += bytes([_crc8(header_bytes)])
+
+        body = _BitWriter()
+        _write_subframe(body, block)
+        body.align()
+        frame = header_bytes + body.getvalue()
+        frames.append(frame + _crc16(frame).to_bytes(2, 'big'))
+
+    frame_sizes = [len(f) for f in frames] or [0]
+    info = _BitWriter()
+    info.write(block_size, 16)              # min block size (the last block may be shorter)
+    info.write(block_size, 16)              # max block size
+    info.write(min(frame_sizes), 24)
+    info.write(max(frame_sizes), 24)
+    info.write(rate, 20)
+    info.write(0, 3)                        # channels - 1
+    info.write(15, 5)                       # bits per sample - 1
+    info.write(len(samples), 36)
+    streaminfo = info.getvalue() + hashlib.md5(samples.astype('<i2').tobytes()).digest()
+
+    metadata = bytes([0x80]) + len(streaminfo).to_bytes(3, 'big') + streaminfo  # last block, STREAMINFO
+    return b"fLaC" + metadata + b"".join(frames)
+
+
+# --- Recognizer integration -------------------------------------------------
+
+class PreparedAudioData(sr.AudioData):
+    """AudioData carrying a pre-encoded FLAC payload for the recognizer"""
+
+    def __init__(self, frame_data, sample_rate: int, sample_width: int, flac_data: bytes):
+        super().__init__(frame_data, sample_rate, sample_width)
+        self.flac_data = flac_data
+
+    def get_flac_data(self, convert_rate=None, convert_width=None):
+        if convert_rate in (None, self.sample_rate) and convert_width in (None, self.sample_width):
+            return self.flac_data
+        return super().get_flac_data(convert_rate, convert_width)
+
+
+def prepare_for_recognition(audio: sr.AudioData, channels: int = 1,
+                            target_rate: int = RECOGNITION_RATE) -> Optional[PreparedAudioData]:
+    """Downsample captured 16-bit audio to 16 kHz mono and attach in-process FLAC"""
+    if audio.sample_width != 2:
+        return None
+    samples = resample(pcm_to_samples(audio.frame_data, channels), audio.sample_rate, target_rate)
+    return PreparedAudioData(samples.tobytes(), target_rate, 2, encode_flac(samples, target_rate))
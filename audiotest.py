@@ -9,6 +9,10 @@ from gtts import gTTS
 import tempfile
 from playsound import playsound
 import threading
+from audio_buffer import AudioBuffer, max_recording_bytes
+from audio_devices import get_audio_manager
+from playback import get_playback_engine
+from speech_backends import SpeechClip
 
 # Audio recording parameters
 CHUNK = 1024
@@ -19,17 +23,13 @@ RATE = 44100
 class AudioRecorder:
     def __init__(self):
         self.is_recording = False
-        self.frames = []
+        self.buffer = None
         
     def start_recording(self):
         self.is_recording = True
-        self.frames = []
-        self.p = pyaudio.PyAudio()
-        self.stream = self.p.open(format=FORMAT,
-                                channels=CHANNELS,
-                                rate=RATE,
-                                input=True,
-                                frames_per_buffer=CHUNK)
+        # Bounded per session: spills to a memory-mapped file past the memory cap
+        self.buffer = AudioBuffer(max_recording_bytes(RATE, CHANNELS, pyaudio.get_sample_size(FORMAT)))
+        self.stream = get_audio_manager().acquire_input(RATE, CHANNELS, pyaudio.get_sample_size(FORMAT), CHUNK)
         
         # Start recording in a separate thread
         self.record_thread = threading.Thread(target=self._record)
@@ -38,24 +38,23 @@ class AudioRecorder:
     def _record(self):
         while self.is_recording:
             data = self.stream.read(CHUNK)
-            self.frames.append(data)
+            self.buffer.write(data)
     
     def stop_recording(self, filename):
         self.is_recording = False
         if hasattr(self, 'record_thread'):
             self.record_thread.join()
         
-        # Stop and close the stream
-        self.stream.stop_stream()
-        self.stream.close()
-        self.p.terminate()
+        # Hand the stream back; PortAudio stays initialized for the next recording
+        get_audio_manager().release(self.stream)
         
         # Save the recorded data as a WAV file
         with wave.open(filename, 'wb') as wf:
             wf.setnchannels(CHANNELS)
-            wf.setsampwidth(self.p.get_sample_size(FORMAT))
+            wf.setsampwidth(pyaudio.get_sample_size(FORMAT))
             wf.setframerate(RATE)
-            wf.writeframes(b''.join(self.frames))
+            wf.writeframes(self.buffer.read())
+        self.buffer.close()
         
         # Transcribe the recording
         return transcribe_audio(filename)
@@ -96,31 +95,10 @@ def transcribe_audio(filename):
             return "Could not request results"
 
 def play_audio(filename):
-    # Open the wave file
-    with wave.open(filename, 'rb') as wf:
-        # Instantiate PyAudio
-        p = pyaudio.PyAudio()
-        
-        # Open stream
-        stream = p.open(format=p.get_format_from_width(wf.getsampwidth()),
-                       channels=wf.getnchannels(),
-                       rate=wf.getframerate(),
-                       output=True)
-        
-        st.info("🔊 Playing audio...")
-        
-        # Read data in chunks and play
-        data = wf.readframes(CHUNK)
-        while len(data) > 0:
-            stream.write(data)
-            data = wf.readframes(CHUNK)
-            
-        st.success("✅ Playback complete!")
-        
-        # Close stream
-        stream.stop_stream()
-        stream.close()
-        p.terminate()
+    """Queue a WAV recording for background playback"""
+    with open(filename, 'rb') as f:
+        get_playback_engine(st.session_state).enqueue(SpeechClip(f.read(), '.wav'))
+    st.info("🔊 Playing audio...")
 
 def main():
     st.title("🎙️ Audio Recorder and Player")
@@ -141,6 +119,7 @@ def main():
     with col1:
         if st.button("🎤 Start Recording", disabled=st.session_state.recording):
             st.session_state.recording = True
+            get_playback_engine(st.session_state).interrupt()
             st.session_state.recorder.start_recording()
             st.rerun()
     
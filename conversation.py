@@ -0,0 +1,133 @@
+"""Bounded, incrementally built conversation context for doctor turns.
+
+The last few turns are kept verbatim; older turns are folded into a compact
+running summary capped by an approximate token budget. Only entries added since
+the previous call are processed, so the prompt costs about the same to build
+and to send on turn 40 as on turn 4.
+"""
+import os
+import uuid
+from collections import deque
+
+CONTEXT_RECENT_TURNS = int(os.getenv("CONTEXT_RECENT_TURNS", "6"))
+CONTEXT_SUMMARY_TOKENS = int(os.getenv("CONTEXT_SUMMARY_TOKENS", "300"))
+CONTEXT_TURN_TOKENS = int(os.getenv("CONTEXT_TURN_TOKENS", "150"))
+
+# Turns per on-screen transcript block; finished blocks are never rebuilt
+TRANSCRIPT_BLOCK_TURNS = int(os.getenv("TRANSCRIPT_BLOCK_TURNS", "8"))
+
+# Rough English average, good enough for budgeting without a tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _clip(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    text = " ".join(text.split())
+    return text if len(text) <= max_chars else text[:max_chars].rsplit(" ", 1)[0] + "..."
+
+
+class ConversationContext:
+    def __init__(self, recent_turns: int = CONTEXT_RECENT_TURNS, summary_tokens: int = CONTEXT_SUMMARY_TOKENS,
+                 turn_tokens: int = CONTEXT_TURN_TOKENS):
+        self.recent_turns = recent_turns
+        self.summary_tokens = summary_tokens
+        self.turn_tokens = turn_tokens
+        self.reset()
+
+    def reset(self):
+        # A new id per conversation, so a service holding this context by id starts afresh too
+        self.id = uuid.uuid4().hex
+        self.seen = 0
+        self.patient_turns = 0
+        self.chief_complaint = None
+        self.recent = deque()
+        self.summary = deque()  # (role, line)
+        self.summary_size = 0
+
+    def append(self, role: str, text: str):
+        """Add one turn, folding the oldest verbatim turn into the summary if needed"""
+        if role == 'patient':
+            self.patient_turns += 1
+            if self.chief_complaint is None:
+                self.chief_complaint = _clip(text, self.turn_tokens)
+        speaker = 'Doctor' if role == 'doctor' else 'Patient'
+        self.recent.append((role, f"{speaker}: {_clip(text, self.turn_tokens)}"))
+        self.seen += 1
+
+        while len(self.recent) > self.recent_turns:
+            self._summarize(*self.recent.popleft())
+
+    def _summarize(self, role: str, line: str):
+        line = _clip(line, self.turn_tokens // 3)
+        self.summary.append((role, line))
+        self.summary_size += estimate_tokens(line)
+
+        # Over budget: drop the oldest doctor question first, then the oldest patient detail
+        while self.summary_size > self.summary_tokens and self.summary:
+            victim = next((item for item in self.summary if item[0] == 'doctor'), self.summary[0])
+            self.summary.remove(victim)
+            self.summary_size -= estimate_tokens(victim[1])
+
+    def sync(self, conversation_history: list):
+        """Catch up with a session's history list, processing only new entries"""
+        if len(conversation_history) < self.seen:
+            self.reset()
+        for entry in conversation_history[self.seen:]:
+            self.append(entry['role'], entry['text'])
+
+    def render(self) -> str:
+        sections = []
+        if self.summary:
+            lines = [f"Chief complaint: {self.chief_complaint}"] if self.chief_complaint else []
+            lines.extend(line for _, line in self.summary)
+            sections.append("Earlier in the conversation (summary):\n" + "\n".join(lines))
+        sections.append("Recent conversation:\n" + "\n".join(line for _, line in self.recent))
+        return "\n\n".join(sections)
+
+    def estimated_tokens(self) -> int:
+        return estimate_tokens(self.render())
+
+    @classmethod
+    def from_history(cls, conversation_history: list, **kwargs) -> "ConversationContext":
+        context = cls(**kwargs)
+        context.sync(conversation_history)
+        return context
+
+
+def transcript_line(entry: dict) -> str:
+    speaker = "👨‍⚕️ Doctor:" if entry['role'] == 'doctor' else "🤒 You:"
+    return f"{speaker} {entry['text']}"
+
+
+class Transcript:
+    """Markdown for the on-screen transcript, built incrementally in fixed-size blocks.
+
+    Each turn is formatted once. Finished blocks keep the same text on every
+    rerun, so redrawing the transcript costs one element per block and the
+    browser can reuse what it already received.
+    """
+
+    def __init__(self, block_turns: int = TRANSCRIPT_BLOCK_TURNS):
+        self.block_turns = block_turns
+        self.reset()
+
+    def reset(self):
+        self.seen = 0
+        self.blocks = []
+
+    def sync(self, conversation_history: list) -> list:
+        """Catch up with a session's history list and return the markdown blocks"""
+        if len(conversation_history) < self.seen:
+            self.reset()
+        for entry in conversation_history[self.seen:]:
+            line = transcript_line(entry)
+            if self.seen % self.block_turns == 0:
+                self.blocks.append(line)
+            else:
+                self.blocks[-1] += "\n\n" + line
+            self.seen += 1
+        return self.blocks
@@ -0,0 +1,122 @@
+"""Structured symptom analysis results.
+
+The analysis prompt asks Gemini for JSON matching ``DIAGNOSIS_SCHEMA``; the
+reply is decoded straight into a validated ``Diagnosis``. Replies that do not
+validate fall back to the legacy free-text parser.
+"""
+import json
+import re
+from dataclasses import dataclass, field
+from typing import List
+
+DIAGNOSIS_PROMPT = """Analyze these symptoms. Give up to 3 potential causes, whether they could be \
+life-threatening with a one-sentence explanation, and a risk rating from 1 (minor) to 10 (emergency).
+Symptoms: {symptoms}"""
+
+# Gemini responseSchema (OpenAPI subset) for the analysis reply
+DIAGNOSIS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "potential_causes": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "life_threatening": {"type": "BOOLEAN"},
+        "explanation": {"type": "STRING"},
+        "risk_rating": {"type": "INTEGER"}
+    },
+    "required": ["potential_causes", "life_threatening", "explanation", "risk_rating"]
+}
+
+MAX_CAUSES = 5
+
+
+@dataclass
+class Diagnosis:
+    reasons: List[str] = field(default_factory=list)
+    risk_rating: int = 5
+    life_threatening: bool = False
+    explanation: str = ""
+
+    def __post_init__(self):
+        if not isinstance(self.reasons, list) or not all(isinstance(r, str) and r.strip() for r in self.reasons):
+            raise ValueError("reasons must be a list of non-empty strings")
+        if not self.reasons:
+            raise ValueError("at least one reason is required")
+        if isinstance(self.risk_rating, bool) or not isinstance(self.risk_rating, int):
+            raise ValueError("risk_rating must be an integer")
+        if not 1 <= self.risk_rating <= 10:
+            raise ValueError("risk_rating must be between 1 and 10")
+        if not isinstance(self.life_threatening, bool):
+            raise ValueError("life_threatening must be a boolean")
+        if not isinstance(self.explanation, str):
+            raise ValueError("explanation must be a string")
+        self.reasons = [r.strip().capitalize() for r in self.reasons[:MAX_CAUSES]]
+        self.explanation = self.explanation.strip()
+
+    @classmethod
+    def from_json(cls, text: str) -> "Diagnosis":
+        """Decode and validate a JSON reply, raising ValueError if it does not fit the schema"""
+        data = json.loads(text)
+        if not isinstance(data, dict):
+            raise ValueError("diagnosis must be a JSON object")
+        return cls(reasons=data.get("potential_causes"),
+                   risk_rating=data.get("risk_rating"),
+                   life_threatening=data.get("life_threatening"),
+                   explanation=data.get("explanation", ""))
+
+    def to_dict(self) -> dict:
+        """Return the dict shape the app and saved history use"""
+        verdict = "Yes" if self.life_threatening else "No"
+        return {
+            "reasons": self.reasons,
+            "risk_rating": self.risk_rating,
+            "life_threatening": f"{verdict} - {self.explanation}" if self.explanation else verdict
+        }
+
+
+def build_diagnosis_payload(symptoms: str) -> dict:
+    """Build a JSON-mode Gemini request for a symptom analysis"""
+    return {
+        "contents": [{
+            "parts": [{
+                "text": DIAGNOSIS_PROMPT.format(symptoms=symptoms)
+            }]
+        }],
+        "generationConfig": {
+            "responseMimeType": "application/json",
+            "responseSchema": DIAGNOSIS_SCHEMA
+        }
+    }
+
+
+def parse_legacy(response_text: str) -> dict:
+    """Parse the old free-text "Potential Causes / Risk Rating" format"""
+    reasons = []
+    risk_rating = 5  # Default risk rating
+    life_threatening = "No assessment available"
+
+    for line in response_text.split('\n'):
+        if line.strip().startswith('-'):
+            reasons.append(line.strip().strip('- ').capitalize())
+        elif 'risk rating:' in line.lower():
+            # Take the first number only, so "7/10" reads as 7 rather than 710
+            match = re.search(r'\d+', line.split(':', 1)[1])
+            if match:
+                risk_rating = min(max(int(match.group()), 1), 10)
+        elif 'life-threatening' in line.lower():
+            life_threatening = line.split(':')[-1].strip()
+
+    if not reasons:
+        reasons = ["No specific causes identified"]
+
+    return {
+        "reasons": reasons,
+        "risk_rating": risk_rating,
+        "life_threatening": life_threatening
+    }
+
+
+def parse_diagnosis(response_text: str) -> dict:
+    """Decode a structured reply, falling back to the legacy text parser"""
+    try:
+        return Diagnosis.from_json(response_text).to_dict()
+    except (ValueError, TypeError):
+        return parse_legacy(response_text)
@@ -0,0 +1,130 @@
+"""Content-addressed cache for symptom analyses.
+
+Identical (or trivially different) symptom descriptions map to the same key,
+so repeated "Get Diagnosis" clicks and Streamlit reruns are answered from an
+in-memory LRU tier, backed by an optional SQLite tier that survives restarts.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from gemini_client import GEMINI_MODEL
+
+DIAGNOSIS_CACHE_SIZE = int(os.getenv("DIAGNOSIS_CACHE_SIZE", "256"))
+DIAGNOSIS_CACHE_TTL = float(os.getenv("DIAGNOSIS_CACHE_TTL", "3600"))
+DIAGNOSIS_CACHE_PATH = os.getenv("DIAGNOSIS_CACHE_PATH", "")
+DIAGNOSIS_CACHE_DISK_SIZE = int(os.getenv("DIAGNOSIS_CACHE_DISK_SIZE", "10000"))
+
+
+def normalize_symptoms(text: str) -> str:
+    """Case-fold, collapse whitespace and drop trailing punctuation per line"""
+    lines = [re.sub(r'\s+', ' ', line).strip().rstrip('.!?,;').lower() for line in text.splitlines()]
+    return '\n'.join(line for line in lines if line)
+
+
+def make_key(symptoms: str, severity=None, duration=None, model: str = GEMINI_MODEL) -> str:
+    """Hash the normalized request into a cache key"""
+    parts = [normalize_symptoms(symptoms), severity, normalize_symptoms(str(duration)) if duration else None, model]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+
+class DiagnosisCache:
+    def __init__(self, max_entries: int = DIAGNOSIS_CACHE_SIZE, ttl: float = DIAGNOSIS_CACHE_TTL,
+                 path: str = DIAGNOSIS_CACHE_PATH, max_disk_entries: int = DIAGNOSIS_CACHE_DISK_SIZE):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS diagnoses "
+                             "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS diagnoses_created ON diagnoses (created)")
+            self._db.commit()
+
+    def _expired(self, created: float) -> bool:
+        return time.time() - created > self.ttl
+
+    def _remember(self, key: str, value: dict, created: float):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, created FROM diagnoses WHERE key = ?", (key,)).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: dict):
+        created = time.time()
+        with self._lock:
+            self._remember(key, value, created)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO diagnoses (key, value, created) VALUES (?, ?, ?)",
+                                 (key, json.dumps(value), created))
+                self._db.execute("DELETE FROM diagnoses WHERE created < ? OR key IN "
+                                 "(SELECT key FROM diagnoses ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                                 (created - self.ttl, self.max_disk_entries))
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM diagnoses")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._memory),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> DiagnosisCache:
+    """Return the process-wide diagnosis cache, creating it on first use"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DiagnosisCache()
+    return _cache
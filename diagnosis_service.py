@@ -0,0 +1,277 @@
+"""Headless diagnosis service: the triage pipeline over HTTP.
+
+    python diagnosis_service.py --port 8600
+
+    POST /v1/turn     {"conversation": [{"role": ..., "text": ...}, ...], "conversation_id": ...} -> {"text": ...}
+                      (with ?stream=1 the reply streams back as plain text)
+    POST /v1/analyze  {"symptoms": ..., "background": false} -> {"diagnosis": {...}, "error": ...}
+    GET  /v1/health   load, scheduler, conversation and cache counters
+
+Requests are served on one asyncio loop with a non-blocking Gemini client,
+so a single process keeps hundreds of model calls in flight. Every model call
+goes through an ``AsyncGeminiScheduler``, which keeps the service under the
+API quota (``GEMINI_RATE_PER_MINUTE``), serves user-facing calls before
+background analyses and merges identical concurrent requests. Turns that name
+a ``conversation_id`` reuse that conversation's compact context, so only the
+turns added since its last request are processed; the most recently used
+``SERVICE_MAX_CONVERSATIONS`` contexts are kept. Admission is
+bounded: at most ``SERVICE_MAX_IN_FLIGHT`` requests call the model at once,
+at most ``SERVICE_MAX_QUEUED`` wait for a slot (each for up to
+``SERVICE_MAX_WAIT`` seconds), and anything beyond that is turned away with
+503 and a Retry-After hint instead of piling up.
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from conversation import ConversationContext
+from diagnosis import build_diagnosis_payload
+from diagnosis_cache import DIAGNOSIS_CACHE_PATH, get_cache, make_key
+from gemini_async import AsyncGeminiClient, AsyncGeminiScheduler
+from gemini_scheduler import BACKGROUND, INTERACTIVE
+from triage import (DOCTOR_ERROR_REPLY, DOCTOR_RETRY_REPLY, build_doctor_payload, diagnosis_from_response,
+                    doctor_reply, failed_diagnosis)
+
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8600"))
+SERVICE_MAX_IN_FLIGHT = int(os.getenv("SERVICE_MAX_IN_FLIGHT", "256"))
+SERVICE_MAX_QUEUED = int(os.getenv("SERVICE_MAX_QUEUED", "1024"))
+SERVICE_MAX_WAIT = float(os.getenv("SERVICE_MAX_WAIT", "10"))
+SERVICE_MAX_CONVERSATIONS = int(os.getenv("SERVICE_MAX_CONVERSATIONS", "10000"))
+
+# Seconds an overloaded service asks clients to wait before retrying
+RETRY_AFTER_SECONDS = 1
+
+
+class Overloaded(Exception):
+    pass
+
+
+class AdmissionControl:
+    """Bounded concurrency with a bounded, time-limited wait for a slot"""
+
+    def __init__(self, max_in_flight: int = SERVICE_MAX_IN_FLIGHT, max_queued: int = SERVICE_MAX_QUEUED,
+                 max_wait: float = SERVICE_MAX_WAIT):
+        self.max_queued = max_queued
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.queued = 0
+        self.served = 0
+        self.rejected = 0
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Hold one of the in-flight slots, raising Overloaded if none frees up in time"""
+        if not self._slots.locked():
+            # A free slot is taken without suspending, so concurrent arrivals see it as taken
+            await self._slots.acquire()
+        elif self.queued >= self.max_queued:
+            self.rejected += 1
+            raise Overloaded()
+        else:
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.max_wait)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise Overloaded() from None
+            finally:
+                self.queued -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.served += 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {"in_flight": self.in_flight, "queued": self.queued, "served": self.served, "rejected": self.rejected}
+
+
+class ConversationContexts:
+    """Compact contexts of the most recently active conversations, by conversation id"""
+
+    def __init__(self, max_conversations: int = SERVICE_MAX_CONVERSATIONS):
+        self.max_conversations = max_conversations
+        self._contexts = OrderedDict()
+
+    def get(self, conversation_id: str) -> ConversationContext:
+        context = self._contexts.get(conversation_id)
+        if context is None:
+            context = self._contexts[conversation_id] = ConversationContext()
+            if len(self._contexts) > self.max_conversations:
+                self._contexts.popitem(last=False)
+        else:
+            self._contexts.move_to_end(conversation_id)
+        return context
+
+    def __len__(self) -> int:
+        return len(self._contexts)
+
+
+CLIENT = web.AppKey("client", AsyncGeminiClient)
+SCHEDULER = web.AppKey("scheduler", AsyncGeminiScheduler)
+ADMISSION = web.AppKey("admission", AdmissionControl)
+CONTEXTS = web.AppKey("contexts", ConversationContexts)
+
+
+async def _cache_call(fn, *args):
+    # The optional SQLite tier blocks, so keep it off the event loop
+    if DIAGNOSIS_CACHE_PATH:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+
+async def analyze_symptoms(scheduler: AsyncGeminiScheduler, admission: AdmissionControl,
+                           symptoms: str, lane: int = INTERACTIVE) -> Tuple[dict, Optional[str]]:
+    """Analyze symptoms, returning the diagnosis and an error message if it failed"""
+    cache_key = make_key(symptoms)
+    cached = await _cache_call(get_cache().get, cache_key)
+    if cached is not None:
+        return cached, None
+
+    async with admission.slot():
+        try:
+            data = await scheduler.generate_content(build_diagnosis_payload(symptoms), lane=lane)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return failed_diagnosis(e, connection=True)
+        except Exception as e:
+            return failed_diagnosis(e, connection=False)
+
+    diagnosis, error = diagnosis_from_response(data)
+    if error is None:
+        await _cache_call(get_cache().put, cache_key, diagnosis)
+    return diagnosis, error
+
+
+async def _read_json(request: web.Request) -> dict:
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="Request body must be JSON")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text="Request body must be a JSON object")
+    return body
+
+
+def _conversation(body: dict) -> list:
+    conversation = body.get("conversation")
+    if not isinstance(conversation, list) or not all(
+            isinstance(entry, dict) and isinstance(entry.get("role"), str) and isinstance(entry.get("text"), str)
+            for entry in conversation):
+        raise web.HTTPBadRequest(text="'conversation' must be a list of {role, text} turns")
+    return conversation
+
+
+def _context(request: web.Request, body: dict) -> Optional[ConversationContext]:
+    conversation_id = body.get("conversation_id")
+    if conversation_id is None:
+        return None
+    if not isinstance(conversation_id, str) or not conversation_id:
+        raise web.HTTPBadRequest(text="'conversation_id' must be a non-empty string")
+    return request.app[CONTEXTS].get(conversation_id)
+
+
+async def handle_turn(request: web.Request) -> web.StreamResponse:
+    body = await _read_json(request)
+    payload = build_doctor_payload(_conversation(body), _context(request, body))
+    scheduler, admission = request.app[SCHEDULER], request.app[ADMISSION]
+    if request.query.get("stream") == "1":
+        return await _stream_turn(request, scheduler, admission, payload)
+
+    async with admission.slot():
+        try:
+            text = doctor_reply(await scheduler.generate_content(payload))
+        except Exception:
+            text = DOCTOR_ERROR_REPLY
+    return web.json_response({"text": text})
+
+
+async def _stream_turn(request: web.Request, scheduler: AsyncGeminiScheduler, admission: AdmissionControl,
+                       payload: dict) -> web.StreamResponse:
+    response = web.StreamResponse(headers={"Content-Type": "text/plain; charset=utf-8"})
+    async with admission.slot():
+        await response.prepare(request)
+        chunks = scheduler.stream_generate_content(payload)
+        received = False
+        fallback = None
+        while True:
+            try:
+                chunk = await anext(chunks)
+            except StopAsyncIteration:
+                fallback = None if received else DOCTOR_RETRY_REPLY
+                break
+            except Exception:
+                fallback = None if received else DOCTOR_ERROR_REPLY
+                break
+            received = True
+            await response.write(chunk.encode())
+        if fallback is not None:
+            await response.write(fallback.encode())
+        await response.write_eof()
+    return response
+
+
+async def handle_analyze(request: web.Request) -> web.Response:
+    body = await _read_json(request)
+    symptoms = body.get("symptoms")
+    if not isinstance(symptoms, str) or not symptoms.strip():
+        raise web.HTTPBadRequest(text="'symptoms' must be a non-empty string")
+    lane = BACKGROUND if body.get("background") else INTERACTIVE
+    diagnosis, error = await analyze_symptoms(request.app[SCHEDULER], request.app[ADMISSION], symptoms, lane)
+    return web.json_response({"diagnosis": diagnosis, "error": error})
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    return web.json_response({**request.app[ADMISSION].stats(), "scheduler": request.app[SCHEDULER].stats(),
+                              "conversations": len(request.app[CONTEXTS]), "cache": get_cache().stats()})
+
+
+@web.middleware
+async def _shed_load(request: web.Request, handler):
+    try:
+        return await handler(request)
+    except Overloaded:
+        return web.json_response({"error": "Service overloaded, please retry"}, status=503,
+                                 headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+
+async def _close_client(app: web.Application):
+    await app[CLIENT].close()
+
+
+def create_app(client: AsyncGeminiClient = None, admission: AdmissionControl = None,
+               scheduler: AsyncGeminiScheduler = None) -> web.Application:
+    app = web.Application(middlewares=[_shed_load])
+    app[CLIENT] = client or AsyncGeminiClient()
+    app[SCHEDULER] = scheduler or AsyncGeminiScheduler(app[CLIENT])
+    app[ADMISSION] = admission or AdmissionControl()
+    app[CONTEXTS] = ConversationContexts()
+    app.on_cleanup.append(_close_client)
+    app.add_routes([
+        web.post("/v1/turn", handle_turn),
+        web.post("/v1/analyze", handle_analyze),
+        web.get("/v1/health", handle_health),
+    ])
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve doctor turns and symptom analyses over HTTP")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""Bulk export of stored consultations as summary PDFs.
+
+Consultations are read from the patient store in id order and rendered with
+the same layout as the in-app summary across a process pool. PDFs go either
+into per-patient directories or into a series of zip parts. Progress is
+checkpointed, so an interrupted export picks up where it stopped:
+
+    python export_reports.py exports/ --format zip --since 2024-01-01
+"""
+import argparse
+import json
+import os
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+from patient_store import PATIENT_DB_PATH, PatientStore
+from pdf_summary import render_pdf, summary_from_record
+
+CHECKPOINT_FILE = ".export-checkpoint.json"
+
+
+def _init_worker():
+    # Load the PDF library and its font metrics once per worker rather than once per record
+    render_pdf({"Warm-up": ""})
+
+
+def _render_batch(records: list) -> list:
+    return [(record["id"], report_name(record), render_pdf(summary_from_record(record))) for record in records]
+
+
+def report_name(record: dict) -> str:
+    day = datetime.fromtimestamp(record["created"]).strftime("%Y-%m-%d")
+    return f"{record['patient_id']}/{day}_{record['id']}.pdf"
+
+
+class DirectorySink:
+    """Writes each report to ``<output>/<patient>/<date>_<id>.pdf``"""
+
+    def __init__(self, output: str, part: int = 0):
+        self.output = output
+        self.part = part
+
+    def write(self, name: str, data: bytes):
+        path = os.path.join(self.output, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", 'wb') as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+
+    def commit(self):
+        pass
+
+
+class ZipSink:
+    """Writes reports into ``consultations-NNNN.zip`` parts; a part only appears once complete"""
+
+    def __init__(self, output: str, part: int = 0):
+        self.output = output
+        self.part = part
+        self.archive = None
+
+    def _path(self) -> str:
+        return os.path.join(self.output, f"consultations-{self.part + 1:04d}.zip")
+
+    def write(self, name: str, data: bytes):
+        if self.archive is None:
+            self.archive = zipfile.ZipFile(self._path() + ".tmp", 'w', zipfile.ZIP_DEFLATED)
+        self.archive.writestr(name, data)
+
+    def commit(self):
+        if self.archive is None:
+            return
+        self.archive.close()
+        os.replace(self._path() + ".tmp", self._path())
+        self.archive = None
+        self.part += 1
+
+
+def _load_checkpoint(output: str) -> dict:
+    try:
+        with open(os.path.join(output, CHECKPOINT_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _save_checkpoint(output: str, checkpoint: dict):
+    path = os.path.join(output, CHECKPOINT_FILE)
+    with open(path + ".tmp", 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".tmp", path)
+
+
+def export(output: str, db_path: str = PATIENT_DB_PATH, fmt: str = "dir", workers: int = None,
+           batch_size: int = 50, part_size: int = 1000, since: float = None, until: float = None,
+           limit: int = None, restart: bool = False, report=print) -> dict:
+    """Export consultations as PDFs and return counts and throughput.
+
+    Progress is checkpointed after every committed batch (directory output)
+    or every finished zip part, and a later call with the same filters resumes
+    from there. ``limit`` caps how many consultations this call exports.
+    """
+    os.makedirs(output, exist_ok=True)
+    filters = {"format": fmt, "since": since, "until": until}
+    checkpoint = {} if restart else _load_checkpoint(output)
+    if checkpoint and checkpoint.get("filters") != filters:
+        raise ValueError(f"{output} holds an export with different settings; pass restart=True to start over")
+    last_id = checkpoint.get("last_id", 0)
+    exported = checkpoint.get("exported", 0)
+    sink = (ZipSink if fmt == "zip" else DirectorySink)(output, checkpoint.get("parts", 0))
+    commit_every = part_size if fmt == "zip" else batch_size
+
+    store = PatientStore(db_path)
+    records = store.iter_consultations(after_id=last_id, since=since, until=until)
+    if limit is not None:
+        records = islice(records, limit)
+    batches = iter(lambda: list(islice(records, batch_size)), [])
+
+    started = time.perf_counter()
+    progress = {"done": 0, "uncommitted": 0, "last_id": last_id}
+
+    def collect(future):
+        for report_id, name, data in future.result():
+            sink.write(name, data)
+            progress["last_id"] = report_id
+            progress["uncommitted"] += 1
+
+    def commit():
+        sink.commit()
+        progress["done"] += progress["uncommitted"]
+        progress["uncommitted"] = 0
+        _save_checkpoint(output, {"filters": filters, "last_id": progress["last_id"],
+                                  "exported": exported + progress["done"], "parts": sink.part})
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        # Keep a bounded window of batches in flight and write results back in id order
+        window = deque()
+        for batch in batches:
+            window.append(pool.submit(_render_batch, batch))
+            if len(window) < 2 * workers:
+                continue
+            collect(window.popleft())
+            if progress["uncommitted"] >= commit_every:
+                commit()
+                elapsed = time.perf_counter() - started
+                report(f"Exported {exported + progress['done']} consultations ({progress['done'] / elapsed:.1f}/s)")
+        while window:
+            collect(window.popleft())
+    commit()
+    store.close()
+    done = progress["done"]
+
+    elapsed = time.perf_counter() - started
+    stats = {"exported": done, "total": exported + done, "seconds": elapsed,
+             "per_second": done / elapsed if elapsed else 0.0}
+    report(f"Done: {done} consultations in {elapsed:.1f}s ({stats['per_second']:.1f}/s), "
+           f"{exported + done} exported to {output} in total")
+    return stats
+
+
+def _timestamp(day: str) -> float:
+    return datetime.strptime(day, "%Y-%m-%d").timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export stored consultations as summary PDFs")
+    parser.add_argument("output", help="directory for the per-patient PDFs or zip parts")
+    parser.add_argument("--db", default=PATIENT_DB_PATH, help="patient store database")
+    parser.add_argument("--format", choices=["dir", "zip"], default="dir")
+    parser.add_argument("--workers", type=int, default=None, help="render processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=50, help="consultations per render task")
+    parser.add_argument("--part-size", type=int, default=1000, help="consultations per zip part")
+    parser.add_argument("--since", help="first day to export, YYYY-MM-DD")
+    parser.add_argument("--until", help="day to stop before, YYYY-MM-DD")
+    parser.add_argument("--limit", type=int, help="export at most this many consultations in this run")
+    parser.add_argument("--restart", action="store_true", help="ignore any checkpoint and start over")
+    args = parser.parse_args()
+
+    export(args.output, db_path=args.db, fmt=args.format, workers=args.workers, batch_size=args.batch_size,
+           part_size=args.part_size, since=_timestamp(args.since) if args.since else None,
+           until=_timestamp(args.until) if args.until else None, limit=args.limit, restart=args.restart)
+
+
+if __name__ == "__main__":
+    main()
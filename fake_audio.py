@@ -0,0 +1,111 @@
+"""Offline stand-ins for a microphone and a speaker.
+
+``fake_microphone_manager`` returns an ``AudioDeviceManager`` whose input
+streams serve prepared audio (then quiet noise) without PortAudio, and can
+overflow or fail at a chosen read. Patch ``voice.get_audio_manager`` to return
+it to drive ``AudioRecorder`` in tests. ``fake_speaker_manager`` does the same
+for output: its streams take as long as real playback and keep what was played.
+"""
+import time
+
+import numpy as np
+
+from audio_devices import AudioDeviceManager
+
+
+class FakeMicrophone:
+    """Input stream serving ``audio`` and then quiet noise, with an overflow and a failure at given reads"""
+
+    def __init__(self, audio: np.ndarray = None, overflow_at: int = None, fail_at: int = None, **kwargs):
+        self.audio = audio.astype('<i2').tobytes() if audio is not None else b""
+        self.overflow_at = overflow_at
+        self.fail_at = fail_at
+        self.reads = 0
+        self.stopped = False
+        self.rng = np.random.default_rng(0)
+
+    def read(self, frames, exception_on_overflow=True):
+        index, self.reads = self.reads, self.reads + 1
+        if index == self.fail_at:
+            raise OSError(-9988, "Stream closed")
+        if index == self.overflow_at and exception_on_overflow:
+            raise OSError(-9981, "Input overflowed")
+        start = index * frames * 2
+        data = self.audio[start:start + frames * 2]
+        noise = self.rng.normal(0, 30, frames - len(data) // 2).astype('<i2').tobytes()
+        return data + noise
+
+    def is_stopped(self):
+        return self.stopped
+
+    def start_stream(self):
+        self.stopped = False
+
+    def stop_stream(self):
+        self.stopped = True
+
+    def close(self):
+        pass
+
+
+class FakeMicrophonePyAudio:
+    """PyAudio stand-in whose input streams are FakeMicrophones with the given options"""
+
+    def __init__(self, **stream_options):
+        self.stream_options = stream_options
+
+    def get_format_from_width(self, width):
+        return width
+
+    def open(self, **kwargs):
+        return FakeMicrophone(**self.stream_options)
+
+
+def fake_microphone_manager(**stream_options) -> AudioDeviceManager:
+    """Device manager handing out FakeMicrophones built with ``stream_options``"""
+    return AudioDeviceManager(pyaudio_factory=lambda: FakeMicrophonePyAudio(**stream_options))
+
+
+class FakeSpeaker:
+    """Output stream that takes real time to play each write and records the bytes played"""
+
+    def __init__(self, rate: int, channels: int = 1, width: int = 2):
+        self.bytes_per_second = rate * channels * width
+        self.played = bytearray()
+        self.stopped = False
+
+    def write(self, data):
+        time.sleep(len(data) / self.bytes_per_second)
+        self.played += data
+
+    def is_stopped(self):
+        return self.stopped
+
+    def start_stream(self):
+        self.stopped = False
+
+    def stop_stream(self):
+        self.stopped = True
+
+    def close(self):
+        pass
+
+
+class FakeSpeakerPyAudio:
+    """PyAudio stand-in whose output streams are FakeSpeakers, kept in ``speakers``"""
+
+    def __init__(self):
+        self.speakers = []
+
+    def get_format_from_width(self, width):
+        return width
+
+    def open(self, rate, channels=1, format=2, **kwargs):
+        speaker = FakeSpeaker(rate, channels, format)
+        self.speakers.append(speaker)
+        return speaker
+
+
+def fake_speaker_manager() -> AudioDeviceManager:
+    """Device manager handing out FakeSpeakers; they are listed in ``manager.pa.speakers``"""
+    return AudioDeviceManager(pyaudio_factory=FakeSpeakerPyAudio)
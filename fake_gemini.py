@@ -0,0 +1,112 @@
+"""Offline stand-in for the Gemini REST API.
+
+Serves ``generateContent`` and ``streamGenerateContent`` (as server-sent events)
+on a local port so the client and the app can be exercised without network
+access or an API key. Point ``GEMINI_API_BASE`` at
+``FakeGeminiServer.base_url`` (or pass it to ``GeminiClient``) to use it.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def gemini_response(text: str) -> dict:
+    """Build a generateContent response body carrying ``text``"""
+    return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server.fake
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        path, _, _ = self.path.partition("?")
+        model, _, method = path.rsplit("/", 1)[-1].partition(":")
+
+        with server.lock:
+            server.requests.append({"model": model, "method": method, "payload": payload,
+                                    "received": time.monotonic()})
+            server.connections.add(self.client_address)
+            status = server.statuses.pop(0) if server.statuses else 200
+
+        if status != 200:
+            self._send_json(status, {"error": {"code": status, "message": "fake error"}})
+            return
+        text = server.reply(payload)
+        if method == "streamGenerateContent":
+            self._send_stream(server.split(text), server.chunk_delay)
+        else:
+            self._send_json(200, gemini_response(text))
+
+    def _send_stream(self, chunks: list, delay: float):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in chunks:
+            time.sleep(delay)
+            event = f"data: {json.dumps(gemini_response(chunk))}\r\n\r\n".encode()
+            self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class FakeGeminiServer:
+    """Threaded fake Gemini endpoint.
+
+    ``reply`` maps a request payload to the model text to return. ``statuses``
+    is a queue of HTTP status codes to answer with before succeeding. Streamed
+    replies are cut into ``chunk_size``-word pieces sent ``chunk_delay`` apart.
+    """
+
+    def __init__(self, reply=None, statuses: list = None, chunk_size: int = 3, chunk_delay: float = 0.0):
+        self.reply = reply or (lambda payload: "This is a fake doctor response.")
+        self.statuses = list(statuses or [])
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.requests = []
+        self.connections = set()
+        self.lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread = None
+
+    def split(self, text: str) -> list:
+        words = text.split(" ")
+        return [" ".join(words[i:i + self.chunk_size]) + (" " if i + self.chunk_size < len(words) else "")
+                for i in range(0, len(words), self.chunk_size)]
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1beta/models"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,225 @@
+"""Non-blocking Gemini API client for asyncio servers.
+
+The asyncio counterpart of ``gemini_client``: one aiohttp session per event
+loop with a pooled keep-alive connector and the same jittered retry policy.
+Waiting on the API costs a coroutine rather than a thread, so one process can
+keep hundreds of calls in flight; the connector caps how many connections
+they use, and callers beyond that wait for a free one.
+
+``AsyncGeminiScheduler`` is the asyncio counterpart of
+``gemini_scheduler.GeminiScheduler``: the same per-minute token bucket,
+priority lanes and merging of identical concurrent requests, on one event loop.
+"""
+import asyncio
+import contextlib
+import heapq
+import itertools
+import json
+import os
+import time
+from typing import AsyncIterator
+
+import aiohttp
+
+from gemini_client import (GEMINI_API_BASE, GEMINI_API_KEY, GEMINI_BACKOFF_BASE, GEMINI_BACKOFF_CAP,
+                           GEMINI_CONNECT_TIMEOUT, GEMINI_MAX_RETRIES, GEMINI_MODEL, GEMINI_READ_TIMEOUT,
+                           RETRY_STATUSES, backoff_delay, extract_text)
+from gemini_scheduler import (GEMINI_RATE_BURST, GEMINI_RATE_PER_MINUTE, INTERACTIVE, LANES, TokenBucket,
+                              request_key)
+
+# Open connections to the API; every in-flight call holds one
+GEMINI_ASYNC_POOL_SIZE = int(os.getenv("GEMINI_ASYNC_POOL_SIZE", "256"))
+
+
+class AsyncGeminiClient:
+    def __init__(self, api_key: str = None, model: str = GEMINI_MODEL, base_url: str = GEMINI_API_BASE,
+                 pool_size: int = GEMINI_ASYNC_POOL_SIZE, connect_timeout: float = GEMINI_CONNECT_TIMEOUT,
+                 read_timeout: float = GEMINI_READ_TIMEOUT, max_retries: int = GEMINI_MAX_RETRIES,
+                 backoff_base: float = GEMINI_BACKOFF_BASE, backoff_cap: float = GEMINI_BACKOFF_CAP):
+        self.api_key = api_key if api_key is not None else GEMINI_API_KEY
+        self.model = model
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.session = None
+
+    def _session(self) -> aiohttp.ClientSession:
+        # Created on first use so it binds to the event loop that runs the calls
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_size)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self.session
+
+    def url(self, method: str = "generateContent", model: str = None) -> str:
+        return f"{self.base_url}/{model or self.model}:{method}"
+
+    async def _post(self, url: str, payload: dict, params: dict = None) -> aiohttp.ClientResponse:
+        query_params = {"key": self.api_key} if self.api_key else {}
+        if params:
+            query_params.update(params)
+
+        attempt = 0
+        while True:
+            try:
+                response = await self._session().post(url, params=query_params, json=payload)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_cap))
+                attempt += 1
+                continue
+
+            if response.status in RETRY_STATUSES and attempt < self.max_retries:
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap,
+                                      response.headers.get("Retry-After"))
+                response.release()
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            if response.status >= 400:
+                response.release()
+                response.raise_for_status()
+            return response
+
+    async def generate_content(self, payload: dict, model: str = None) -> dict:
+        """Call generateContent and return the decoded JSON response"""
+        response = await self._post(self.url("generateContent", model), payload)
+        async with response:
+            return await response.json(content_type=None)
+
+    async def stream_generate_content(self, payload: dict, model: str = None) -> AsyncIterator[str]:
+        """Call streamGenerateContent and yield text chunks as they arrive"""
+        response = await self._post(self.url("streamGenerateContent", model), payload, params={"alt": "sse"})
+        async with response:
+            async for raw in response.content:
+                line = raw.decode().strip()
+                if not line.startswith("data:"):
+                    continue
+                text = extract_text(json.loads(line[len("data:"):]))
+                if text:
+                    yield text
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+class AsyncGeminiScheduler:
+    """``GeminiScheduler`` for coroutines: the same token bucket, lanes, coalescing and promotion"""
+
+    def __init__(self, client: AsyncGeminiClient, rate_per_minute: float = GEMINI_RATE_PER_MINUTE,
+                 burst: int = GEMINI_RATE_BURST):
+        self.client = client
+        self._bucket = TokenBucket(rate_per_minute, burst)
+        self._cond = asyncio.Condition()
+        self._tickets = []  # heap of [lane, arrival] waiting for a token; the lane changes on promotion
+        self._arrivals = itertools.count()
+        self._inflight = {}  # request key -> (Future shared by identical callers, the leader's ticket)
+        self.calls = 0
+        self.coalesced = 0
+        self.promoted = 0
+        self._queued = {lane: 0 for lane in LANES}
+        self._waits = {lane: [0, 0.0, 0.0] for lane in LANES}  # count, total seconds, max seconds
+
+    def _ticket(self, lane: int) -> list:
+        return [lane, next(self._arrivals)]
+
+    async def _acquire(self, ticket: list):
+        """Wait until a token is free for this ticket, earlier lanes and arrivals first"""
+        started = time.monotonic()
+        async with self._cond:
+            heapq.heappush(self._tickets, ticket)
+            self._queued[ticket[0]] += 1
+            self._cond.notify_all()
+            try:
+                while True:
+                    if self._tickets[0] is ticket:
+                        delay = self._bucket.take()
+                        if delay == 0:
+                            break
+                        with contextlib.suppress(asyncio.TimeoutError):
+                            await asyncio.wait_for(self._cond.wait(), delay)
+                    else:
+                        await self._cond.wait()
+            finally:
+                self._tickets.remove(ticket)
+                heapq.heapify(self._tickets)
+                self._queued[ticket[0]] -= 1
+                self._cond.notify_all()
+
+                waited = time.monotonic() - started
+                waits = self._waits[ticket[0]]
+                waits[0] += 1
+                waits[1] += waited
+                waits[2] = max(waits[2], waited)
+                self.calls += 1
+
+    async def _promote(self, ticket: list, lane: int):
+        async with self._cond:
+            if lane >= ticket[0]:
+                return
+            queued = any(waiting is ticket for waiting in self._tickets)
+            if queued:
+                self._queued[ticket[0]] -= 1
+                self._queued[lane] += 1
+            ticket[0] = lane
+            self.promoted += 1
+            if queued:
+                heapq.heapify(self._tickets)
+                self._cond.notify_all()
+
+    async def generate_content(self, payload: dict, model: str = None, lane: int = INTERACTIVE,
+                               coalesce: bool = True) -> dict:
+        """Call generateContent once the rate limit allows, sharing the call with identical concurrent requests"""
+        if not coalesce:
+            await self._acquire(self._ticket(lane))
+            return await self.client.generate_content(payload, model)
+
+        key = request_key("generateContent", model, payload)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            shared, ticket = inflight
+            await self._promote(ticket, lane)
+            # Shielded so one follower going away does not cancel the call for everyone
+            return await asyncio.shield(shared)
+
+        shared = asyncio.get_running_loop().create_future()
+        ticket = self._ticket(lane)
+        self._inflight[key] = (shared, ticket)
+        try:
+            await self._acquire(ticket)
+            data = await self.client.generate_content(payload, model)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                shared.cancel()
+            else:
+                shared.set_exception(e)
+                # Followers re-raise it; mark it retrieved in case there are none
+                shared.exception()
+            raise
+        else:
+            shared.set_result(data)
+            return data
+        finally:
+            del self._inflight[key]
+
+    async def stream_generate_content(self, payload: dict, model: str = None,
+                                      lane: int = INTERACTIVE) -> AsyncIterator[str]:
+        """Stream a response once the rate limit allows; streams are never shared"""
+        await self._acquire(self._ticket(lane))
+        async for chunk in self.client.stream_generate_content(payload, model):
+            yield chunk
+
+    def stats(self) -> dict:
+        lanes = {}
+        for lane, name in LANES.items():
+            count, total, longest = self._waits[lane]
+            lanes[name] = {"queued": self._queued[lane], "calls": count,
+                           "mean_wait": total / count if count else 0.0, "max_wait": longest}
+        return {"calls": self.calls, "coalesced": self.coalesced, "promoted": self.promoted, "lanes": lanes}
@@ -0,0 +1,140 @@
+"""Shared Gemini API client.
+
+A single pooled, keep-alive ``requests.Session`` lives for the whole process and
+is shared by every Streamlit session, so doctor turns and symptom analyses reuse
+warm connections instead of paying a DNS lookup and TLS handshake per call.
+"""
+import json
+import os
+import random
+import threading
+import time
+from typing import Iterator, Optional
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+# Load environment variables
+load_dotenv()
+
+# Gemini API configuration
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta/models")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+GEMINI_API_URL = f"{GEMINI_API_BASE}/{GEMINI_MODEL}:generateContent"
+
+# Connection pool and retry tuning
+GEMINI_POOL_SIZE = int(os.getenv("GEMINI_POOL_SIZE", "10"))
+GEMINI_CONNECT_TIMEOUT = float(os.getenv("GEMINI_CONNECT_TIMEOUT", "3.05"))
+GEMINI_READ_TIMEOUT = float(os.getenv("GEMINI_READ_TIMEOUT", "30"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "0.5"))
+GEMINI_BACKOFF_CAP = float(os.getenv("GEMINI_BACKOFF_CAP", "8"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: str = None) -> float:
+    """Full-jitter exponential backoff, honouring a server Retry-After hint"""
+    if retry_after:
+        try:
+            return min(float(retry_after), cap)
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class GeminiClient:
+    def __init__(self, api_key: str = None, model: str = GEMINI_MODEL, base_url: str = GEMINI_API_BASE,
+                 pool_size: int = GEMINI_POOL_SIZE, connect_timeout: float = GEMINI_CONNECT_TIMEOUT,
+                 read_timeout: float = GEMINI_READ_TIMEOUT, max_retries: int = GEMINI_MAX_RETRIES,
+                 backoff_base: float = GEMINI_BACKOFF_BASE, backoff_cap: float = GEMINI_BACKOFF_CAP):
+        self.api_key = api_key if api_key is not None else GEMINI_API_KEY
+        self.model = model
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+        # Retries are handled in _post so they can be jittered and cover POST
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def url(self, method: str = "generateContent", model: str = None) -> str:
+        return f"{self.base_url}/{model or self.model}:{method}"
+
+    def _backoff(self, attempt: int, retry_after: str = None) -> float:
+        return backoff_delay(attempt, self.backoff_base, self.backoff_cap, retry_after)
+
+    def _post(self, url: str, payload: dict, params: dict = None, stream: bool = False) -> requests.Response:
+        query_params = {"key": self.api_key}
+        if params:
+            query_params.update(params)
+
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(url, params=query_params, json=payload,
+                                             timeout=self.timeout, stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                delay = self._backoff(attempt, response.headers.get("Retry-After"))
+                response.close()
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            response.raise_for_status()
+            return response
+
+    def generate_content(self, payload: dict, model: str = None) -> dict:
+        """Call generateContent and return the decoded JSON response"""
+        response = self._post(self.url("generateContent", model), payload)
+        return response.json()
+
+    def stream_generate_content(self, payload: dict, model: str = None) -> Iterator[str]:
+        """Call streamGenerateContent and yield text chunks as they arrive"""
+        response = self._post(self.url("streamGenerateContent", model), payload,
+                              params={"alt": "sse"}, stream=True)
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                text = extract_text(json.loads(line[len("data:"):]))
+                if text:
+                    yield text
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> GeminiClient:
+    """Return the process-wide Gemini client, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GeminiClient()
+    return _client
+
+
+def extract_text(data: dict) -> Optional[str]:
+    """Return the first candidate's text from a Gemini response, if any"""
+    if 'candidates' in data and len(data['candidates']) > 0:
+        return data['candidates'][0]['content']['parts'][0]['text']
+    return None
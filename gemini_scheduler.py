@@ -0,0 +1,195 @@
+"""Process-wide scheduling of outbound Gemini calls.
+
+Every Streamlit session sends its calls through one scheduler, which
+coordinates them in three ways:
+
+* a token bucket keeps the process under the per-minute request quota
+  (``GEMINI_RATE_PER_MINUTE``, with bursts of up to ``GEMINI_RATE_BURST``),
+  so bursts wait briefly here instead of tripping 429s at the API;
+* callers waiting for a token are served by lane, interactive turns before
+  background work such as speculative analyses, and in arrival order within
+  a lane;
+* identical concurrent requests are merged: the first caller makes the
+  call, the rest wait for and share its result. An interactive caller that
+  joins a background call still waiting for a token moves it to the
+  interactive lane, so sharing never leaves a user waiting at background
+  priority.
+
+``stats()`` reports queue depth and wait times per lane. The asyncio
+counterpart for the diagnosis service is ``gemini_async.AsyncGeminiScheduler``.
+"""
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Iterator
+
+from gemini_client import GeminiClient, get_client
+
+GEMINI_RATE_PER_MINUTE = float(os.getenv("GEMINI_RATE_PER_MINUTE", "1000"))
+GEMINI_RATE_BURST = int(os.getenv("GEMINI_RATE_BURST", "10"))
+
+# Priority lanes, served in this order
+INTERACTIVE = 0
+BACKGROUND = 1
+LANES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+
+def request_key(method: str, model: str, payload: dict) -> str:
+    return hashlib.sha256(json.dumps([method, model, payload], sort_keys=True).encode()).hexdigest()
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take a token if one is available and return 0, else return the seconds until one is"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class GeminiScheduler:
+    def __init__(self, client: GeminiClient = None, rate_per_minute: float = GEMINI_RATE_PER_MINUTE,
+                 burst: int = GEMINI_RATE_BURST):
+        self._client = client
+        self._bucket = TokenBucket(rate_per_minute, burst)
+        self._cond = threading.Condition()
+        self._tickets = []  # heap of [lane, arrival] waiting for a token; the lane changes on promotion
+        self._arrivals = itertools.count()
+        self._inflight = {}  # request key -> (Future shared by identical callers, the leader's ticket)
+        self._inflight_lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+        self.promoted = 0
+        self._queued = {lane: 0 for lane in LANES}
+        self._waits = {lane: [0, 0.0, 0.0] for lane in LANES}  # count, total seconds, max seconds
+
+    @property
+    def client(self) -> GeminiClient:
+        return self._client or get_client()
+
+    def _ticket(self, lane: int) -> list:
+        return [lane, next(self._arrivals)]
+
+    def _acquire(self, ticket: list):
+        """Block until a token is free for this ticket, earlier lanes and arrivals first"""
+        started = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._tickets, ticket)
+            self._queued[ticket[0]] += 1
+            # A new ticket may go ahead of the one currently waiting for a token
+            self._cond.notify_all()
+            try:
+                while True:
+                    if self._tickets[0] is ticket:
+                        delay = self._bucket.take()
+                        if delay == 0:
+                            break
+                        self._cond.wait(delay)
+                    else:
+                        self._cond.wait()
+            finally:
+                self._tickets.remove(ticket)
+                heapq.heapify(self._tickets)
+                self._queued[ticket[0]] -= 1
+                self._cond.notify_all()
+
+                waited = time.monotonic() - started
+                waits = self._waits[ticket[0]]
+                waits[0] += 1
+                waits[1] += waited
+                waits[2] = max(waits[2], waited)
+                self.calls += 1
+
+    def _promote(self, ticket: list, lane: int):
+        """Move a ticket to an earlier lane, whether or not it is queued yet"""
+        with self._cond:
+            if lane >= ticket[0]:
+                return
+            queued = any(waiting is ticket for waiting in self._tickets)
+            if queued:
+                self._queued[ticket[0]] -= 1
+                self._queued[lane] += 1
+            ticket[0] = lane
+            self.promoted += 1
+            if queued:
+                heapq.heapify(self._tickets)
+                self._cond.notify_all()
+
+    def generate_content(self, payload: dict, model: str = None, lane: int = INTERACTIVE,
+                         coalesce: bool = True) -> dict:
+        """Call generateContent once the rate limit allows, sharing the call with identical concurrent requests.
+
+        ``coalesce=False`` always makes a call of its own, as a hedge for a stalled request must.
+        """
+        if not coalesce:
+            self._acquire(self._ticket(lane))
+            return self.client.generate_content(payload, model)
+
+        key = request_key("generateContent", model, payload)
+        with self._inflight_lock:
+            inflight = self._inflight.get(key)
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight[key] = (Future(), self._ticket(lane))
+            else:
+                self.coalesced += 1
+        shared, ticket = inflight
+        if not leader:
+            # A more urgent caller must not wait behind the lane of the call it shares
+            self._promote(ticket, lane)
+            return shared.result()
+
+        try:
+            self._acquire(ticket)
+            data = self.client.generate_content(payload, model)
+        except BaseException as e:
+            shared.set_exception(e)
+            raise
+        else:
+            shared.set_result(data)
+            return data
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+
+    def stream_generate_content(self, payload: dict, model: str = None, lane: int = INTERACTIVE) -> Iterator[str]:
+        """Stream a response once the rate limit allows; streams are never shared"""
+        self._acquire(self._ticket(lane))
+        yield from self.client.stream_generate_content(payload, model)
+
+    def stats(self) -> dict:
+        with self._cond:
+            lanes = {}
+            for lane, name in LANES.items():
+                count, total, longest = self._waits[lane]
+                lanes[name] = {"queued": self._queued[lane], "calls": count,
+                               "mean_wait": total / count if count else 0.0, "max_wait": longest}
+            return {"calls": self.calls, "coalesced": self.coalesced, "promoted": self.promoted, "lanes": lanes}
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> GeminiScheduler:
+    """Return the process-wide Gemini scheduler, creating it on first use"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = GeminiScheduler()
+    return _scheduler
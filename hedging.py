@@ -0,0 +1,247 @@
+"""Tail-latency hedging for doctor turns.
+
+If a turn has not answered by the ``HEDGE_PERCENTILE`` of recent latencies, a
+second copy of the request goes out (to ``HEDGE_FALLBACK_MODEL`` when one is
+set) and whichever answers first is used. Streamed turns are hedged on the
+time to their first chunk. Latencies come from rolling histograms of recent
+primary requests, one for whole replies and one for first chunks. Hedges are
+paid from a budget that grows by ``HEDGE_BUDGET_RATIO`` per turn, so hedging
+adds at most that fraction of extra calls however slow the API gets.
+"""
+import math
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturesTimeout
+from typing import Callable, Iterator, Optional
+
+HEDGE_TURNS = os.getenv("HEDGE_TURNS", "1") == "1"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_FALLBACK_MODEL = os.getenv("HEDGE_FALLBACK_MODEL", "")
+HEDGE_BUDGET_RATIO = float(os.getenv("HEDGE_BUDGET_RATIO", "0.1"))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "500"))
+
+# Until this many latencies are known, hedge after a fixed delay
+HEDGE_MIN_SAMPLES = 20
+HEDGE_INITIAL_DELAY = 5.0
+
+# Unspent hedges saved up during quiet periods, so a slow spell cannot double the load at once
+HEDGE_MAX_BUDGET = 5
+
+# Threads carrying hedged requests; a stalled loser keeps its thread until the read timeout
+HEDGE_WORKERS = int(os.getenv("HEDGE_WORKERS", "32"))
+
+_DONE = object()
+
+
+class LatencyHistogram:
+    """Latencies of the last ``window`` requests in log-spaced buckets, about 9% wide"""
+
+    def __init__(self, window: int = HEDGE_WINDOW, min_seconds: float = 0.01, max_seconds: float = 300.0,
+                 buckets_per_doubling: int = 8):
+        self.min_seconds = min_seconds
+        self.buckets_per_doubling = buckets_per_doubling
+        self.counts = [0] * (self._bucket(max_seconds) + 1)
+        self.recent = deque()
+        self.window = window
+        self._lock = threading.Lock()
+
+    def _bucket(self, seconds: float) -> int:
+        if seconds <= self.min_seconds:
+            return 0
+        return math.ceil(math.log2(seconds / self.min_seconds) * self.buckets_per_doubling)
+
+    def record(self, seconds: float):
+        bucket = min(self._bucket(seconds), len(self.counts) - 1)
+        with self._lock:
+            self.recent.append(bucket)
+            self.counts[bucket] += 1
+            if len(self.recent) > self.window:
+                self.counts[self.recent.popleft()] -= 1
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Upper edge of the bucket holding the ``p``-th percentile, or None with no samples"""
+        with self._lock:
+            if not self.recent:
+                return None
+            rank = max(1, math.ceil(len(self.recent) * p / 100))
+            seen = 0
+            for bucket, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank:
+                    return self.min_seconds * 2 ** (bucket / self.buckets_per_doubling)
+
+    def __len__(self) -> int:
+        return len(self.recent)
+
+
+class Hedger:
+    def __init__(self, percentile: float = HEDGE_PERCENTILE, fallback_model: str = HEDGE_FALLBACK_MODEL,
+                 budget_ratio: float = HEDGE_BUDGET_RATIO, max_budget: float = HEDGE_MAX_BUDGET,
+                 min_samples: int = HEDGE_MIN_SAMPLES, initial_delay: float = HEDGE_INITIAL_DELAY,
+                 histogram: LatencyHistogram = None, workers: int = HEDGE_WORKERS, enabled: bool = HEDGE_TURNS):
+        self.percentile = percentile
+        self.fallback_model = fallback_model or None
+        self.budget_ratio = budget_ratio
+        self.max_budget = max_budget
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.histogram = histogram if histogram is not None else LatencyHistogram()
+        self.first_chunk_histogram = LatencyHistogram(self.histogram.window)
+        self.enabled = enabled
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._budget = 1.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hedge")
+
+    def delay(self, histogram: LatencyHistogram = None) -> float:
+        """Seconds to wait for the primary request before hedging"""
+        if histogram is None:
+            histogram = self.histogram
+        if len(histogram) < self.min_samples:
+            return self.initial_delay
+        return histogram.percentile(self.percentile)
+
+    def _deposit(self):
+        with self._lock:
+            self.requests += 1
+            self._budget = min(self.max_budget, self._budget + self.budget_ratio)
+
+    def _spend(self) -> bool:
+        with self._lock:
+            if self._budget < 1:
+                return False
+            self._budget -= 1
+            self.hedges += 1
+            return True
+
+    def _timed(self, request: Callable, model: Optional[str]):
+        started = time.monotonic()
+        result = request(model, False)
+        self.histogram.record(time.monotonic() - started)
+        return result
+
+    def call(self, request: Callable):
+        """Run ``request(model, is_hedge)``, hedging it if it is slow.
+
+        The primary gets model None and ``is_hedge`` False; the hedge gets the
+        fallback model and ``is_hedge`` True, and must not share the primary's call.
+        """
+        if not self.enabled:
+            return request(None, False)
+        self._deposit()
+        primary = self._executor.submit(self._timed, request, None)
+        try:
+            return primary.result(timeout=self.delay())
+        except FuturesTimeout:
+            pass
+        if not self._spend():
+            return primary.result()
+
+        hedge = self._executor.submit(request, self.fallback_model, True)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+        # Both failed: report the primary's error
+        return primary.result()
+
+    def stream(self, request: Callable) -> Iterator[str]:
+        """Stream ``request(model, is_hedge)``, hedging on the time to the first chunk.
+
+        The first request to produce anything (a chunk, the end of its reply, or
+        an error once no other request is left running) is followed to the end;
+        the other is abandoned at its next chunk.
+        """
+        if not self.enabled:
+            yield from request(None, False)
+            return
+        self._deposit()
+        items = queue.Queue()
+        stopped = [threading.Event(), threading.Event()]
+
+        def pump(source: int, model: Optional[str]):
+            started = time.monotonic()
+            chunks = None
+            try:
+                chunks = request(model, source == 1)
+                for chunk in chunks:
+                    if started is not None:
+                        if source == 0:
+                            self.first_chunk_histogram.record(time.monotonic() - started)
+                        started = None
+                    if stopped[source].is_set():
+                        return
+                    items.put((source, chunk))
+                items.put((source, _DONE))
+            except Exception as e:
+                items.put((source, e))
+            finally:
+                if chunks is not None and hasattr(chunks, "close"):
+                    chunks.close()
+
+        self._executor.submit(pump, 0, None)
+        running = 1
+        may_hedge = True
+        winner = None
+        try:
+            while True:
+                try:
+                    source, item = items.get(timeout=self.delay(self.first_chunk_histogram) if may_hedge else None)
+                except queue.Empty:
+                    may_hedge = False
+                    if self._spend():
+                        self._executor.submit(pump, 1, self.fallback_model)
+                        running += 1
+                    continue
+
+                if winner is None:
+                    if isinstance(item, Exception) and running > 1:
+                        # Let the other request answer instead
+                        running -= 1
+                        continue
+                    winner = source
+                    may_hedge = False
+                    stopped[1 - source].set()
+                    if source == 1:
+                        with self._lock:
+                            self.hedge_wins += 1
+                if source != winner:
+                    continue
+                if item is _DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            for event in stopped:
+                event.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": self.requests, "hedges": self.hedges, "hedge_wins": self.hedge_wins,
+                    "delay": self.delay(), "first_chunk_delay": self.delay(self.first_chunk_histogram)}
+
+
+_hedger = None
+_hedger_lock = threading.Lock()
+
+
+def get_hedger() -> Hedger:
+    """Return the process-wide hedger for doctor turns, creating it on first use"""
+    global _hedger
+    if _hedger is None:
+        with _hedger_lock:
+            if _hedger is None:
+                _hedger = Hedger()
+    return _hedger
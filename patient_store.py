@@ -0,0 +1,349 @@
+"""Transactional patient-record store.
+
+Patients and their consultations live in one SQLite database in WAL mode, so
+readers never block the writer. Patient details are upserted per patient id
+and consultations are append-only rows indexed by patient and date. Writes go
+through a write-behind queue drained by a single writer thread, which commits
+whatever has queued up in one transaction; each record is still applied
+atomically on its own savepoint.
+
+History queries (by patient, date range, risk rating and full text over the
+conversation) are answered from indexes maintained at write time: B-tree
+indexes on the consultation columns and an FTS5 index over the turns.
+
+Patient ids are random and never shown. Instead each patient is issued a short
+random patient number on first save; ``find_patient`` turns that number plus
+the patient's date of birth back into their id, so a returning patient can
+reach their own record from a new session.
+"""
+import atexit
+import json
+import os
+import queue
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional
+
+from app_data import APP_DATA_DIR, private_file
+
+PATIENT_DB_PATH = os.getenv("PATIENT_DB_PATH", os.path.join(APP_DATA_DIR, "patients.db"))
+PATIENT_WRITE_BATCH = int(os.getenv("PATIENT_WRITE_BATCH", "64"))
+
+PATIENT_FIELDS = ("name", "dob", "insurance_name", "insurance_id")
+
+# Digits in a patient number, shown as two groups of four
+PATIENT_NUMBER_DIGITS = 8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    patient_id TEXT PRIMARY KEY,
+    name TEXT,
+    dob TEXT,
+    insurance_name TEXT,
+    insurance_id TEXT,
+    patient_number TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS consultations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_id TEXT NOT NULL,
+    created REAL NOT NULL,
+    kind TEXT NOT NULL,
+    symptoms TEXT,
+    risk_rating INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS consultations_patient ON consultations (patient_id, created);
+CREATE INDEX IF NOT EXISTS consultations_created ON consultations (created);
+CREATE INDEX IF NOT EXISTS consultations_risk ON consultations (risk_rating, created);
+CREATE VIRTUAL TABLE IF NOT EXISTS consultations_fts USING fts5 (text, content='');
+"""
+
+# Bumped when SCHEMA adds columns or indexes that existing rows must be backfilled into
+SCHEMA_VERSION = 3
+
+
+def consultation_text(data: dict, symptoms: str = None) -> str:
+    """Searchable text of a consultation: the symptoms plus every conversation turn"""
+    parts = [symptoms or data.get("symptoms") or ""]
+    parts += [turn.get("text", "") for turn in data.get("conversation") or []]
+    return "\n".join(part for part in parts if part)
+
+
+def new_patient_number() -> str:
+    digits = f"{secrets.randbelow(10 ** PATIENT_NUMBER_DIGITS):0{PATIENT_NUMBER_DIGITS}d}"
+    return f"{digits[:4]}-{digits[4:]}"
+
+
+def normalize_patient_number(text: str) -> Optional[str]:
+    """The canonical form of a typed patient number, or None if it cannot be one"""
+    digits = re.sub(r"\D", "", text or "")
+    if len(digits) != PATIENT_NUMBER_DIGITS:
+        return None
+    return f"{digits[:4]}-{digits[4:]}"
+
+
+def fts_query(text: str) -> str:
+    """Match every word of ``text``, ignoring FTS query syntax the user may have typed"""
+    words = re.findall(r"\w+", text)
+    return " ".join('"' + word + '"' for word in words)
+
+
+class PatientStore:
+    def __init__(self, path: str = PATIENT_DB_PATH, batch_size: int = PATIENT_WRITE_BATCH):
+        # SQLite gives the -wal and -shm files the database file's permissions
+        self.path = private_file(path)
+        self.batch_size = batch_size
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._closed = False
+
+        self._migrate(self._reader())
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=30)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _migrate(self, db: sqlite3.Connection):
+        db.executescript(SCHEMA)
+        db.execute("BEGIN IMMEDIATE")
+        version = db.execute("PRAGMA user_version").fetchone()[0]
+        if version < 2:
+            # Index consultations written before full-text search existed
+            for row in db.execute("SELECT id, symptoms, data FROM consultations").fetchall():
+                db.execute("INSERT INTO consultations_fts (rowid, text) VALUES (?, ?)",
+                           (row["id"], consultation_text(json.loads(row["data"]), row["symptoms"])))
+        if version < 3:
+            # Patients saved before patient numbers existed get one on their next save
+            columns = [row["name"] for row in db.execute("PRAGMA table_info(patients)")]
+            if "patient_number" not in columns:
+                db.execute("ALTER TABLE patients ADD COLUMN patient_number TEXT")
+        db.execute("CREATE UNIQUE INDEX IF NOT EXISTS patients_number ON patients (patient_number)")
+        db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        db.execute("COMMIT")
+
+    def _reader(self) -> sqlite3.Connection:
+        # One connection per reading thread; WAL lets them run alongside the writer
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = self._connect()
+        return db
+
+    def _submit(self, write) -> Future:
+        if self._closed:
+            raise RuntimeError("Patient store is closed")
+        future = Future()
+        self._queue.put((write, future))
+        return future
+
+    def _write_loop(self):
+        db = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            batch = [item for item in batch if item is not None]
+            if batch:
+                self._apply(db, batch)
+            if stop:
+                db.close()
+                return
+
+    def _apply(self, db: sqlite3.Connection, batch: list):
+        results = []
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            for write, future in batch:
+                db.execute("SAVEPOINT record")
+                try:
+                    results.append((future, write(db), None))
+                    db.execute("RELEASE record")
+                except Exception as e:
+                    db.execute("ROLLBACK TO record")
+                    db.execute("RELEASE record")
+                    results.append((future, None, e))
+            db.execute("COMMIT")
+        except Exception as e:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            results = [(future, None, e) for _, future in batch]
+        # Futures resolve only once their records are durable
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def save_patient(self, patient_id: str, **fields) -> Future:
+        """Queue an upsert of the given patient fields; other fields keep their values.
+
+        A patient without a patient number is issued one in the same write.
+        """
+        unknown = set(fields) - set(PATIENT_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown patient fields: {', '.join(sorted(unknown))}")
+        now = time.time()
+        columns = list(fields)
+
+        # Column names come from PATIENT_FIELDS only, never from user input
+        names = ", ".join(["patient_id", "created", "updated"] + columns)
+        placeholders = ", ".join("?" * (3 + len(columns)))
+        updates = ", ".join(f"{column} = excluded.{column}" for column in ["updated"] + columns)
+        sql = (f"INSERT INTO patients ({names}) VALUES ({placeholders}) "
+               f"ON CONFLICT (patient_id) DO UPDATE SET {updates}")
+        values = [patient_id, now, now] + [fields[column] for column in columns]
+
+        def write(db):
+            db.execute(sql, values)
+            select = "SELECT patient_number FROM patients WHERE patient_id = ?"
+            while db.execute(select, (patient_id,)).fetchone()[0] is None:
+                try:
+                    db.execute("UPDATE patients SET patient_number = ? WHERE patient_id = ?",
+                               (new_patient_number(), patient_id))
+                except sqlite3.IntegrityError:
+                    pass  # Drawn before; draw again
+            return patient_id
+
+        return self._submit(write)
+
+    def add_consultation(self, patient_id: str, kind: str, data: dict, symptoms: str = None,
+                         risk_rating: int = None, created: float = None) -> Future:
+        """Queue an append-only consultation record; the future resolves to its row id"""
+        created = time.time() if created is None else created
+        row = (patient_id, created, kind, symptoms, risk_rating, json.dumps(data))
+
+        text = consultation_text(data, symptoms)
+
+        def write(db):
+            row_id = db.execute("INSERT INTO consultations (patient_id, created, kind, symptoms, risk_rating, data) "
+                                "VALUES (?, ?, ?, ?, ?, ?)", row).lastrowid
+            db.execute("INSERT INTO consultations_fts (rowid, text) VALUES (?, ?)", (row_id, text))
+            return row_id
+
+        return self._submit(write)
+
+    def flush(self, timeout: float = None):
+        """Block until every write queued so far is committed"""
+        self._submit(lambda db: None).result(timeout)
+
+    def get_patient(self, patient_id: str) -> Optional[dict]:
+        row = self._reader().execute("SELECT * FROM patients WHERE patient_id = ?", (patient_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def find_patient(self, patient_number: str, dob: str) -> Optional[str]:
+        """The id of the patient with this patient number and date of birth, or None"""
+        number = normalize_patient_number(patient_number)
+        if number is None:
+            return None
+        row = self._reader().execute("SELECT patient_id, dob FROM patients WHERE patient_number = ?",
+                                     (number,)).fetchone()
+        if row is None or row["dob"] != dob:
+            return None
+        return row["patient_id"]
+
+    def consultations(self, patient_id: str) -> list:
+        """All consultations for a patient, oldest first"""
+        rows = self._reader().execute("SELECT * FROM consultations WHERE patient_id = ? ORDER BY created, id",
+                                      (patient_id,)).fetchall()
+        return [_consultation(row) for row in rows]
+
+    def iter_consultations(self, after_id: int = 0, since: float = None, until: float = None,
+                           batch_size: int = 500):
+        """Yield consultations in id order, one page at a time, starting after ``after_id``"""
+        conditions, params = ["id > ?"], []
+        if since is not None:
+            conditions.append("created >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("created < ?")
+            params.append(until)
+        sql = f"SELECT * FROM consultations WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?"
+        while True:
+            rows = self._reader().execute(sql, [after_id] + params + [batch_size]).fetchall()
+            for row in rows:
+                yield _consultation(row)
+            if len(rows) < batch_size:
+                return
+            after_id = rows[-1]["id"]
+
+    def search(self, patient_id: str = None, since: float = None, until: float = None, min_risk: int = None,
+               max_risk: int = None, text: str = None, limit: int = 50, offset: int = 0) -> list:
+        """Consultations matching every given filter, newest first.
+
+        ``since`` and ``until`` are Unix timestamps (``until`` exclusive); ``text``
+        matches all of its words anywhere in the symptoms or conversation.
+        """
+        conditions, params = [], []
+        if patient_id is not None:
+            conditions.append("patient_id = ?")
+            params.append(patient_id)
+        if since is not None:
+            conditions.append("created >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("created < ?")
+            params.append(until)
+        if min_risk is not None:
+            conditions.append("risk_rating >= ?")
+            params.append(min_risk)
+        if max_risk is not None:
+            conditions.append("risk_rating <= ?")
+            params.append(max_risk)
+        if text:
+            query = fts_query(text)
+            if not query:
+                return []
+            if patient_id is not None:
+                # A patient has few visits: probe the full-text index once per visit
+                conditions.append("EXISTS (SELECT 1 FROM consultations_fts "
+                                  "WHERE consultations_fts MATCH ? AND rowid = consultations.id)")
+            else:
+                conditions.append("id IN (SELECT rowid FROM consultations_fts WHERE consultations_fts MATCH ?)")
+            params.append(query)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        rows = self._reader().execute(f"SELECT * FROM consultations {where}ORDER BY created DESC, id DESC "
+                                      "LIMIT ? OFFSET ?", params + [limit, offset]).fetchall()
+        return [_consultation(row) for row in rows]
+
+    def close(self):
+        """Commit queued writes and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+
+
+def _consultation(row: sqlite3.Row) -> dict:
+    record = dict(row)
+    record["data"] = json.loads(record["data"])
+    return record
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> PatientStore:
+    """Return the process-wide patient store, creating it on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = PatientStore()
+                atexit.register(_store.close)
+    return _store
@@ -0,0 +1,143 @@
+"""Background rendering of consultation summary PDFs.
+
+Summaries are rendered into memory on a small worker pool, so the handlers
+that request them return immediately and concurrent sessions never share a
+file on disk. Finished documents are cached by a hash of their content; a
+rerun that asks for the same summary gets the cached bytes (or the render
+already in flight) instead of a second render.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "2"))
+PDF_CACHE_SIZE = int(os.getenv("PDF_CACHE_SIZE", "64"))
+
+
+def content_key(data: dict) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _latin1(text) -> str:
+    # The built-in PDF fonts only cover Latin-1
+    return str(text).encode('latin-1', 'replace').decode('latin-1')
+
+
+def _write_value(pdf, value):
+    if isinstance(value, dict) and {'role', 'text'} <= set(value):
+        speaker = "Doctor" if value['role'] == 'doctor' else "Patient"
+        pdf.multi_cell(0, 7, txt=_latin1(f"{speaker}: {value['text']}"))
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            if isinstance(item, (list, dict)):
+                pdf.multi_cell(0, 7, txt=_latin1(f"{key}:"))
+                _write_value(pdf, item)
+            else:
+                pdf.multi_cell(0, 7, txt=_latin1(f"{key}: {item}"))
+    elif isinstance(value, list):
+        for item in value:
+            if isinstance(item, dict):
+                _write_value(pdf, item)
+            else:
+                pdf.multi_cell(0, 7, txt=_latin1(f"- {item}"))
+    else:
+        pdf.multi_cell(0, 7, txt=_latin1(value))
+
+
+def render_pdf(data: dict) -> bytes:
+    """Render a summary PDF in memory, one section per top-level key"""
+    from fpdf import FPDF  # loaded on first render rather than at app startup
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    pdf.cell(200, 10, txt="Patient History Summary", ln=True, align='C')
+    for key, value in data.items():
+        pdf.set_font("Arial", style='B', size=12)
+        pdf.cell(0, 10, txt=_latin1(key), ln=True)
+        pdf.set_font("Arial", size=11)
+        _write_value(pdf, value)
+    output = pdf.output(dest='S')
+    # fpdf 1.x returns a Latin-1 string, fpdf2 returns bytes
+    return output.encode('latin-1') if isinstance(output, str) else bytes(output)
+
+
+def summary_from_record(record: dict) -> dict:
+    """Lay out a stored consultation the same way the app summarizes it"""
+    data = record["data"]
+    if record["kind"] == "conversation":
+        return {
+            "Conversation": data.get("conversation", []),
+            "Final Diagnosis": data.get("diagnosis", {}),
+        }
+    return {
+        "Symptoms": data.get("symptoms", record.get("symptoms") or ""),
+        "Diagnosis": data.get("diagnosis", {}),
+        "Severity": f"{data['severity']}/10" if "severity" in data else "",
+        "Duration": data.get("duration", ""),
+    }
+
+
+class PDFRenderer:
+    def __init__(self, workers: int = PDF_WORKERS, max_entries: int = PDF_CACHE_SIZE, render=render_pdf):
+        self.render = render
+        self.max_entries = max_entries
+        self.hits = 0
+        self.renders = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf")
+        self._cache = OrderedDict()  # content key -> rendered PDF bytes
+        self._pending = {}           # content key -> Future of a render in flight
+        self._lock = threading.Lock()
+
+    def submit(self, data: dict) -> Future:
+        """Return a future for the rendered PDF, starting a render only if needed"""
+        key = content_key(data)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                future = Future()
+                future.set_result(self._cache[key])
+                return future
+            if key in self._pending:
+                self.hits += 1
+                return self._pending[key]
+            self.renders += 1
+            future = self._pending[key] = self._executor.submit(self._render, key, data)
+            return future
+
+    def _render(self, key: str, data: dict) -> bytes:
+        try:
+            pdf = self.render(data)
+        except Exception:
+            with self._lock:
+                self._pending.pop(key, None)
+            raise
+        # Cache before the future resolves, so a caller that saw it finish always hits
+        with self._lock:
+            self._pending.pop(key, None)
+            self._cache[key] = pdf
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return pdf
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "renders": self.renders, "entries": len(self._cache)}
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_pdf_renderer() -> PDFRenderer:
+    """Return the process-wide PDF renderer, creating it on first use"""
+    global _renderer
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                _renderer = PDFRenderer()
+    return _renderer
@@ -0,0 +1,183 @@
+"""Per-session background audio playback.
+
+Clips are queued and played in order on a worker thread, so a Streamlit run
+returns as soon as its audio is queued instead of blocking for the whole
+utterance. ``interrupt`` drops everything queued and stops the current clip,
+e.g. when the patient starts talking. The worker exits after
+``PLAYBACK_IDLE_SECONDS`` with nothing to play and is restarted by the next
+clip, so sessions that have ended do not keep a thread each.
+
+MP3 clips (the gTTS default) are decoded in memory with ffmpeg and streamed
+like WAV, so they stop as quickly. Without ffmpeg they fall back to playsound
+in a child process, which is killed to cut a clip short.
+"""
+import io
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import wave
+
+from audio_devices import get_audio_manager
+from speech_backends import SpeechClip
+
+# Frames per write when streaming WAV audio; large enough to avoid underruns,
+# small enough that an interrupt takes effect within a fraction of a second
+PLAYBACK_FRAMES = 8192
+
+# Seconds a session's playback worker waits for another clip before exiting
+PLAYBACK_IDLE_SECONDS = float(os.getenv("PLAYBACK_IDLE_SECONDS", "30"))
+
+MP3_DECODER = shutil.which("ffmpeg")
+# gTTS speaks 24 kHz mono; other MP3s are resampled to match
+MP3_RATE = 24000
+
+# Run by the fallback player in a child process, with the clip's path as its argument
+PLAYSOUND_SCRIPT = "import sys; from playsound import playsound; playsound(sys.argv[1])"
+
+
+def play_pcm(data: bytes, rate: int, channels: int, sample_width: int, stop: threading.Event):
+    """Stream raw PCM to the default output device, stopping early if asked"""
+    devices = get_audio_manager()
+    stream = devices.acquire_output(rate, channels=channels, sample_width=sample_width,
+                                    frames_per_buffer=PLAYBACK_FRAMES)
+    step = PLAYBACK_FRAMES * channels * sample_width
+    try:
+        for start in range(0, len(data), step):
+            if stop.is_set():
+                break
+            stream.write(data[start:start + step])
+    finally:
+        devices.release(stream)
+
+
+def play_wav(clip: SpeechClip, stop: threading.Event):
+    """Stream a WAV clip to the default output device, stopping early if asked"""
+    with wave.open(io.BytesIO(clip.data), 'rb') as wf:
+        play_pcm(wf.readframes(wf.getnframes()), wf.getframerate(), wf.getnchannels(), wf.getsampwidth(), stop)
+
+
+def decode_mp3(data: bytes) -> bytes:
+    """Decode an MP3 clip to 16-bit mono PCM at ``MP3_RATE``, entirely through pipes"""
+    command = [MP3_DECODER, "-loglevel", "error", "-i", "pipe:0",
+               "-f", "s16le", "-ac", "1", "-ar", str(MP3_RATE), "pipe:1"]
+    return subprocess.run(command, input=data, capture_output=True, check=True).stdout
+
+
+def play_in_process(clip: SpeechClip, stop: threading.Event):
+    """Play a clip with playsound in a child process, killing it if asked to stop"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=clip.suffix) as fp:
+        fp.write(clip.data)
+        temp_filename = fp.name
+    try:
+        process = subprocess.Popen([sys.executable, "-c", PLAYSOUND_SCRIPT, temp_filename],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while process.poll() is None:
+                if stop.wait(0.05):
+                    process.kill()
+                    return
+            if process.returncode != 0:
+                raise RuntimeError(f"playsound exited with status {process.returncode}")
+        finally:
+            process.wait()
+    finally:
+        os.remove(temp_filename)
+
+
+def play_clip(clip: SpeechClip, stop: threading.Event):
+    """Play any clip, stopping early if asked"""
+    if clip.suffix == '.wav':
+        play_wav(clip, stop)
+    elif clip.suffix == '.mp3' and MP3_DECODER:
+        play_pcm(decode_mp3(clip.data), MP3_RATE, 1, 2, stop)
+    else:
+        play_in_process(clip, stop)
+
+
+class PlaybackEngine:
+    """Queue of clips played in order on a daemon worker thread.
+
+    ``player(clip, stop_event)`` blocks until the clip has played or
+    ``stop_event`` is set. Player errors are collected in ``errors``. The
+    worker runs only while there is something to play, exiting after
+    ``idle_timeout`` seconds without a clip.
+    """
+
+    def __init__(self, player=play_clip, idle_timeout: float = PLAYBACK_IDLE_SECONDS):
+        self.player = player
+        self.idle_timeout = idle_timeout
+        self.errors = []
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._generation = 0
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._thread = None
+
+    def enqueue(self, clip: SpeechClip):
+        """Queue a clip and return immediately"""
+        with self._idle:
+            self._pending += 1
+            self._queue.put((self._generation, clip))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, daemon=True)
+                self._thread.start()
+
+    def interrupt(self):
+        """Drop queued clips and stop the one playing now"""
+        with self._idle:
+            self._generation += 1
+            self._stop.set()
+
+    def _done(self):
+        with self._idle:
+            self._pending -= 1
+            if self._pending == 0:
+                self._idle.notify_all()
+
+    def _worker(self):
+        while True:
+            try:
+                generation, clip = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                # Checked under the lock enqueue holds, so a clip queued now starts a new worker
+                with self._idle:
+                    if self._queue.empty():
+                        self._thread = None
+                        return
+                continue
+            try:
+                with self._idle:
+                    if generation != self._generation:
+                        continue
+                    self._stop.clear()
+                self.player(clip, self._stop)
+            except Exception as e:
+                self.errors.append(e)
+            finally:
+                self._done()
+
+    @property
+    def busy(self) -> bool:
+        return self._pending > 0
+
+    @property
+    def running(self) -> bool:
+        """Whether a worker thread is alive for this engine"""
+        return self._thread is not None
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        """Block until the queue has drained; return False on timeout"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+
+def get_playback_engine(session_state) -> PlaybackEngine:
+    """Return the playback engine for a Streamlit session, creating it on first use"""
+    if 'playback' not in session_state:
+        session_state.playback = PlaybackEngine()
+    return session_state.playback
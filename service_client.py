@@ -0,0 +1,103 @@
+"""Client for the headless diagnosis service.
+
+When ``DIAGNOSIS_SERVICE_URL`` is set, the app sends doctor turns and symptom
+analyses to ``diagnosis_service`` instead of calling Gemini itself. A single
+pooled, keep-alive ``requests.Session`` is shared by every Streamlit session.
+A request the overloaded service turns away with 503 and Retry-After is sent
+once more after the hinted wait, capped at ``DIAGNOSIS_SERVICE_RETRY_WAIT``.
+"""
+import os
+import threading
+import time
+from typing import Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DIAGNOSIS_SERVICE_URL = os.getenv("DIAGNOSIS_SERVICE_URL", "")
+DIAGNOSIS_SERVICE_POOL_SIZE = int(os.getenv("DIAGNOSIS_SERVICE_POOL_SIZE", "10"))
+DIAGNOSIS_SERVICE_TIMEOUT = float(os.getenv("DIAGNOSIS_SERVICE_TIMEOUT", "60"))
+DIAGNOSIS_SERVICE_RETRY_WAIT = float(os.getenv("DIAGNOSIS_SERVICE_RETRY_WAIT", "5"))
+
+
+def retry_after_delay(response: requests.Response, cap: float) -> Optional[float]:
+    """Seconds to wait before retrying a 503 that carries Retry-After, or None to give up"""
+    if response.status_code != 503 or "Retry-After" not in response.headers:
+        return None
+    try:
+        return min(max(float(response.headers["Retry-After"]), 0.0), cap)
+    except ValueError:
+        # An HTTP date: wait the longest we allow rather than parse the server's clock
+        return cap
+
+
+class ServiceClient:
+    def __init__(self, base_url: str = DIAGNOSIS_SERVICE_URL, pool_size: int = DIAGNOSIS_SERVICE_POOL_SIZE,
+                 timeout: float = DIAGNOSIS_SERVICE_TIMEOUT, retry_wait: float = DIAGNOSIS_SERVICE_RETRY_WAIT):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retry_wait = retry_wait
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _post(self, path: str, body: dict, stream: bool = False) -> requests.Response:
+        url = f"{self.base_url}{path}"
+        response = self.session.post(url, json=body, timeout=self.timeout, stream=stream)
+        delay = retry_after_delay(response, self.retry_wait)
+        if delay is not None:
+            response.close()
+            time.sleep(delay)
+            response = self.session.post(url, json=body, timeout=self.timeout, stream=stream)
+        response.raise_for_status()
+        return response
+
+    @staticmethod
+    def _turn(conversation_history: list, conversation_id: Optional[str]) -> dict:
+        body = {"conversation": conversation_history}
+        if conversation_id is not None:
+            body["conversation_id"] = conversation_id
+        return body
+
+    def doctor_turn(self, conversation_history: list, conversation_id: str = None) -> str:
+        """The doctor's next turn for a conversation.
+
+        With a ``conversation_id`` the service keeps the conversation's compact
+        context between turns and only folds in the turns added since the last call.
+        """
+        return self._post("/v1/turn", self._turn(conversation_history, conversation_id)).json()["text"]
+
+    def stream_doctor_turn(self, conversation_history: list, conversation_id: str = None) -> Iterator[str]:
+        """Yield the doctor's next turn as it streams in"""
+        response = self._post("/v1/turn?stream=1", self._turn(conversation_history, conversation_id), stream=True)
+        response.encoding = "utf-8"
+        with response:
+            for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+                if chunk:
+                    yield chunk
+
+    def analyze(self, symptoms: str, background: bool = False) -> Tuple[dict, Optional[str]]:
+        """Analyze symptoms, returning the diagnosis and an error message if it failed.
+
+        ``background`` analyses (speculative ones) wait behind the service's user-facing calls.
+        """
+        data = self._post("/v1/analyze", {"symptoms": symptoms, "background": background}).json()
+        return data["diagnosis"], data["error"]
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_service_client() -> ServiceClient:
+    """Return the process-wide diagnosis service client, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ServiceClient()
+    return _client
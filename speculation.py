@@ -0,0 +1,65 @@
+"""Latest-wins speculative computation.
+
+A ``Speculation`` runs ``compute(value)`` in the background whenever it is
+given a new input, so the answer is usually ready before anyone asks for it.
+Only the result for the most recent input is kept; work for older inputs is
+cancelled if it has not started and its result is discarded if it has.
+
+Speculative work runs on a small pool of its own, so however much of it is
+waiting, it never holds up the task pool that serves users' own requests.
+"""
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+SPECULATION_WORKERS = int(os.getenv("SPECULATION_WORKERS", "2"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_speculation_executor() -> ThreadPoolExecutor:
+    """Return the process-wide speculation pool, creating it on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=SPECULATION_WORKERS, thread_name_prefix="speculation")
+    return _executor
+
+
+class Speculation:
+    def __init__(self, compute, executor=None):
+        self.compute = compute
+        self.executor = executor or get_speculation_executor()
+        self.discarded = 0
+        self._value = None
+        self._future = None
+        self._lock = threading.Lock()
+
+    def update(self, value) -> Future:
+        """Start computing for ``value`` unless that is already the latest input"""
+        with self._lock:
+            if self._future is not None and value == self._value:
+                return self._future
+            self._drop()
+            self._value = value
+            self._future = self.executor.submit(self.compute, value)
+            return self._future
+
+    def result_for(self, value) -> Optional[Future]:
+        """The speculative future for ``value``, or None if it was computed for other input"""
+        with self._lock:
+            return self._future if self._future is not None and value == self._value else None
+
+    def reset(self):
+        with self._lock:
+            self._drop()
+            self._value = None
+            self._future = None
+
+    def _drop(self):
+        if self._future is not None and not self._future.done():
+            self._future.cancel()
+            self.discarded += 1
@@ -0,0 +1,148 @@
+"""Pluggable speech-to-text and text-to-speech backends.
+
+The Google recognizer and gTTS stay the defaults. In-process offline backends
+(PocketSphinx for recognition, pyttsx3 for synthesis) can be selected per
+deployment with ``STT_BACKEND`` / ``TTS_BACKEND`` to avoid the WAN round trips.
+Tests can register deterministic local backends the same way.
+"""
+import io
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+
+import speech_recognition as sr
+from gtts import gTTS
+
+from audio_processing import prepare_for_recognition
+
+STT_BACKEND = os.getenv("STT_BACKEND", "google")
+TTS_BACKEND = os.getenv("TTS_BACKEND", "gtts")
+SPEECH_LANGUAGE = os.getenv("SPEECH_LANGUAGE", "en")
+
+
+@dataclass
+class SpeechClip:
+    """Synthesized audio plus the file suffix that identifies its format"""
+    data: bytes
+    suffix: str
+
+
+class SpeechToText:
+    """Recognizer interface; ``recognize`` raises sr.UnknownValueError or sr.RequestError"""
+
+    def recognize(self, audio: sr.AudioData) -> str:
+        raise NotImplementedError
+
+
+class TextToSpeech:
+    """Synthesizer interface"""
+
+    voice = "default"
+
+    def synthesize(self, text: str) -> SpeechClip:
+        raise NotImplementedError
+
+
+class GoogleSpeechToText(SpeechToText):
+    def __init__(self, language: str = "en-US"):
+        self.recognizer = sr.Recognizer()
+        self.language = language
+
+    def recognize(self, audio: sr.AudioData) -> str:
+        # Upload 16 kHz mono FLAC encoded in-process rather than via the flac binary
+        audio = prepare_for_recognition(audio) or audio
+        return self.recognizer.recognize_google(audio, language=self.language)
+
+
+class SphinxSpeechToText(SpeechToText):
+    """Offline, in-process recognition with PocketSphinx"""
+
+    def __init__(self, language: str = "en-US"):
+        self.recognizer = sr.Recognizer()
+        self.language = language
+
+    def recognize(self, audio: sr.AudioData) -> str:
+        audio = prepare_for_recognition(audio) or audio
+        return self.recognizer.recognize_sphinx(audio, language=self.language)
+
+
+class GTTSTextToSpeech(TextToSpeech):
+    def __init__(self, language: str = SPEECH_LANGUAGE):
+        self.language = language
+
+    def synthesize(self, text: str) -> SpeechClip:
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=self.language).write_to_fp(buffer)
+        return SpeechClip(buffer.getvalue(), '.mp3')
+
+
+class Pyttsx3TextToSpeech(TextToSpeech):
+    """Offline synthesis with the platform speech engine via pyttsx3"""
+
+    def __init__(self, voice: str = None):
+        import pyttsx3
+
+        self.engine = pyttsx3.init()
+        if voice:
+            self.engine.setProperty('voice', voice)
+        self.voice = voice or "default"
+        # pyttsx3 engines are not thread-safe
+        self.lock = threading.Lock()
+
+    def synthesize(self, text: str) -> SpeechClip:
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as fp:
+            temp_filename = fp.name
+        try:
+            with self.lock:
+                self.engine.save_to_file(text, temp_filename)
+                self.engine.runAndWait()
+            with open(temp_filename, 'rb') as f:
+                return SpeechClip(f.read(), '.wav')
+        finally:
+            os.remove(temp_filename)
+
+
+STT_BACKENDS = {
+    "google": GoogleSpeechToText,
+    "sphinx": SphinxSpeechToText,
+}
+
+TTS_BACKENDS = {
+    "gtts": GTTSTextToSpeech,
+    "pyttsx3": Pyttsx3TextToSpeech,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def register_stt_backend(name: str, factory):
+    with _backends_lock:
+        STT_BACKENDS[name] = factory
+        _backends.pop(("speech-to-text", name), None)
+
+
+def register_tts_backend(name: str, factory):
+    with _backends_lock:
+        TTS_BACKENDS[name] = factory
+        _backends.pop(("text-to-speech", name), None)
+
+
+def _get_backend(kind: str, registry: dict, name: str):
+    if name not in registry:
+        raise ValueError(f"Unknown {kind} backend '{name}'. Choose from: {', '.join(sorted(registry))}")
+    with _backends_lock:
+        if (kind, name) not in _backends:
+            _backends[(kind, name)] = registry[name]()
+        return _backends[(kind, name)]
+
+
+def get_stt(name: str = None) -> SpeechToText:
+    """Return the process-wide recognizer for this deployment"""
+    return _get_backend("speech-to-text", STT_BACKENDS, name or STT_BACKEND)
+
+
+def get_tts(name: str = None) -> TextToSpeech:
+    """Return the process-wide synthesizer for this deployment"""
+    return _get_backend("text-to-speech", TTS_BACKENDS, name or TTS_BACKEND)
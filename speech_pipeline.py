@@ -0,0 +1,96 @@
+"""Sentence-pipelined text-to-speech for streamed doctor responses.
+
+Text chunks are fed in as the LLM produces them. Every completed sentence is
+handed to a synthesis worker straight away, and synthesized clips go to a
+separate playback worker, so the first sentence is already playing while later
+ones are still being generated and synthesized.
+"""
+import queue
+import re
+import threading
+
+# A sentence ends at . ! or ? followed by whitespace (or a closing quote/bracket)
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+')
+
+_DONE = object()
+
+
+class SentenceSplitter:
+    """Accumulate streamed text and release it one complete sentence at a time"""
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, chunk: str) -> list:
+        self.buffer += chunk
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self.buffer):
+            sentence = self.buffer[start:match.end()].strip()
+            if sentence:
+                sentences.append(sentence)
+            start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self) -> list:
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return [rest] if rest else []
+
+
+class SpeechPipeline:
+    """Two-stage synthesize -> play pipeline driven by streamed text.
+
+    ``synthesize(sentence)`` returns an audio item and ``play(item)`` blocks
+    until it has been heard. Errors from either stage are collected in
+    ``errors`` instead of killing the workers.
+    """
+
+    def __init__(self, synthesize, play):
+        self.synthesize = synthesize
+        self.play = play
+        self.splitter = SentenceSplitter()
+        self.errors = []
+        self._sentences = queue.Queue()
+        self._clips = queue.Queue()
+        self._synth_thread = threading.Thread(target=self._synth_worker, daemon=True)
+        self._play_thread = threading.Thread(target=self._play_worker, daemon=True)
+        self._synth_thread.start()
+        self._play_thread.start()
+
+    def _synth_worker(self):
+        while True:
+            sentence = self._sentences.get()
+            if sentence is _DONE:
+                self._clips.put(_DONE)
+                return
+            try:
+                self._clips.put(self.synthesize(sentence))
+            except Exception as e:
+                self.errors.append(e)
+
+    def _play_worker(self):
+        while True:
+            clip = self._clips.get()
+            if clip is _DONE:
+                return
+            try:
+                self.play(clip)
+            except Exception as e:
+                self.errors.append(e)
+
+    def feed(self, chunk: str):
+        for sentence in self.splitter.feed(chunk):
+            self._sentences.put(sentence)
+
+    def close(self):
+        """Flush any trailing partial sentence; no more text will be fed"""
+        for sentence in self.splitter.flush():
+            self._sentences.put(sentence)
+        self._sentences.put(_DONE)
+
+    def wait(self, timeout: float = None):
+        """Block until everything fed so far has been synthesized and played"""
+        self._synth_thread.join(timeout)
+        self._play_thread.join(timeout)
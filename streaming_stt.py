@@ -0,0 +1,125 @@
+"""Streaming transcription while the patient is still speaking.
+
+Captured audio is cut into segments at short pauses. Each finished segment is
+sent to the recognizer on a shared worker pool while recording continues, and
+the partial transcripts are stitched back together in order. By the time the
+patient stops, usually only the last segment is still in flight.
+
+The segment being captured is held in an ``AudioBuffer``, so it counts against
+the same per-session memory cap, spill-to-disk and process-wide accounting as a
+whole recording does.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import speech_recognition as sr
+
+from audio_buffer import AUDIO_SESSION_MEMORY_BYTES, AudioBuffer, max_recording_bytes
+from audio_processing import Endpointer, speech_bounds
+
+STT_WORKERS = int(os.getenv("STT_WORKERS", "4"))
+STT_PAUSE_SECONDS = float(os.getenv("STT_PAUSE_SECONDS", "0.4"))
+STT_MAX_SEGMENT_SECONDS = float(os.getenv("STT_MAX_SEGMENT_SECONDS", "15"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the process-wide recognition worker pool, creating it on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=STT_WORKERS, thread_name_prefix="stt")
+    return _executor
+
+
+class StreamingTranscriber:
+    """Segment 16-bit mono PCM at pauses and transcribe segments in the background.
+
+    ``recognize(audio_data)`` returns the text for one segment and raises
+    ``sr.UnknownValueError`` when a segment holds no recognizable speech.
+    """
+
+    def __init__(self, recognize, rate: int, sample_width: int = 2, pause_seconds: float = STT_PAUSE_SECONDS,
+                 max_segment_seconds: float = STT_MAX_SEGMENT_SECONDS, executor: ThreadPoolExecutor = None,
+                 memory_cap: int = AUDIO_SESSION_MEMORY_BYTES):
+        self.recognize = recognize
+        self.rate = rate
+        self.sample_width = sample_width
+        self.pause_seconds = pause_seconds
+        self.max_segment_seconds = max_segment_seconds
+        self.executor = executor or get_executor()
+        self.futures = []
+        # The endpointer cuts at max_segment_seconds; a second of slack covers the chunk that crosses it
+        segment_bytes = max_recording_bytes(rate, 1, sample_width, max_segment_seconds + 1)
+        self._segment = AudioBuffer(segment_bytes, memory_cap=memory_cap, initial_bytes=segment_bytes)
+        self._endpointer = self._new_endpointer()
+
+    def _new_endpointer(self, noise_floor: float = None) -> Endpointer:
+        endpointer = Endpointer(self.rate, silence_seconds=self.pause_seconds, max_seconds=self.max_segment_seconds)
+        endpointer.noise_floor = noise_floor
+        return endpointer
+
+    def feed(self, pcm):
+        """Add a captured chunk, cutting a segment when the patient pauses"""
+        self._segment.write(pcm)
+        if self._endpointer.update(pcm):
+            self._cut()
+
+    def _cut(self):
+        self._endpointer = self._new_endpointer(self._endpointer.noise_floor)
+        samples = self._segment.samples()
+        bounds = speech_bounds(samples, self.rate)
+        del samples  # release the buffer export before the buffer is reused
+        if bounds is not None:
+            start, end = bounds
+            audio = sr.AudioData(self._segment.read(start * self.sample_width, end * self.sample_width),
+                                 self.rate, self.sample_width)
+            self.futures.append(self.executor.submit(self._transcribe, audio))
+        self._segment.clear()
+
+    def _transcribe(self, audio: sr.AudioData):
+        try:
+            return self.recognize(audio)
+        except sr.UnknownValueError:
+            return None
+
+    @property
+    def pending(self) -> int:
+        return sum(not future.done() for future in self.futures)
+
+    def partial_transcript(self) -> str:
+        """Text of the segments finished so far, in order"""
+        texts = []
+        for future in self.futures:
+            if not future.done():
+                break
+            if future.exception() is None and future.result():
+                texts.append(future.result())
+        return " ".join(texts)
+
+    def finish(self) -> str:
+        """Transcribe the trailing segment and return the stitched transcript.
+
+        Raises ``sr.UnknownValueError`` if nothing was recognized, or the first
+        ``sr.RequestError`` if every segment failed to reach the recognizer.
+        """
+        self._cut()
+        self._segment.close()
+        texts, errors = [], []
+        for future in self.futures:
+            try:
+                text = future.result()
+            except sr.RequestError as e:
+                errors.append(e)
+                continue
+            if text:
+                texts.append(text)
+        if texts:
+            return " ".join(texts)
+        if errors:
+            raise errors[0]
+        raise sr.UnknownValueError()
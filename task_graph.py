@@ -0,0 +1,93 @@
+"""Small dependency graphs of background tasks.
+
+Each task runs on a shared worker pool as soon as the tasks it depends on have
+finished, receiving their results as arguments. Independent branches run in
+parallel, so a graph takes as long as its longest chain rather than the sum of
+its tasks. A failed task fails everything downstream of it with the same error.
+"""
+import os
+import threading
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, as_completed
+
+TASK_WORKERS = int(os.getenv("TASK_WORKERS", "8"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_task_executor() -> ThreadPoolExecutor:
+    """Return the process-wide task pool, creating it on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=TASK_WORKERS, thread_name_prefix="task")
+    return _executor
+
+
+class TaskGraph:
+    def __init__(self, executor: ThreadPoolExecutor = None):
+        self.executor = executor or get_task_executor()
+        self.futures = {}
+
+    def add(self, name: str, fn, args: tuple = (), deps: tuple = ()) -> Future:
+        """Run ``fn(*args, *results_of_deps)`` once every task in ``deps`` has finished"""
+        if name in self.futures:
+            raise ValueError(f"Task '{name}' is already in the graph")
+        missing = [dep for dep in deps if dep not in self.futures]
+        if missing:
+            raise ValueError(f"Task '{name}' depends on unknown tasks: {', '.join(missing)}")
+
+        future = Future()
+        self.futures[name] = future
+        upstream = [self.futures[dep] for dep in deps]
+        remaining = [len(upstream)]
+        lock = threading.Lock()
+
+        def start():
+            failed = next((dep for dep in upstream if _error(dep) is not None), None)
+            if failed is not None:
+                future.set_exception(_error(failed))
+                return
+            inner = self.executor.submit(fn, *args, *(dep.result() for dep in upstream))
+            inner.add_done_callback(lambda done: _copy(done, future))
+
+        def dep_done(_):
+            with lock:
+                remaining[0] -= 1
+                ready = remaining[0] == 0
+            if ready:
+                start()
+
+        if not upstream:
+            start()
+        for dep in upstream:
+            dep.add_done_callback(dep_done)
+        return future
+
+    def add_future(self, name: str, future: Future) -> Future:
+        """Add work that is already running elsewhere as a task others can depend on"""
+        if name in self.futures:
+            raise ValueError(f"Task '{name}' is already in the graph")
+        self.futures[name] = future
+        return future
+
+    def as_completed(self, timeout: float = None):
+        """Yield task names as their tasks finish, successfully or not"""
+        names = {future: name for name, future in self.futures.items()}
+        for future in as_completed(names, timeout=timeout):
+            yield names[future]
+
+    def result(self, name: str, timeout: float = None):
+        return self.futures[name].result(timeout)
+
+
+def _error(future: Future):
+    return CancelledError() if future.cancelled() else future.exception()
+
+
+def _copy(source: Future, target: Future):
+    if _error(source) is not None:
+        target.set_exception(_error(source))
+    else:
+        target.set_result(source.result())
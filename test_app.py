@@ -2,7 +2,9 @@ import pytest
 import json
 import os
 from app import process_symptoms, save_patient_info, generate_pdf_summary
-from datetime import datetime
+from datetime import date, datetime
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
 
 # Test data
 MOCK_SYMPTOMS = "headache and fever (Pain level: 5/10)"
@@ -76,3 +78,276 @@ def test_patient_history_categories():
     # Verify no duplicate fields across categories
     all_fields = [field for fields in categories.values() for field in fields]
     assert len(all_fields) == len(set(all_fields))  # No duplicates
+
+def test_import_does_not_load_voice_stack():
+    """Importing the app leaves the audio libraries for the first voice interaction"""
+    import subprocess
+    import sys
+    modules = ["pyaudio", "speech_recognition", "voice", "playback", "fpdf"]
+    check = f"import sys, app; print([m for m in {modules!r} if m in sys.modules])"
+    result = subprocess.run([sys.executable, "-c", check], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "[]"
+
+@pytest.fixture
+def app_test(monkeypatch):
+    """Build AppTests of the whole app, with the speech cache warm-up (a network call) stubbed out"""
+    from streamlit.testing.v1 import AppTest
+    import tts_cache
+
+    monkeypatch.setattr(tts_cache.TTSCache, "warm_async", lambda self, phrases: None)
+    return lambda: AppTest.from_file(APP_PATH, default_timeout=30)
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Patient store in a temporary database, used by the app in place of the real one"""
+    import patient_store
+
+    store = patient_store.PatientStore(str(tmp_path / "patients.db"))
+    monkeypatch.setattr(patient_store, "_store", store)
+    yield store
+    store.close()
+
+def test_end_consultation_saves_and_offers_summary(app_test, store):
+    """Test ending a voice consultation through the rendered page"""
+    from speculation import Speculation
+
+    conversation = [
+        {"role": "doctor", "text": "What brings you in today?"},
+        {"role": "patient", "text": "I have a headache."},
+        {"role": "doctor", "text": "How long has it lasted?"},
+        {"role": "patient", "text": "Two days."},
+    ]
+    diagnosis = {"reasons": ["Tension headache"], "risk_rating": 3, "life_threatening": "No"}
+    speculation = Speculation(lambda symptoms: (diagnosis, None))
+    speculation.update("I have a headache. Two days.")
+
+    at = app_test()
+    at.session_state.page = "Symptoms"
+    at.session_state.patient_id = "test-patient"
+    at.session_state.conversation_history = conversation
+    at.session_state.speculative_diagnosis = speculation
+    at.run()
+    assert not at.exception
+    next(button for button in at.button if button.label == "End Consultation").click().run()
+
+    assert not at.exception
+    assert "text_diagnosis" not in at.session_state
+    assert at.session_state.consultation_summary.result(timeout=10)[:4] == b"%PDF"
+    assert len(at.session_state.conversation_history) == 1
+    saved = store.consultations("test-patient")
+    assert len(saved) == 1 and saved[0]["data"]["diagnosis"] == diagnosis
+
+def test_sessions_with_same_details_get_separate_patient_ids(app_test, store):
+    """Test that patient ids are random per session, so identical details never share records"""
+    patient_ids = []
+    for _ in range(2):
+        at = app_test()
+        at.run()
+        at.button[0].click().run()  # Next with the default empty name and today's date
+        assert not at.exception
+        assert at.session_state.page == "Insurance Info"
+        patient_ids.append(at.session_state.patient_id)
+
+    assert patient_ids[0] != patient_ids[1]
+    store.flush()
+    assert all(store.get_patient(patient_id) is not None for patient_id in patient_ids)
+
+def test_previous_visits_need_an_identified_patient(app_test, store, monkeypatch):
+    """Test that only a session that entered a name lists visits, and only its own"""
+    monkeypatch.setenv("TEXT_ONLY", "1")
+
+    def visit_session(name):
+        at = app_test()
+        at.run()
+        at.text_input[0].input(name)
+        at.button[0].click().run()
+        store.add_consultation(at.session_state.patient_id, "symptoms", {"symptoms": "Headache"},
+                               symptoms="Headache", risk_rating=3).result()
+        at.session_state.page = "Symptoms"
+        at.run()
+        assert not at.exception
+        return at
+
+    anonymous = visit_session("")
+    assert not anonymous.expander
+    assert "Enter your name" in anonymous.info[0].value
+
+    named = visit_session("John Doe")
+    assert len(named.expander) == 1
+
+def test_returning_patient_finds_their_visits_from_a_new_session(app_test, store, monkeypatch):
+    """Test that a patient number and date of birth bring a new session back to the patient's own visits"""
+    monkeypatch.setenv("TEXT_ONLY", "1")
+
+    first = app_test()
+    first.run()
+    first.text_input[0].input("John Doe")
+    first.date_input[0].set_value(date(1990, 1, 1))
+    first.button[0].click().run()
+    patient_number = first.session_state.patient_number
+    assert patient_number in first.info[0].value
+    store.add_consultation(first.session_state.patient_id, "symptoms", {"symptoms": "Headache"},
+                           symptoms="Headache", risk_rating=3).result()
+
+    def returning_session(number, dob):
+        at = app_test()
+        at.run()
+        at.text_input(key="lookup_number").input(number)
+        at.date_input(key="lookup_dob").set_value(dob)
+        next(button for button in at.button if button.label == "Find my record").click().run()
+        assert not at.exception
+        return at
+
+    wrong_dob = returning_session(patient_number, date(1991, 1, 1))
+    assert wrong_dob.session_state.page == "User Info"
+    assert "No record matches" in wrong_dob.error[0].value
+    assert "patient_identified" not in wrong_dob.session_state
+
+    returning = returning_session(patient_number.replace("-", ""), date(1990, 1, 1))
+    assert returning.session_state.page == "Symptoms"
+    assert returning.session_state.patient_id == first.session_state.patient_id
+    assert len(returning.expander) == 1
+    assert patient_number in returning.info[0].value
+
+def test_patient_number_lookups_are_limited(app_test, store):
+    """Test that a session stops trying patient numbers after too many failures"""
+    from app import PATIENT_LOOKUP_ATTEMPTS
+
+    at = app_test()
+    at.run()
+    for _ in range(PATIENT_LOOKUP_ATTEMPTS + 1):
+        at.text_input(key="lookup_number").input("0000-0000")
+        next(button for button in at.button if button.label == "Find my record").click().run()
+    assert "Too many attempts" in at.error[0].value
+    assert at.session_state.lookup_attempts == PATIENT_LOOKUP_ATTEMPTS
+
+def test_recording_failure_is_reported(app_test, monkeypatch):
+    """Test that the status poller stops when the recording thread dies and shows its error"""
+    import voice
+    from fake_audio import fake_microphone_manager
+
+    manager = fake_microphone_manager(fail_at=3)
+    monkeypatch.setattr(voice, "get_audio_manager", lambda: manager)
+    monkeypatch.setattr(voice, "STREAMING_TRANSCRIPTION", False)
+    recorder = voice.AudioRecorder()
+    recorder.start_recording()
+
+    at = app_test()
+    at.session_state.page = "Symptoms"
+    at.session_state.conversation_history = [{"role": "doctor", "text": "What brings you in today?"}]
+    at.session_state.recorder = recorder
+    at.session_state.recording = True
+    at.run()
+
+    assert not at.exception
+    assert not at.session_state.recording
+    assert any("Recording stopped early" in error.value for error in at.error)
+
+def test_summary_download_polls_until_rendered(monkeypatch):
+    """Test that a summary still rendering polls in place, and that polling stops once it is ready"""
+    import threading
+    from concurrent.futures import Future
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+    import app
+
+    intervals = []
+    fragment = st.fragment
+
+    def recording_fragment(func=None, *, run_every=None, **kwargs):
+        intervals.append(run_every)
+        return fragment(func, run_every=run_every, **kwargs)
+
+    monkeypatch.setattr(st, "fragment", recording_fragment)
+    monkeypatch.setattr(app, "PDF_WAIT_SECONDS", 0.05)
+    summary = Future()
+
+    def page():
+        import streamlit as st
+        from app import show_summary_download
+        show_summary_download(st.session_state.pending_summary, key="summary_download")
+
+    at = AppTest.from_function(page, default_timeout=30)
+    at.session_state.pending_summary = summary
+    at.run()
+    assert not at.exception
+    assert "still being prepared" in at.caption[0].value
+    assert not at.get("download_button")
+    assert intervals == [app.PDF_POLL_SECONDS]
+
+    # The PDF lands while a polling run waits for it: the app reruns once and the timer is dropped
+    monkeypatch.setattr(app, "PDF_WAIT_SECONDS", 5.0)
+    threading.Timer(0.1, summary.set_result, args=(b"%PDF-1.4",)).start()
+    intervals.clear()
+    at.run()
+    assert not at.exception
+    assert intervals == [app.PDF_POLL_SECONDS, None]
+    assert len(at.get("download_button")) == 1
+
+class LiveRecorder:
+    """Recorder stand-in that keeps recording until it is stopped"""
+
+    def __init__(self):
+        import threading
+
+        self.is_recording = True
+        self.error = None
+        self.transcriber = None
+        self._stopped = threading.Event()
+        self.record_thread = threading.Thread(target=self._stopped.wait, daemon=True)
+        self.record_thread.start()
+
+    def stop_recording(self):
+        self.is_recording = False
+        self._stopped.set()
+        self.record_thread.join()
+        return "Speech could not be recognized"
+
+def test_page_renders_while_recording(app_test):
+    """Test that an ongoing recording shows its status without holding up the rest of the page"""
+    at = app_test()
+    at.session_state.page = "Symptoms"
+    at.session_state.conversation_history = [{"role": "doctor", "text": "What brings you in today?"}]
+    at.session_state.recorder = LiveRecorder()
+    at.session_state.recording = True
+    at.run(timeout=5)
+
+    assert not at.exception
+    assert any("Recording in progress" in info.value for info in at.info)
+    assert any(button.label == "Get Diagnosis" for button in at.button)
+
+    next(button for button in at.button if button.label == "⏹️ Stop Recording").click().run(timeout=5)
+    assert not at.exception
+    assert not at.session_state.recording
+    assert not any("Recording in progress" in info.value for info in at.info)
+
+def test_pending_speculation_is_reissued_as_interactive(store, monkeypatch):
+    """Test that ending a consultation does not wait on a speculative analysis at background priority"""
+    from concurrent.futures import Future
+    import app
+    from gemini_scheduler import INTERACTIVE
+
+    diagnosis = {"reasons": ["Tension headache"], "risk_rating": 3, "life_threatening": "No"}
+    lanes = []
+    monkeypatch.setattr(app, "analyze_symptoms",
+                        lambda symptoms, lane=INTERACTIVE: lanes.append(lane) or (diagnosis, None))
+
+    def tasks(speculative):
+        return app.consultation_tasks("Headache", "symptoms", record=lambda d: {"diagnosis": d},
+                                      summary=lambda d: {"Final Diagnosis": d}, diagnosis=speculative)
+
+    pending = Future()
+    graph = tasks(pending)
+    assert graph.result("diagnosis") == (diagnosis, None)
+    assert pending.cancelled()
+    assert lanes == [INTERACTIVE]
+
+    finished = Future()
+    finished.set_result((diagnosis, None))
+    graph = tasks(finished)
+    assert graph.futures["diagnosis"] is finished
+    assert lanes == [INTERACTIVE]
+    graph.futures["save"].result(timeout=10)
+    graph.futures["summary"].result(timeout=10)
@@ -0,0 +1,69 @@
+import numpy as np
+
+from audio_buffer import AudioBuffer, audio_memory_stats, max_recording_bytes
+
+
+def pcm(start: int, count: int) -> bytes:
+    return np.arange(start, start + count, dtype='<i2').tobytes()
+
+
+def test_small_recording_stays_in_memory():
+    """Test that audio under the cap is kept in one bytearray and read back in order"""
+    buffer = AudioBuffer(max_bytes=1 << 20, memory_cap=1 << 16, initial_bytes=64)
+    for i in range(10):
+        buffer.write(pcm(i * 100, 100))
+    assert not buffer.spilled
+    assert buffer.read() == pcm(0, 1000)
+    assert buffer.read(200, 400) == pcm(100, 100)
+    samples = buffer.samples()
+    assert samples[0] == 0 and samples[-1] == 999
+    del samples
+    buffer.close()
+
+
+def test_spills_to_memory_mapped_file_past_cap():
+    """Test that exceeding the per-session cap moves audio to disk without losing any"""
+    before = audio_memory_stats()
+    buffer = AudioBuffer(max_bytes=1 << 20, memory_cap=4096)
+    for i in range(20):
+        buffer.write(pcm(i * 512, 512))
+    assert buffer.spilled
+    assert buffer.read() == pcm(0, 20 * 512)
+
+    during = audio_memory_stats()
+    assert during["buffers"] == before["buffers"] + 1
+    assert during["memory_bytes"] == before["memory_bytes"]
+    assert during["spilled_bytes"] >= before["spilled_bytes"] + 20 * 1024
+
+    buffer.close()
+    assert audio_memory_stats() == before
+
+
+def test_process_budget_forces_spill():
+    """Test that new buffers spill immediately once the process-wide budget is used"""
+    held = AudioBuffer(max_bytes=8192, memory_cap=8192, initial_bytes=8192)
+    budget = audio_memory_stats()["memory_bytes"]
+    buffer = AudioBuffer(max_bytes=8192, memory_cap=8192, process_budget=budget)
+    buffer.write(pcm(0, 100))
+    assert buffer.spilled
+    assert buffer.read() == pcm(0, 100)
+    buffer.close()
+    held.close()
+
+
+def test_forgotten_recording_is_bounded_as_a_ring():
+    """Test that past max_bytes the oldest audio is overwritten"""
+    for memory_cap in (1 << 20, 1024):
+        buffer = AudioBuffer(max_bytes=2000, memory_cap=memory_cap)
+        for i in range(50):
+            buffer.write(pcm(i * 300, 300))
+        assert buffer.capacity == 2000
+        assert buffer.length == 2000
+        assert buffer.dropped == 50 * 600 - 2000
+        assert buffer.read() == pcm(50 * 300 - 1000, 1000)
+        assert list(buffer.samples()[:3]) == [14000, 14001, 14002]
+        buffer.close()
+
+
+def test_max_recording_bytes():
+    assert max_recording_bytes(16000, 1, 2, seconds=2) == 64000
@@ -0,0 +1,96 @@
+from audio_devices import AudioDeviceManager
+
+
+class FakeStream:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.stopped = False
+        self.closed = False
+        self.starts = 0
+
+    def is_stopped(self):
+        return self.stopped
+
+    def start_stream(self):
+        self.stopped = False
+        self.starts += 1
+
+    def stop_stream(self):
+        self.stopped = True
+
+    def close(self):
+        self.closed = True
+
+
+class FakePyAudio:
+    """Counts PortAudio initializations and stream opens"""
+
+    instances = 0
+
+    def __init__(self):
+        FakePyAudio.instances += 1
+        self.opened = []
+        self.terminated = False
+
+    def get_format_from_width(self, width):
+        return width * 10
+
+    def open(self, **kwargs):
+        stream = FakeStream(**kwargs)
+        self.opened.append(stream)
+        return stream
+
+    def terminate(self):
+        self.terminated = True
+
+
+def make_manager():
+    FakePyAudio.instances = 0
+    return AudioDeviceManager(pyaudio_factory=FakePyAudio)
+
+
+def test_pyaudio_is_initialized_lazily_and_once():
+    """Test that PortAudio starts on first use and is shared across recordings"""
+    manager = make_manager()
+    assert FakePyAudio.instances == 0
+
+    for _ in range(3):
+        stream = manager.acquire_input(44100)
+        manager.release(stream)
+    manager.release(manager.acquire_output(24000))
+
+    assert FakePyAudio.instances == 1
+
+
+def test_released_streams_are_reused_by_parameters():
+    """Test that idle streams are restarted instead of reopened"""
+    manager = make_manager()
+    first = manager.acquire_input(44100, frames_per_buffer=1024)
+    manager.release(first)
+    assert first.stopped
+
+    second = manager.acquire_input(44100, frames_per_buffer=1024)
+    assert second is first
+    assert not second.stopped and second.starts == 1
+
+    other = manager.acquire_input(16000, frames_per_buffer=1024)
+    assert other is not first
+    assert other.kwargs["input"] and not other.kwargs["output"]
+    assert other.kwargs["format"] == 20
+    assert len(manager.pa.opened) == 2
+
+
+def test_concurrent_users_get_separate_streams_and_close_cleans_up():
+    """Test that a busy stream is never handed out twice and close terminates PortAudio"""
+    manager = make_manager()
+    a = manager.acquire_output(22050, sample_width=2)
+    b = manager.acquire_output(22050, sample_width=2)
+    assert a is not b
+    manager.release(a)
+    manager.release(b)
+    manager.release(b)  # releasing twice is harmless
+
+    pa = manager.pa
+    manager.close()
+    assert a.closed and b.closed
+    assert pa.terminated
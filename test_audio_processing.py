@@ -0,0 +1,130 @@
+import subprocess
+import numpy as np
+import pytest
+import speech_recognition as sr
+from audio_processing import (Endpointer, encode_flac, pcm_to_samples, prepare_for_recognition, resample,
+                              speech_bounds)
+
+CAPTURE_RATE = 44100
+
+
+def tone(frequency: float, seconds: float = 1.0, rate: int = CAPTURE_RATE, amplitude: int = 8000) -> np.ndarray:
+    t = np.arange(int(seconds * rate)) / rate
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
+
+
+def speech_like(rate: int = CAPTURE_RATE, seconds: float = 2.0) -> np.ndarray:
+    """Voiced harmonics with a formant-like envelope plus a little noise"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * rate)) / rate
+    signal = sum(np.sin(2 * np.pi * 140 * h * t) / h for h in range(1, 25))
+    signal *= 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)
+    return (6000 * signal / np.abs(signal).max() + rng.normal(0, 100, len(t))).astype(np.int16)
+
+
+def dominant_frequency(samples: np.ndarray, rate: int) -> float:
+    spectrum = np.abs(np.fft.rfft(samples))
+    return np.argmax(spectrum) * rate / len(samples)
+
+
+def decode_flac(data: bytes) -> np.ndarray:
+    try:
+        converter = sr.audio.get_flac_converter()
+    except OSError:
+        pytest.skip("no flac decoder available")
+    result = subprocess.run([converter, "-d", "-c", "--totally-silent", "--force-raw-format",
+                             "--endian=little", "--sign=signed", "-"], input=data, capture_output=True, check=True)
+    return np.frombuffer(result.stdout, dtype="<i2")
+
+
+@pytest.mark.parametrize("samples", [
+    np.zeros(0, dtype=np.int16),
+    np.full(3000, 7, dtype=np.int16),
+    np.random.default_rng(1).integers(-32768, 32767, 5000).astype(np.int16),
+    resample(speech_like(), CAPTURE_RATE),
+])
+def test_flac_round_trip_is_lossless(samples):
+    """Test that the in-process encoder produces FLAC the reference decoder reads back exactly"""
+    assert np.array_equal(decode_flac(encode_flac(samples, 16000)), samples)
+
+
+@pytest.mark.parametrize("frequency", [200, 1000, 3400, 6000])
+def test_resample_preserves_speech_band(frequency):
+    """Test that in-band tones keep their pitch and level at 16 kHz"""
+    original = tone(frequency)
+    resampled = resample(original, CAPTURE_RATE, 16000)
+
+    assert len(resampled) == 16000
+    assert abs(dominant_frequency(resampled, 16000) - frequency) <= 1
+    assert np.std(resampled) == pytest.approx(np.std(original), rel=0.02)
+
+
+def test_resample_removes_out_of_band_content():
+    """Test that content above 8 kHz is filtered instead of aliasing"""
+    resampled = resample(tone(12000), CAPTURE_RATE, 16000)
+    assert np.abs(resampled).max() <= 1
+
+
+def test_downmix_to_mono():
+    """Test that interleaved stereo is averaged to mono"""
+    stereo = np.array([100, 300, -50, 50], dtype="<i2").tobytes()
+    assert pcm_to_samples(stereo, channels=2).tolist() == [200, 0]
+
+
+def test_prepared_audio_is_smaller_and_skips_the_flac_binary():
+    """Test that recognizers get pre-encoded 16 kHz FLAC about a third of the original size"""
+    captured = sr.AudioData(speech_like().tobytes(), CAPTURE_RATE, 2)
+    prepared = prepare_for_recognition(captured)
+
+    assert prepared.sample_rate == 16000
+    # recognize_google asks for convert_rate=None, convert_width=2
+    flac_data = prepared.get_flac_data(convert_rate=None, convert_width=2)
+    assert flac_data is prepared.flac_data
+    full_rate = encode_flac(pcm_to_samples(captured.frame_data), CAPTURE_RATE)
+    assert len(full_rate) / len(flac_data) > 2.5
+
+
+def with_silence(speech: np.ndarray, before: float, after: float, rate: int = CAPTURE_RATE) -> np.ndarray:
+    rng = np.random.default_rng(2)
+    noise = lambda seconds: rng.normal(0, 30, int(seconds * rate)).astype(np.int16)
+    return np.concatenate([noise(before), speech, noise(after)])
+
+
+def feed_in_chunks(endpointer: Endpointer, samples: np.ndarray, chunk: int = 1024):
+    """Return the sample offset at which the endpointer asked to stop, or None"""
+    for start in range(0, len(samples), chunk):
+        if endpointer.update(samples[start:start + chunk].tobytes()):
+            return start + chunk
+    return None
+
+
+def test_endpointer_stops_after_trailing_silence():
+    """Test that a turn ends about silence_seconds after speech stops"""
+    recording = with_silence(speech_like(seconds=1.0), before=0.5, after=5.0)
+    stopped_at = feed_in_chunks(Endpointer(CAPTURE_RATE, silence_seconds=1.0), recording)
+
+    speech_end = int(1.5 * CAPTURE_RATE)
+    assert stopped_at is not None
+    assert speech_end + CAPTURE_RATE <= stopped_at <= speech_end + int(1.2 * CAPTURE_RATE)
+
+
+def test_endpointer_waits_for_speech():
+    """Test that silence alone never ends the turn before the hard cap"""
+    silence = with_silence(np.zeros(0, dtype=np.int16), before=3.0, after=0)
+    assert feed_in_chunks(Endpointer(CAPTURE_RATE, silence_seconds=1.0), silence) is None
+
+
+def test_endpointer_enforces_max_duration():
+    """Test the hard maximum recording length"""
+    stopped_at = feed_in_chunks(Endpointer(CAPTURE_RATE, max_seconds=1.0), speech_like(seconds=3.0))
+    assert CAPTURE_RATE <= stopped_at < CAPTURE_RATE + 1024
+
+
+def test_speech_bounds_trims_silence():
+    """Test that leading and trailing silence is trimmed with padding"""
+    recording = with_silence(speech_like(seconds=1.0), before=1.0, after=2.0)
+    start, end = speech_bounds(recording, CAPTURE_RATE, padding_ms=100)
+
+    assert 0.85 * CAPTURE_RATE <= start <= CAPTURE_RATE
+    assert 2.0 * CAPTURE_RATE <= end <= 2.15 * CAPTURE_RATE
+    assert speech_bounds(with_silence(np.zeros(0, dtype=np.int16), 1.0, 0), CAPTURE_RATE) is None
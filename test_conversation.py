@@ -0,0 +1,72 @@
+from conversation import ConversationContext, Transcript, estimate_tokens
+
+
+def make_history(exchanges: int) -> list:
+    history = [{'role': 'doctor', 'text': "Hello, I'm your AI doctor today. What brings you in today?"}]
+    for i in range(exchanges):
+        history.append({'role': 'patient', 'text': f"I have had a sharp headache and mild fever for {i + 1} days now."})
+        history.append({'role': 'doctor', 'text': f"How severe is the pain on a scale of 1 to 10, question {i}?"})
+    return history
+
+
+def test_render_uses_plain_lines():
+    """Test that turns are rendered as lines rather than a list repr"""
+    context = ConversationContext.from_history(make_history(1))
+    prompt = context.render()
+    assert "Patient: I have had a sharp headache" in prompt
+    assert "['" not in prompt
+    assert context.patient_turns == 1
+
+
+def test_prompt_size_stays_bounded():
+    """Test that prompt size is near constant as the consultation grows"""
+    short = ConversationContext.from_history(make_history(10)).estimated_tokens()
+    long = ConversationContext.from_history(make_history(200)).estimated_tokens()
+    assert long <= short * 1.1
+    assert long < estimate_tokens(str(make_history(200))) / 20
+
+
+def test_chief_complaint_and_recent_turns_kept():
+    """Test that the first complaint and the latest turns survive summarization"""
+    context = ConversationContext.from_history(make_history(50), recent_turns=4)
+    prompt = context.render()
+    assert "Chief complaint: I have had a sharp headache and mild fever for 1 days now." in prompt
+    assert "for 50 days now." in prompt
+    assert len(context.recent) == 4
+
+
+def test_sync_is_incremental():
+    """Test that sync only processes new entries and resets on a new consultation"""
+    history = make_history(3)
+    context = ConversationContext()
+    context.sync(history)
+    assert context.seen == len(history)
+
+    history.append({'role': 'patient', 'text': "It gets worse at night."})
+    context.sync(history)
+    assert context.patient_turns == 4
+    assert context.recent[-1][1] == "Patient: It gets worse at night."
+
+    context.sync([])
+    assert context.seen == 0
+    assert context.patient_turns == 0
+
+
+def test_transcript_blocks_are_built_once():
+    """Test that finished transcript blocks are kept as-is and only new turns are formatted"""
+    history = make_history(5)  # 11 turns
+    transcript = Transcript(block_turns=4)
+    blocks = transcript.sync(history)
+    assert len(blocks) == 3
+    assert blocks[0].startswith("👨‍⚕️ Doctor: Hello")
+    assert blocks[0].count("\n\n") == 3
+    first = blocks[0]
+
+    history.append({'role': 'patient', 'text': "It gets worse at night."})
+    blocks = transcript.sync(history)
+    assert len(blocks) == 3
+    assert blocks[0] is first
+    assert blocks[-1].endswith("🤒 You: It gets worse at night.")
+
+    # A shorter history is a new consultation
+    assert transcript.sync(history[:1]) == ["👨‍⚕️ Doctor: " + history[0]['text']]
@@ -0,0 +1,64 @@
+import json
+import pytest
+from diagnosis import Diagnosis, build_diagnosis_payload, parse_diagnosis, parse_legacy
+
+MOCK_JSON_REPLY = json.dumps({
+    "potential_causes": ["tension headache", "viral infection", "dehydration"],
+    "life_threatening": False,
+    "explanation": "Symptoms are common and usually self-limiting.",
+    "risk_rating": 3
+})
+
+MOCK_LEGACY_REPLY = """Potential Causes:
+- tension headache
+- viral infection
+
+Life-Threatening Assessment: No - usually self-limiting
+
+Risk Rating: 7/10
+"""
+
+
+def test_payload_requests_json_mode():
+    """Test that the analysis request asks for schema-constrained JSON"""
+    payload = build_diagnosis_payload("headache")
+    config = payload["generationConfig"]
+    assert config["responseMimeType"] == "application/json"
+    assert "risk_rating" in config["responseSchema"]["required"]
+    assert "headache" in payload["contents"][0]["parts"][0]["text"]
+
+
+def test_parse_structured_reply():
+    """Test decoding a valid JSON reply"""
+    result = parse_diagnosis(MOCK_JSON_REPLY)
+    assert result == {
+        "reasons": ["Tension headache", "Viral infection", "Dehydration"],
+        "risk_rating": 3,
+        "life_threatening": "No - Symptoms are common and usually self-limiting."
+    }
+
+
+@pytest.mark.parametrize("changes", [
+    {"risk_rating": 11},
+    {"risk_rating": "7"},
+    {"potential_causes": []},
+    {"life_threatening": "no"},
+])
+def test_invalid_reply_is_rejected(changes):
+    """Test that out-of-schema fields fail validation"""
+    data = json.loads(MOCK_JSON_REPLY)
+    data.update(changes)
+    with pytest.raises(ValueError):
+        Diagnosis.from_json(json.dumps(data))
+
+
+def test_invalid_reply_falls_back_to_legacy_parser():
+    """Test that free-text replies still parse"""
+    result = parse_diagnosis(MOCK_LEGACY_REPLY)
+    assert result["reasons"] == ["Tension headache", "Viral infection"]
+    assert result["life_threatening"] == "No - usually self-limiting"
+
+
+def test_legacy_risk_rating_out_of_ten():
+    """Test that "7/10" parses as 7, not 710"""
+    assert parse_legacy(MOCK_LEGACY_REPLY)["risk_rating"] == 7
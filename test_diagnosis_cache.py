@@ -0,0 +1,72 @@
+import time
+from diagnosis_cache import DiagnosisCache, make_key
+
+MOCK_DIAGNOSIS = {
+    "reasons": ["Tension headache", "Dehydration"],
+    "risk_rating": 3,
+    "life_threatening": "No - common and manageable"
+}
+
+
+def test_make_key_normalizes_symptoms():
+    """Test that trivially different descriptions share a key"""
+    assert make_key("Headache and  fever.\nSeverity: 5/10") == make_key("headache and fever\nseverity: 5/10 ")
+    assert make_key("headache and fever") != make_key("headache and cough")
+    assert make_key("headache", model="gemini-2.0-flash") != make_key("headache", model="gemini-1.5-pro")
+
+
+def test_hit_and_miss_counters():
+    """Test that lookups are counted"""
+    cache = DiagnosisCache()
+    assert cache.get("key") is None
+    cache.put("key", MOCK_DIAGNOSIS)
+    assert cache.get("key") == MOCK_DIAGNOSIS
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_lru_eviction():
+    """Test that the least recently used entry is evicted past the size cap"""
+    cache = DiagnosisCache(max_entries=2)
+    cache.put("a", MOCK_DIAGNOSIS)
+    cache.put("b", MOCK_DIAGNOSIS)
+    cache.get("a")
+    cache.put("c", MOCK_DIAGNOSIS)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == MOCK_DIAGNOSIS
+    assert cache.get("c") == MOCK_DIAGNOSIS
+
+
+def test_ttl_expiry():
+    """Test that entries expire after the TTL"""
+    cache = DiagnosisCache(ttl=0.05)
+    cache.put("key", MOCK_DIAGNOSIS)
+    time.sleep(0.1)
+    assert cache.get("key") is None
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    """Test that the SQLite tier serves entries to a fresh cache"""
+    path = str(tmp_path / "diagnoses.db")
+    DiagnosisCache(path=path).put("key", MOCK_DIAGNOSIS)
+
+    cache = DiagnosisCache(path=path)
+    assert cache.get("key") == MOCK_DIAGNOSIS
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_disk_tier_size_cap(tmp_path):
+    """Test that the SQLite tier keeps only the newest entries"""
+    path = str(tmp_path / "diagnoses.db")
+    cache = DiagnosisCache(path=path, max_disk_entries=2)
+    for key in ["a", "b", "c"]:
+        cache.put(key, MOCK_DIAGNOSIS)
+        time.sleep(0.01)
+
+    fresh = DiagnosisCache(path=path)
+    assert fresh.get("a") is None
+    assert fresh.get("c") == MOCK_DIAGNOSIS
@@ -0,0 +1,282 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import json
+import threading
+import time
+
+import pytest
+import requests
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from conversation import ConversationContext
+from diagnosis_cache import get_cache
+from diagnosis_service import SCHEDULER, AdmissionControl, create_app
+from fake_gemini import FakeGeminiServer
+from gemini_async import AsyncGeminiClient, AsyncGeminiScheduler
+from service_client import ServiceClient
+from triage import build_doctor_payload
+
+CONVERSATION = [
+    {"role": "doctor", "text": "What brings you in today?"},
+    {"role": "patient", "text": "I have a headache and a mild fever."},
+]
+DIAGNOSIS_REPLY = json.dumps({"potential_causes": ["tension headache"], "life_threatening": False,
+                              "explanation": "Common and usually harmless.", "risk_rating": 3})
+
+
+def reply(payload: dict) -> str:
+    if "generationConfig" in payload:
+        return DIAGNOSIS_REPLY
+    return "How long have you had the fever?"
+
+
+@pytest.fixture
+def fake_server():
+    get_cache().clear()
+    with FakeGeminiServer(reply=reply) as server:
+        yield server
+
+
+def service(server, rate_per_minute: float = 60000, burst: int = 1000, **admission) -> TestClient:
+    client = AsyncGeminiClient(api_key="test-key", base_url=server.base_url, backoff_base=0.01)
+    scheduler = AsyncGeminiScheduler(client, rate_per_minute, burst)
+    return TestClient(TestServer(create_app(client, AdmissionControl(**admission), scheduler)))
+
+
+def conversation(i: int) -> list:
+    return CONVERSATION + [{"role": "patient", "text": f"It started {i} days ago."}]
+
+
+@pytest.mark.asyncio
+async def test_turn_and_streamed_turn(fake_server):
+    """Test a doctor turn as JSON and as a plain-text stream"""
+    async with service(fake_server) as client:
+        response = await client.post("/v1/turn", json={"conversation": CONVERSATION})
+        assert response.status == 200
+        assert (await response.json())["text"] == "How long have you had the fever?"
+
+        response = await client.post("/v1/turn?stream=1", json={"conversation": CONVERSATION})
+        assert response.status == 200
+        assert await response.text() == "How long have you had the fever?"
+
+        response = await client.post("/v1/turn", json={"conversation": "not a list"})
+        assert response.status == 400
+    assert [r["method"] for r in fake_server.requests] == ["generateContent", "streamGenerateContent"]
+
+
+@pytest.mark.asyncio
+async def test_analyze_is_cached(fake_server):
+    """Test that a repeat analysis is answered from the diagnosis cache"""
+    async with service(fake_server) as client:
+        for _ in range(2):
+            response = await client.post("/v1/analyze", json={"symptoms": "Headache and fever"})
+            body = await response.json()
+            assert body["error"] is None
+            assert body["diagnosis"]["reasons"] == ["Tension headache"]
+            assert body["diagnosis"]["risk_rating"] == 3
+    assert len(fake_server.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_upstream_failures(fake_server):
+    """Test that transient API errors are retried and lasting ones become an error message"""
+    fake_server.statuses = [503]
+    async with service(fake_server) as client:
+        response = await client.post("/v1/turn", json={"conversation": CONVERSATION})
+        assert (await response.json())["text"] == "How long have you had the fever?"
+
+        fake_server.statuses = [400]
+        body = await (await client.post("/v1/analyze", json={"symptoms": "Chest pain"})).json()
+        assert body["error"].startswith("Error connecting to the AI service")
+        assert body["diagnosis"]["risk_rating"] == 0
+    assert len(fake_server.requests) == 3
+
+
+@pytest.mark.asyncio
+async def test_many_calls_in_flight(fake_server):
+    """Test that slow model calls overlap on one event loop instead of queueing"""
+    def slow_reply(payload):
+        time.sleep(0.3)
+        return reply(payload)
+    fake_server.reply = slow_reply
+
+    async with service(fake_server) as client:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(client.post("/v1/turn", json={"conversation": conversation(i)})
+                                           for i in range(100)))
+        elapsed = time.perf_counter() - started
+        assert all(response.status == 200 for response in responses)
+    assert len(fake_server.requests) == 100
+    assert elapsed < 3.0  # 100 sequential calls would take 30s
+
+
+@pytest.mark.asyncio
+async def test_overload_is_rejected(fake_server):
+    """Test that requests beyond the in-flight and queue limits get 503 with Retry-After"""
+    def slow_reply(payload):
+        time.sleep(0.3)
+        return reply(payload)
+    fake_server.reply = slow_reply
+
+    async with service(fake_server, max_in_flight=1, max_queued=1) as client:
+        responses = await asyncio.gather(*(client.post("/v1/turn", json={"conversation": conversation(i)})
+                                           for i in range(4)))
+        statuses = sorted(response.status for response in responses)
+        assert statuses == [200, 200, 503, 503]
+        rejected = next(response for response in responses if response.status == 503)
+        assert rejected.headers["Retry-After"] == "1"
+
+        health = await (await client.get("/v1/health")).json()
+        assert health["rejected"] == 2
+        assert health["served"] == 2
+
+
+@pytest.mark.asyncio
+async def test_burst_is_held_to_the_rate_limit(fake_server):
+    """Test that a burst of distinct requests reaches the API no faster than the token bucket allows"""
+    rate, burst = 1200, 5  # 20 calls a second after the first 5
+    async with service(fake_server, rate_per_minute=rate, burst=burst) as client:
+        responses = await asyncio.gather(
+            *(client.post("/v1/analyze", json={"symptoms": f"Headache for {i} days"}) for i in range(25)),
+            *(client.post("/v1/turn", json={"conversation": conversation(i)}) for i in range(15)))
+        assert all(response.status == 200 for response in responses)
+        health = await (await client.get("/v1/health")).json()
+
+    received = sorted(request["received"] for request in fake_server.requests)
+    assert len(received) == 40
+    assert received[-1] - received[0] >= (len(received) - burst) * 60 / rate * 0.9
+    for first in range(len(received)):
+        for last in range(first, len(received)):
+            # No window sees more than the burst plus the refill, give or take network jitter
+            window = received[last] - received[first]
+            assert last - first + 1 <= burst + window * rate / 60 + 2
+    assert health["scheduler"]["calls"] == 40
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_share_one_call(fake_server):
+    """Test that identical concurrent analyses and turns reach the API once each"""
+    def slow_reply(payload):
+        time.sleep(0.2)
+        return reply(payload)
+    fake_server.reply = slow_reply
+
+    async with service(fake_server) as client:
+        responses = await asyncio.gather(
+            *(client.post("/v1/analyze", json={"symptoms": "Headache and fever"}) for _ in range(10)),
+            *(client.post("/v1/turn", json={"conversation": CONVERSATION}) for _ in range(10)))
+        bodies = [await response.json() for response in responses]
+        assert all(body["diagnosis"]["risk_rating"] == 3 for body in bodies[:10])
+        assert all(body["text"] == "How long have you had the fever?" for body in bodies[10:])
+        health = await (await client.get("/v1/health")).json()
+    assert sorted(r["method"] for r in fake_server.requests) == ["generateContent", "generateContent"]
+    assert health["scheduler"]["coalesced"] == 18
+
+
+@pytest.mark.asyncio
+async def test_background_analysis_waits_for_turns(fake_server):
+    """Test that queued doctor turns reach the API before queued background analyses"""
+    async with service(fake_server, rate_per_minute=240, burst=1) as client:  # one token per 250ms
+        scheduler = client.app[SCHEDULER]
+        await client.post("/v1/analyze", json={"symptoms": "Drain the bucket"})
+        background = [asyncio.ensure_future(client.post("/v1/analyze", json={"symptoms": f"Rash {i}",
+                                                                             "background": True}))
+                      for i in range(3)]
+        deadline = time.monotonic() + 0.2
+        while scheduler.stats()["lanes"]["background"]["queued"] < 3 and time.monotonic() < deadline:
+            await asyncio.sleep(0.005)
+        assert scheduler.stats()["lanes"]["background"]["queued"] == 3
+        turns = [asyncio.ensure_future(client.post("/v1/turn", json={"conversation": conversation(i)}))
+                 for i in range(3)]
+        await asyncio.gather(*background, *turns)
+
+    kinds = ["analysis" if "generationConfig" in r["payload"] else "turn" for r in fake_server.requests[1:]]
+    assert kinds == ["turn"] * 3 + ["analysis"] * 3
+
+
+@pytest.mark.asyncio
+async def test_conversation_context_is_kept_between_turns(fake_server, monkeypatch):
+    """Test that a named conversation's context only takes in the turns added since its last request"""
+    appended = []
+    append = ConversationContext.append
+    monkeypatch.setattr(ConversationContext, "append", lambda self, role, text: appended.append(text) or
+                        append(self, role, text))
+
+    history = list(CONVERSATION)
+    async with service(fake_server) as client:
+        for i in range(3):
+            response = await client.post("/v1/turn", json={"conversation": history, "conversation_id": "visit-1"})
+            history += [{"role": "doctor", "text": (await response.json())["text"]},
+                        {"role": "patient", "text": f"It started {i + 1} days ago."}]
+        health = await (await client.get("/v1/health")).json()
+
+        response = await client.post("/v1/turn", json={"conversation": history, "conversation_id": 7})
+        assert response.status == 400
+
+    assert len(appended) == len(history) - 2  # each turn once, not the whole history per request
+    assert health["conversations"] == 1
+    monkeypatch.setattr(ConversationContext, "append", append)
+    assert fake_server.requests[-1]["payload"] == build_doctor_payload(history[:-2])
+
+
+@contextlib.contextmanager
+def running_service(app: web.Application):
+    """Serve ``app`` on a background event loop and yield its base URL"""
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def test_service_client(fake_server):
+    """Test the app's blocking client against a running service"""
+    with running_service(create_app(AsyncGeminiClient(api_key="test-key", base_url=fake_server.base_url))) as url:
+        client = ServiceClient(url)
+        assert client.doctor_turn(CONVERSATION) == "How long have you had the fever?"
+        assert "".join(client.stream_doctor_turn(CONVERSATION, "visit-1")) == "How long have you had the fever?"
+        diagnosis, error = client.analyze("Headache and fever")
+        assert error is None and diagnosis["risk_rating"] == 3
+        client.close()
+
+
+def test_service_client_retries_once_after_overload(fake_server):
+    """Test that a 503 with Retry-After is retried once after a bounded wait, and a second 503 is an error"""
+    def slow_reply(payload):
+        time.sleep(0.3)
+        return reply(payload)
+    fake_server.reply = slow_reply
+
+    app = create_app(AsyncGeminiClient(api_key="test-key", base_url=fake_server.base_url),
+                     AdmissionControl(max_in_flight=1, max_queued=0))
+    with running_service(app) as url:
+        busy = ServiceClient(url)
+        with concurrent.futures.ThreadPoolExecutor(1) as pool:
+            # Retry-After says 1s; the client caps the wait at 0.5s, after the slow call has finished
+            holder = pool.submit(busy.doctor_turn, conversation(0))
+            time.sleep(0.1)
+            started = time.perf_counter()
+            assert ServiceClient(url, retry_wait=0.5).doctor_turn(conversation(1)) == \
+                "How long have you had the fever?"
+            assert 0.5 <= time.perf_counter() - started < 1.0
+            holder.result()
+
+            holder = pool.submit(busy.doctor_turn, conversation(2))
+            time.sleep(0.1)
+            with pytest.raises(requests.HTTPError) as raised:
+                ServiceClient(url, retry_wait=0.05).doctor_turn(conversation(3))
+            assert raised.value.response.status_code == 503
+            holder.result()
+    assert len(fake_server.requests) == 3
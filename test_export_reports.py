@@ -0,0 +1,79 @@
+import json
+import os
+import zipfile
+
+import pytest
+
+from export_reports import CHECKPOINT_FILE, export
+from patient_store import PatientStore
+
+MOCK_DIAGNOSIS = {
+    "reasons": ["Tension headache"],
+    "risk_rating": 3,
+    "life_threatening": "No - common and manageable"
+}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "patients.db")
+    store = PatientStore(path)
+    for i in range(25):
+        if i % 2:
+            data = {"conversation": [{"role": "patient", "text": f"headache number {i}"}], "diagnosis": MOCK_DIAGNOSIS}
+            store.add_consultation(f"p{i % 3}", "conversation", data, created=1700000000.0 + i)
+        else:
+            data = {"symptoms": f"fever {i}", "diagnosis": MOCK_DIAGNOSIS, "severity": 5, "duration": "2 Days"}
+            store.add_consultation(f"p{i % 3}", "symptoms", data, created=1700000000.0 + i)
+    store.close()
+    return path
+
+
+def exported_files(output):
+    return sorted(os.path.relpath(os.path.join(root, name), output)
+                  for root, _, names in os.walk(output) for name in names if name.endswith(".pdf"))
+
+
+def test_export_to_per_patient_directories(db_path, tmp_path):
+    """Test that every consultation becomes a PDF under its patient's directory"""
+    output = str(tmp_path / "out")
+    stats = export(output, db_path=db_path, workers=2, batch_size=4, report=lambda line: None)
+
+    files = exported_files(output)
+    assert stats["exported"] == 25 and len(files) == 25
+    assert {path.split(os.sep)[0] for path in files} == {"p0", "p1", "p2"}
+    with open(os.path.join(output, files[0]), 'rb') as f:
+        assert f.read().startswith(b"%PDF")
+
+
+def test_interrupted_export_resumes(db_path, tmp_path):
+    """Test that a second run continues after the checkpoint instead of starting over"""
+    output = str(tmp_path / "out")
+    first = export(output, db_path=db_path, workers=2, batch_size=4, limit=10, report=lambda line: None)
+    assert first["exported"] == 10
+    with open(os.path.join(output, CHECKPOINT_FILE)) as f:
+        assert json.load(f)["exported"] == 10
+
+    second = export(output, db_path=db_path, workers=2, batch_size=4, report=lambda line: None)
+    assert second["exported"] == 15 and second["total"] == 25
+    assert len(exported_files(output)) == 25
+
+    with pytest.raises(ValueError):
+        export(output, db_path=db_path, fmt="zip", report=lambda line: None)
+
+
+def test_export_to_zip_parts(db_path, tmp_path):
+    """Test that zip output is split into complete parts and resumes by part"""
+    output = str(tmp_path / "zips")
+    lines = []
+    export(output, db_path=db_path, fmt="zip", workers=2, batch_size=4, part_size=8, limit=17, report=lines.append)
+    export(output, db_path=db_path, fmt="zip", workers=2, batch_size=4, part_size=8, report=lines.append)
+
+    parts = sorted(name for name in os.listdir(output) if name.endswith(".zip"))
+    assert not any(name.endswith(".tmp") for name in os.listdir(output))
+    names = []
+    for part in parts:
+        with zipfile.ZipFile(os.path.join(output, part)) as archive:
+            names += archive.namelist()
+    assert len(names) == len(set(names)) == 25
+    assert any("/s" in line for line in lines)  # throughput is reported
@@ -0,0 +1,77 @@
+import pytest
+import requests
+from gemini_client import GeminiClient, extract_text, get_client
+from fake_gemini import FakeGeminiServer
+
+MOCK_PAYLOAD = {"contents": [{"parts": [{"text": "I have a headache"}]}]}
+
+
+@pytest.fixture
+def fake_server():
+    with FakeGeminiServer() as server:
+        yield server
+
+
+def make_client(server, **kwargs):
+    kwargs.setdefault("backoff_base", 0.01)
+    return GeminiClient(api_key="test-key", base_url=server.base_url, **kwargs)
+
+
+def test_generate_content_reuses_connection(fake_server):
+    """Test that consecutive calls share one keep-alive connection"""
+    client = make_client(fake_server)
+    for _ in range(3):
+        data = client.generate_content(MOCK_PAYLOAD)
+        assert extract_text(data) == "This is a fake doctor response."
+
+    assert len(fake_server.requests) == 3
+    assert len(fake_server.connections) == 1
+    assert fake_server.requests[0]["method"] == "generateContent"
+
+
+def test_retries_on_transient_errors(fake_server):
+    """Test bounded retries on 429/5xx responses"""
+    fake_server.statuses = [429, 503]
+    client = make_client(fake_server, max_retries=3)
+
+    data = client.generate_content(MOCK_PAYLOAD)
+
+    assert extract_text(data) == "This is a fake doctor response."
+    assert len(fake_server.requests) == 3
+
+
+def test_gives_up_after_max_retries(fake_server):
+    """Test that retries stop once the retry budget is spent"""
+    fake_server.statuses = [503, 503, 503]
+    client = make_client(fake_server, max_retries=1)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.generate_content(MOCK_PAYLOAD)
+    assert len(fake_server.requests) == 2
+
+
+def test_client_errors_are_not_retried(fake_server):
+    """Test that a 4xx other than 429 fails immediately"""
+    fake_server.statuses = [400]
+    client = make_client(fake_server)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.generate_content(MOCK_PAYLOAD)
+    assert len(fake_server.requests) == 1
+
+
+def test_get_client_is_shared():
+    """Test that the process-wide client is created once"""
+    assert get_client() is get_client()
+
+
+def test_stream_generate_content():
+    """Test that streamed chunks arrive in order and rebuild the full reply"""
+    reply = "You may have a tension headache. Drink water and rest. See a doctor if it persists."
+    with FakeGeminiServer(reply=lambda payload: reply, chunk_size=2) as server:
+        client = make_client(server)
+        chunks = list(client.stream_generate_content(MOCK_PAYLOAD))
+
+    assert len(chunks) > 1
+    assert "".join(chunks) == reply
+    assert server.requests[0]["method"] == "streamGenerateContent"
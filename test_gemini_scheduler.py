@@ -0,0 +1,127 @@
+import threading
+import time
+
+import pytest
+import requests
+from fake_gemini import FakeGeminiServer
+from gemini_client import GeminiClient, extract_text
+from gemini_scheduler import BACKGROUND, INTERACTIVE, GeminiScheduler, TokenBucket
+
+MOCK_PAYLOAD = {"contents": [{"parts": [{"text": "I have a headache"}]}]}
+
+
+def make_scheduler(server, **kwargs):
+    client = GeminiClient(api_key="test-key", base_url=server.base_url, backoff_base=0.01, max_retries=0)
+    return GeminiScheduler(client, **kwargs)
+
+
+def test_token_bucket_allows_burst_then_paces():
+    """Test that the bucket allows a burst and then one request per refill interval"""
+    bucket = TokenBucket(rate_per_minute=600, burst=3)
+    assert [bucket.take() for _ in range(3)] == [0.0, 0.0, 0.0]
+    delay = bucket.take()
+    assert 0 < delay <= 0.1
+
+
+def test_rate_limit_spaces_out_calls():
+    """Test that calls beyond the burst wait for tokens"""
+    with FakeGeminiServer() as server:
+        scheduler = make_scheduler(server, rate_per_minute=1200, burst=2)  # one token per 50ms
+        started = time.perf_counter()
+        for i in range(6):
+            scheduler.generate_content({"contents": [{"parts": [{"text": f"call {i}"}]}]})
+        elapsed = time.perf_counter() - started
+    assert elapsed >= 0.18
+    assert scheduler.stats()["calls"] == 6
+
+
+def test_identical_requests_share_one_call():
+    """Test that concurrent identical requests are merged into a single API call"""
+    def slow_reply(payload):
+        time.sleep(0.2)
+        return "Shared answer."
+
+    with FakeGeminiServer(reply=slow_reply) as server:
+        scheduler = make_scheduler(server)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(extract_text(scheduler.generate_content(MOCK_PAYLOAD))))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert results == ["Shared answer."] * 5
+    assert len(server.requests) == 1
+    assert scheduler.stats()["coalesced"] == 4
+
+
+def test_failures_are_shared_and_not_cached():
+    """Test that followers see the leader's error and a later call tries again"""
+    with FakeGeminiServer(statuses=[400]) as server:
+        scheduler = make_scheduler(server)
+        with pytest.raises(requests.exceptions.HTTPError):
+            scheduler.generate_content(MOCK_PAYLOAD)
+        assert extract_text(scheduler.generate_content(MOCK_PAYLOAD)) == "This is a fake doctor response."
+    assert len(server.requests) == 2
+
+
+def test_interactive_lane_goes_first():
+    """Test that waiting interactive calls are served before earlier background ones"""
+    with FakeGeminiServer(reply=lambda payload: payload["contents"][0]["parts"][0]["text"]) as server:
+        scheduler = make_scheduler(server, rate_per_minute=300, burst=1)  # one token per 200ms
+        scheduler.generate_content({"contents": [{"parts": [{"text": "drain"}]}]})
+
+        def call(text, lane):
+            scheduler.generate_content({"contents": [{"parts": [{"text": text}]}]}, lane=lane)
+
+        threads = [threading.Thread(target=call, args=(f"background {i}", BACKGROUND)) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 0.15
+        while scheduler.stats()["lanes"]["background"]["queued"] < 2 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        assert scheduler.stats()["lanes"]["background"]["queued"] == 2
+        threads.append(threading.Thread(target=call, args=("interactive", INTERACTIVE)))
+        threads[-1].start()
+        for thread in threads:
+            thread.join()
+
+    order = [r["payload"]["contents"][0]["parts"][0]["text"] for r in server.requests[1:]]
+    assert order == ["interactive", "background 0", "background 1"]
+    lanes = scheduler.stats()["lanes"]
+    assert lanes["background"]["calls"] == 2 and lanes["background"]["queued"] == 0
+    assert lanes["background"]["max_wait"] > lanes["interactive"]["max_wait"] > 0
+
+
+def test_interactive_caller_promotes_a_shared_background_call():
+    """Test that joining a queued background call moves it ahead of other background work"""
+    with FakeGeminiServer(reply=lambda payload: payload["contents"][0]["parts"][0]["text"]) as server:
+        scheduler = make_scheduler(server, rate_per_minute=300, burst=1)  # one token per 200ms
+        scheduler.generate_content({"contents": [{"parts": [{"text": "drain"}]}]})
+
+        def call(text, lane, results=None):
+            data = scheduler.generate_content({"contents": [{"parts": [{"text": text}]}]}, lane=lane)
+            if results is not None:
+                results.append(extract_text(data))
+
+        threads = [threading.Thread(target=call, args=(text, BACKGROUND)) for text in ("earlier", "speculative")]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.01)  # keep their arrival order
+        deadline = time.monotonic() + 0.15
+        while scheduler.stats()["lanes"]["background"]["queued"] < 2 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        results = []
+        threads.append(threading.Thread(target=call, args=("speculative", INTERACTIVE, results)))
+        threads[-1].start()
+        for thread in threads:
+            thread.join()
+
+    order = [r["payload"]["contents"][0]["parts"][0]["text"] for r in server.requests[1:]]
+    assert order == ["speculative", "earlier"]
+    assert results == ["speculative"]
+    stats = scheduler.stats()
+    assert stats["coalesced"] == 1 and stats["promoted"] == 1
+    # The drain call and the promoted one ran interactive; only the earlier call stayed in the background
+    assert stats["lanes"]["interactive"]["calls"] == 2 and stats["lanes"]["background"]["calls"] == 1
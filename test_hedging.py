@@ -0,0 +1,125 @@
+import time
+
+import pytest
+from hedging import Hedger, LatencyHistogram
+
+
+def test_histogram_percentiles_over_rolling_window():
+    """Test bucketed percentiles and that old samples roll out of the window"""
+    histogram = LatencyHistogram(window=100)
+    assert histogram.percentile(50) is None
+    for i in range(1, 101):
+        histogram.record(i / 100)  # 10ms .. 1s
+    assert histogram.percentile(50) == pytest.approx(0.5, rel=0.1)
+    assert histogram.percentile(99) == pytest.approx(0.99, rel=0.1)
+
+    for _ in range(100):
+        histogram.record(0.05)
+    assert len(histogram) == 100
+    assert histogram.percentile(99) == pytest.approx(0.05, rel=0.1)
+
+
+def slow_primary(stall: float, fast: float = 0.01):
+    def request(model, is_hedge):
+        assert is_hedge == (model is not None)
+        time.sleep(stall if model is None else fast)
+        return model or "primary"
+    return request
+
+
+def test_stalled_call_is_hedged_to_fallback_model():
+    """Test that a primary slower than the hedge delay loses to the fallback model"""
+    hedger = Hedger(fallback_model="fast-model", initial_delay=0.05)
+    started = time.perf_counter()
+    assert hedger.call(slow_primary(1.0)) == "fast-model"
+    assert time.perf_counter() - started < 0.5
+    assert hedger.stats()["hedges"] == 1
+    assert hedger.stats()["hedge_wins"] == 1
+
+    # A fast primary is never hedged
+    assert hedger.call(slow_primary(0.0)) == "primary"
+    assert hedger.stats()["hedges"] == 1
+
+
+def test_hedge_is_flagged_without_fallback_model():
+    """Test that a hedge to the same model is still marked, so it can skip sharing the stalled call"""
+    seen = []
+
+    def request(model, is_hedge):
+        seen.append((model, is_hedge))
+        time.sleep(0.01 if is_hedge else 0.5)
+        return "hedge" if is_hedge else "primary"
+
+    hedger = Hedger(initial_delay=0.05)
+    assert hedger.call(request) == "hedge"
+    assert seen == [(None, False), (None, True)]
+
+
+def test_hedge_budget_caps_extra_requests():
+    """Test that hedges stop once the budget is spent"""
+    hedger = Hedger(fallback_model="fast-model", initial_delay=0.05, budget_ratio=0.0)
+    assert hedger.call(slow_primary(0.2)) == "fast-model"
+    assert hedger.call(slow_primary(0.2)) == "primary"
+    assert hedger.stats()["hedges"] == 1
+
+
+def test_stream_is_hedged_on_first_chunk():
+    """Test that a stream with a stalled first chunk is replaced by the hedge's stream"""
+    abandoned = []
+
+    def request(model, is_hedge):
+        if model is None:
+            try:
+                time.sleep(1.0)
+                yield "slow "
+                yield "reply"
+            finally:
+                abandoned.append(True)
+        else:
+            yield "fast "
+            yield "reply"
+
+    hedger = Hedger(fallback_model="fast-model", initial_delay=0.05)
+    started = time.perf_counter()
+    assert "".join(hedger.stream(request)) == "fast reply"
+    assert time.perf_counter() - started < 0.5
+    assert hedger.stats()["hedge_wins"] == 1
+    time.sleep(1.2)
+    assert abandoned == [True]
+
+
+def test_stream_error_falls_back_to_running_hedge():
+    """Test that a primary failing after the hedge started does not fail the turn"""
+    def request(model, is_hedge):
+        if model is None:
+            time.sleep(0.1)
+            raise ConnectionError("primary failed")
+        time.sleep(0.2)
+        yield "hedged reply"
+
+    hedger = Hedger(fallback_model="fast-model", initial_delay=0.05)
+    assert list(hedger.stream(request)) == ["hedged reply"]
+
+
+def test_tail_latency_collapses_toward_median():
+    """Test that with hedging the slowest turns take about as long as typical ones"""
+    calls = [0]
+
+    def request(model, is_hedge):
+        calls[0] += 1
+        # Every tenth primary stalls
+        stalled = model is None and calls[0] % 10 == 0
+        time.sleep(0.5 if stalled else 0.01)
+        return "reply"
+
+    hedger = Hedger(percentile=80, initial_delay=0.05, min_samples=10, budget_ratio=0.2)
+    latencies = []
+    for _ in range(100):
+        started = time.perf_counter()
+        hedger.call(request)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    p50, p99 = latencies[49], latencies[98]
+    assert p99 < 0.15  # a stalled primary alone takes 0.5s
+    assert p99 < 10 * p50
+    assert hedger.stats()["hedges"] <= 0.2 * 100 + 1
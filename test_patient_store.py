@@ -0,0 +1,181 @@
+import re
+import sqlite3
+import threading
+
+import pytest
+
+from patient_store import PatientStore
+
+MOCK_DIAGNOSIS = {
+    "reasons": ["Tension headache"],
+    "risk_rating": 3,
+    "life_threatening": "No - common and manageable"
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = PatientStore(str(tmp_path / "patients.db"))
+    yield store
+    store.close()
+
+
+def test_patient_fields_are_merged(store):
+    """Test that later saves update only the fields they carry"""
+    store.save_patient("p1", name="John Doe", dob="1990-01-01")
+    store.save_patient("p1", insurance_name="Acme", insurance_id="A-1")
+    store.flush()
+
+    patient = store.get_patient("p1")
+    assert patient["name"] == "John Doe"
+    assert patient["insurance_id"] == "A-1"
+    assert store.get_patient("unknown") is None
+    with pytest.raises(ValueError):
+        store.save_patient("p1", ssn="123")
+
+
+def test_patient_number_finds_the_patient(store):
+    """Test that a patient number is issued once and, with the date of birth, finds the patient"""
+    store.save_patient("p1", name="John Doe", dob="1990-01-01")
+    store.save_patient("p1", insurance_name="Acme")
+    store.save_patient("p2", name="Jane Doe", dob="1990-01-01")
+    store.flush()
+
+    number = store.get_patient("p1")["patient_number"]
+    assert re.fullmatch(r"\d{4}-\d{4}", number)
+    assert number != store.get_patient("p2")["patient_number"]
+    assert store.find_patient(number, "1990-01-01") == "p1"
+    assert store.find_patient(number.replace("-", " "), "1990-01-01") == "p1"
+    assert store.find_patient(number, "1990-01-02") is None
+    assert store.find_patient("12", "1990-01-01") is None
+
+
+def test_consultations_are_appended_not_overwritten(store):
+    """Test that every consultation is kept, per patient, oldest first"""
+    store.add_consultation("p1", "symptoms", {"diagnosis": MOCK_DIAGNOSIS}, symptoms="headache",
+                           risk_rating=3, created=100.0)
+    row_id = store.add_consultation("p1", "conversation", {"conversation": []}, created=200.0).result(5)
+    store.add_consultation("p2", "symptoms", {"diagnosis": MOCK_DIAGNOSIS}, created=150.0)
+    store.flush()
+
+    history = store.consultations("p1")
+    assert [record["kind"] for record in history] == ["symptoms", "conversation"]
+    assert history[0]["data"]["diagnosis"] == MOCK_DIAGNOSIS
+    assert history[0]["risk_rating"] == 3
+    assert history[1]["id"] == row_id
+    assert len(store.consultations("p2")) == 1
+
+
+def test_concurrent_sessions_do_not_clobber_each_other(store):
+    """Test that writes from many threads all land"""
+    def session(i):
+        store.save_patient(f"p{i}", name=f"Patient {i}")
+        for visit in range(10):
+            store.add_consultation(f"p{i}", "symptoms", {"visit": visit})
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.flush()
+
+    for i in range(8):
+        assert store.get_patient(f"p{i}")["name"] == f"Patient {i}"
+        assert [record["data"]["visit"] for record in store.consultations(f"p{i}")] == list(range(10))
+
+
+def test_failed_write_does_not_affect_its_batch(store):
+    """Test that one bad record fails alone while the rest of the batch commits"""
+    before = store.add_consultation("p1", "symptoms", {"ok": True})
+    failed = store._submit(lambda db: db.execute("INSERT INTO missing_table VALUES (1)"))
+    after = store.add_consultation("p1", "symptoms", {"ok": True})
+    store.flush()
+    with pytest.raises(sqlite3.OperationalError):
+        failed.result()
+    assert before.result() is not None and after.result() is not None
+    assert len(store.consultations("p1")) == 2
+
+
+def test_database_uses_wal_and_indexes(tmp_path):
+    """Test that the store runs in WAL mode with patient and date indexes"""
+    path = str(tmp_path / "patients.db")
+    PatientStore(path).close()
+    db = sqlite3.connect(path)
+    assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    indexes = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"consultations_patient", "consultations_created"} <= indexes
+
+
+def test_database_is_private(tmp_path):
+    """Test that a new database, its directory and its WAL file are readable by the app's user only"""
+    path = tmp_path / "app-data" / "patients.db"
+    store = PatientStore(str(path))
+    store.save_patient("p1", name="John Doe").result()
+    assert path.parent.stat().st_mode & 0o777 == 0o700
+    for name in ("patients.db", "patients.db-wal"):
+        assert (path.parent / name).stat().st_mode & 0o777 == 0o600
+    store.close()
+
+
+@pytest.fixture
+def history(store):
+    conversation = [
+        {"role": "doctor", "text": "What brings you in today?"},
+        {"role": "patient", "text": "I have a pounding migraine and nausea"},
+    ]
+    store.add_consultation("p1", "conversation", {"conversation": conversation}, risk_rating=4, created=100.0)
+    store.add_consultation("p1", "symptoms", {"symptoms": "sore throat"}, symptoms="sore throat",
+                           risk_rating=2, created=200.0)
+    store.add_consultation("p1", "symptoms", {}, symptoms="crushing chest pain", risk_rating=9, created=300.0)
+    store.add_consultation("p2", "symptoms", {}, symptoms="chest cold", risk_rating=3, created=250.0)
+    store.flush()
+    return store
+
+
+def ids(records):
+    return [(record["patient_id"], record["created"]) for record in records]
+
+
+def test_search_by_patient_date_and_risk(history):
+    """Test that filters combine and results come back newest first"""
+    assert ids(history.search(patient_id="p1")) == [("p1", 300.0), ("p1", 200.0), ("p1", 100.0)]
+    assert ids(history.search(since=150.0, until=300.0)) == [("p2", 250.0), ("p1", 200.0)]
+    assert ids(history.search(min_risk=4)) == [("p1", 300.0), ("p1", 100.0)]
+    assert ids(history.search(patient_id="p1", max_risk=3)) == [("p1", 200.0)]
+    assert ids(history.search(limit=1, offset=1)) == [("p2", 250.0)]
+
+
+def test_full_text_search_over_turns_and_symptoms(history):
+    """Test that every word must match, in the conversation or the symptoms"""
+    assert ids(history.search(text="Migraine")) == [("p1", 100.0)]
+    assert ids(history.search(text="chest")) == [("p1", 300.0), ("p2", 250.0)]
+    assert ids(history.search(text="chest pain", patient_id="p2")) == []
+    assert ids(history.search(text='chest" (*')) == [("p1", 300.0), ("p2", 250.0)]
+    assert history.search(text="???") == []
+
+
+def test_queries_use_indexes(history):
+    """Test that patient, date and risk lookups do not scan the table"""
+    db = history._reader()
+    for condition in ("patient_id = 'p1'", "created >= 1", "risk_rating >= 5"):
+        plan = " ".join(row[3] for row in db.execute(
+            f"EXPLAIN QUERY PLAN SELECT * FROM consultations WHERE {condition} ORDER BY created DESC"))
+        assert "USING INDEX" in plan, plan
+
+
+def test_existing_consultations_are_backfilled(tmp_path):
+    """Test that consultations written before full-text search are indexed on open"""
+    path = str(tmp_path / "patients.db")
+    store = PatientStore(path)
+    store.add_consultation("p1", "symptoms", {}, symptoms="itchy rash")
+    store.close()
+    db = sqlite3.connect(path)
+    db.execute("DROP TABLE consultations_fts")
+    db.execute("PRAGMA user_version = 1")
+    db.commit()
+    db.close()
+
+    store = PatientStore(path)
+    assert len(store.search(text="rash")) == 1
+    store.close()
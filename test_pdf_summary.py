@@ -0,0 +1,57 @@
+import threading
+
+from pdf_summary import PDFRenderer, content_key, render_pdf
+
+MOCK_SUMMARY = {
+    "Conversation": [
+        {"role": "doctor", "text": "What brings you in today?"},
+        {"role": "patient", "text": "A headache — and a fever since yesterday. " * 20},
+    ],
+    "Final Diagnosis": {
+        "reasons": ["Tension headache", "Viral infection"],
+        "risk_rating": 3,
+        "life_threatening": "No - common and manageable",
+    },
+}
+
+
+def test_render_pdf_in_memory():
+    """Test that a summary with long turns and non-Latin-1 text renders to PDF bytes"""
+    pdf = render_pdf(MOCK_SUMMARY)
+    assert pdf.startswith(b"%PDF")
+    assert len(pdf) > 1000
+
+
+def test_content_key_ignores_dict_order():
+    assert content_key({"a": 1, "b": 2}) == content_key({"b": 2, "a": 1})
+    assert content_key({"a": 1}) != content_key({"a": 2})
+
+
+def test_identical_summaries_render_once():
+    """Test that reruns get the cached or in-flight render instead of a new one"""
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_render(data):
+        started.set()
+        release.wait(5)
+        return render_pdf(data)
+
+    renderer = PDFRenderer(render=slow_render)
+    first = renderer.submit(MOCK_SUMMARY)
+    assert started.wait(5)
+    assert not first.done()  # submit returned while rendering continues
+    second = renderer.submit(dict(MOCK_SUMMARY))
+    release.set()
+    assert first.result(5) == second.result(5)
+
+    third = renderer.submit(MOCK_SUMMARY)
+    assert third.done() and third.result() == first.result()
+    assert renderer.stats() == {"hits": 2, "renders": 1, "entries": 1}
+
+
+def test_cache_is_bounded():
+    renderer = PDFRenderer(max_entries=2)
+    for i in range(4):
+        renderer.submit({"Symptoms": f"case {i}"}).result(5)
+    assert renderer.stats()["entries"] == 2
@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+
+import playback
+from fake_audio import fake_speaker_manager
+from playback import PlaybackEngine
+from speech_backends import SpeechClip
+
+
+class FakePlayer:
+    """Plays each clip for ``duration`` seconds unless stopped"""
+
+    def __init__(self, duration: float = 0.05):
+        self.duration = duration
+        self.played = []
+        self.cut_short = []
+
+    def __call__(self, clip: SpeechClip, stop: threading.Event):
+        if stop.wait(self.duration):
+            self.cut_short.append(clip.data)
+        else:
+            self.played.append(clip.data)
+
+
+def clip(name: str) -> SpeechClip:
+    return SpeechClip(name.encode(), ".wav")
+
+
+def test_enqueue_returns_immediately_and_plays_in_order():
+    """Test that queuing does not block and clips play in order"""
+    player = FakePlayer(duration=0.05)
+    engine = PlaybackEngine(player)
+
+    started = time.monotonic()
+    for name in ["one", "two", "three"]:
+        engine.enqueue(clip(name))
+    assert time.monotonic() - started < 0.05
+    assert engine.busy
+
+    assert engine.wait_idle(timeout=2)
+    assert player.played == [b"one", b"two", b"three"]
+
+
+def test_interrupt_stops_current_and_drops_queue():
+    """Test that interrupting cuts the current clip and discards the rest"""
+    player = FakePlayer(duration=1.0)
+    engine = PlaybackEngine(player)
+    for name in ["one", "two", "three"]:
+        engine.enqueue(clip(name))
+    time.sleep(0.05)
+
+    engine.interrupt()
+    assert engine.wait_idle(timeout=1)
+    assert player.cut_short == [b"one"]
+    assert player.played == []
+
+    # Clips queued after the interrupt play normally
+    player.duration = 0.01
+    engine.enqueue(clip("four"))
+    assert engine.wait_idle(timeout=1)
+    assert player.played == [b"four"]
+
+
+def test_player_errors_are_collected():
+    """Test that a failing clip does not stop the worker"""
+    played = []
+
+    def player(item, stop):
+        if item.data == b"bad":
+            raise RuntimeError("device unavailable")
+        played.append(item.data)
+
+    engine = PlaybackEngine(player)
+    engine.enqueue(clip("bad"))
+    engine.enqueue(clip("good"))
+    assert engine.wait_idle(timeout=1)
+    assert played == [b"good"]
+    assert len(engine.errors) == 1
+
+
+def test_worker_exits_when_idle_and_restarts():
+    """Test that the worker thread ends after the idle timeout and a new clip starts another"""
+    player = FakePlayer(duration=0.01)
+    engine = PlaybackEngine(player, idle_timeout=0.05)
+    assert not engine.running
+
+    engine.enqueue(clip("one"))
+    assert engine.running
+    assert engine.wait_idle(timeout=1)
+    deadline = time.monotonic() + 2
+    while engine.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not engine.running
+
+    engine.enqueue(clip("two"))
+    assert engine.wait_idle(timeout=1)
+    assert player.played == [b"one", b"two"]
+
+
+def play_until_interrupted(clip: SpeechClip, after: float = 0.2) -> float:
+    """Play a clip with the default player, interrupt it, and return how long it took to stop"""
+    engine = PlaybackEngine()
+    engine.enqueue(clip)
+    time.sleep(after)
+    interrupted = time.monotonic()
+    engine.interrupt()
+    assert engine.wait_idle(timeout=5)
+    assert engine.errors == []
+    return time.monotonic() - interrupted
+
+
+def test_mp3_is_decoded_and_can_be_interrupted(monkeypatch):
+    """Test that an MP3 clip plays as decoded PCM and stops part way through when interrupted"""
+    speakers = fake_speaker_manager()
+    monkeypatch.setattr(playback, "get_audio_manager", lambda: speakers)
+    monkeypatch.setattr(playback, "MP3_DECODER", "ffmpeg")
+    pcm = bytes(10 * playback.MP3_RATE * 2)  # ten seconds of silence
+    decoded = []
+    monkeypatch.setattr(playback, "decode_mp3", lambda data: decoded.append(data) or pcm)
+
+    assert play_until_interrupted(SpeechClip(b"mp3 data", ".mp3")) < 1
+    assert decoded == [b"mp3 data"]
+    played = speakers.pa.speakers[0].played
+    assert 0 < len(played) < len(pcm)
+
+
+def test_fallback_player_process_is_killed_on_interrupt(monkeypatch):
+    """Test that without a decoder the playsound child process is killed when interrupted"""
+    monkeypatch.setattr(playback, "MP3_DECODER", None)
+    monkeypatch.setattr(playback, "PLAYSOUND_SCRIPT", "import time; time.sleep(30)")
+    paths = []
+    named_temporary_file = playback.tempfile.NamedTemporaryFile
+
+    def recording_temporary_file(**kwargs):
+        fp = named_temporary_file(**kwargs)
+        paths.append(fp.name)
+        return fp
+    monkeypatch.setattr(playback.tempfile, "NamedTemporaryFile", recording_temporary_file)
+
+    assert play_until_interrupted(SpeechClip(b"mp3 data", ".mp3"), after=0.5) < 1
+    assert len(paths) == 1 and not os.path.exists(paths[0])
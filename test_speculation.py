@@ -0,0 +1,50 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from speculation import Speculation
+
+
+def test_same_input_reuses_the_running_computation():
+    """Test that repeated updates with unchanged input do not recompute"""
+    calls = []
+    speculation = Speculation(lambda value: calls.append(value) or value.upper())
+    first = speculation.update("headache")
+    assert speculation.update("headache") is first
+    assert first.result(5) == "HEADACHE"
+    assert calls == ["headache"]
+    assert speculation.result_for("headache") is first
+
+
+def test_new_input_discards_stale_results():
+    """Test that only the latest input's result is ever handed out"""
+    release = threading.Event()
+
+    def compute(value):
+        release.wait(5)
+        return value
+
+    speculation = Speculation(compute, executor=ThreadPoolExecutor(max_workers=1))
+    running = speculation.update("headache")
+    queued = speculation.update("headache and fever")
+    latest = speculation.update("headache and fever and rash")
+    release.set()
+
+    assert queued.cancelled()  # never started
+    assert running.result(5) == "headache"  # finished, but no longer offered
+    assert speculation.result_for("headache") is None
+    assert speculation.result_for("headache and fever and rash") is latest
+    assert latest.result(5) == "headache and fever and rash"
+    assert speculation.discarded == 2
+
+    speculation.reset()
+    assert speculation.result_for("headache and fever and rash") is None
+
+
+def test_speculation_has_its_own_pool():
+    """Test that speculative work cannot occupy the task pool that serves users' requests"""
+    from speculation import get_speculation_executor
+    from task_graph import get_task_executor
+
+    speculation = Speculation(lambda value: value)
+    assert speculation.executor is get_speculation_executor()
+    assert speculation.executor is not get_task_executor()
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+import speech_recognition as sr
+from speech_backends import (SpeechClip, SpeechToText, TextToSpeech, get_stt, get_tts, register_stt_backend,
+                             register_tts_backend)
+
+RATE = 16000
+
+
+class ToneTextToSpeech(TextToSpeech):
+    """Deterministic local synthesizer: one 100 ms tone per word, pitch from word length"""
+
+    def synthesize(self, text: str) -> SpeechClip:
+        t = np.arange(RATE // 10) / RATE
+        tones = [np.sin(2 * np.pi * 100 * len(word) * t) for word in text.split()]
+        samples = (8000 * np.concatenate(tones)).astype("<i2") if tones else np.zeros(0, "<i2")
+        return SpeechClip(samples.tobytes(), ".pcm")
+
+
+class ToneSpeechToText(SpeechToText):
+    """Inverse of ToneTextToSpeech, so the voice loop can round-trip offline"""
+
+    def recognize(self, audio: sr.AudioData) -> str:
+        samples = np.frombuffer(audio.get_raw_data(), dtype="<i2")
+        if not samples.any():
+            raise sr.UnknownValueError()
+        words = samples[:len(samples) // (RATE // 10) * (RATE // 10)].reshape(-1, RATE // 10)
+        lengths = [round(np.argmax(np.abs(np.fft.rfft(w))) * 10 / 100) for w in words]
+        return " ".join("x" * n for n in lengths)
+
+
+def test_defaults_are_google_backends():
+    """Test that Google recognition and gTTS stay the defaults"""
+    assert type(get_stt()).__name__ == "GoogleSpeechToText"
+    assert type(get_tts()).__name__ == "GTTSTextToSpeech"
+
+
+def test_unknown_backend_is_rejected():
+    """Test that a misconfigured deployment fails clearly"""
+    with pytest.raises(ValueError, match="Unknown speech-to-text backend"):
+        get_stt("does-not-exist")
+
+
+def test_local_backends_round_trip_without_network():
+    """Test a deterministic offline voice loop through registered local backends"""
+    register_tts_backend("tone", ToneTextToSpeech)
+    register_stt_backend("tone", ToneSpeechToText)
+    assert get_tts("tone") is get_tts("tone")
+
+    clip = get_tts("tone").synthesize("my head hurts")
+    audio = sr.AudioData(clip.data, RATE, 2)
+    assert get_stt("tone").recognize(audio) == "xx xxxx xxxxx"
+
+    with pytest.raises(sr.UnknownValueError):
+        get_stt("tone").recognize(sr.AudioData(bytes(3200), RATE, 2))
+
+
+def test_sphinx_backend_recognizes_offline():
+    """Test the PocketSphinx backend when it is installed"""
+    pytest.importorskip("pocketsphinx")
+    try:
+        assert isinstance(get_stt("sphinx").recognize(sr.AudioData(bytes(RATE * 2), RATE, 2)), str)
+    except sr.UnknownValueError:
+        pass
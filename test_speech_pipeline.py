@@ -0,0 +1,66 @@
+import time
+from gemini_client import GeminiClient
+from fake_gemini import FakeGeminiServer
+from speech_pipeline import SentenceSplitter, SpeechPipeline
+
+MOCK_REPLY = "You likely have a migraine (Migraine). Rest in a dark room. Take ibuprofen if needed."
+
+
+def test_sentence_splitter():
+    """Test that sentences are released only once complete"""
+    splitter = SentenceSplitter()
+    assert splitter.feed("You likely have a mig") == []
+    assert splitter.feed("raine. Rest in a ") == ["You likely have a migraine."]
+    assert splitter.feed("dark room! Take") == ["Rest in a dark room!"]
+    assert splitter.flush() == ["Take"]
+    assert splitter.flush() == []
+
+
+def test_pipeline_speaks_sentences_in_order():
+    """Test that every sentence is synthesized and played in order"""
+    played = []
+    pipeline = SpeechPipeline(synthesize=lambda text: text.upper(), play=played.append)
+    for word in MOCK_REPLY.split(" "):
+        pipeline.feed(word + " ")
+    pipeline.close()
+    pipeline.wait(timeout=5)
+
+    assert played == [sentence.upper() for sentence in
+                      ["You likely have a migraine (Migraine).", "Rest in a dark room.", "Take ibuprofen if needed."]]
+    assert pipeline.errors == []
+
+
+def test_first_audio_starts_before_generation_ends():
+    """Test that playback of the first sentence overlaps the rest of the stream"""
+    events = []
+    pipeline = SpeechPipeline(synthesize=lambda text: text,
+                              play=lambda clip: events.append(("play", time.monotonic())))
+
+    with FakeGeminiServer(reply=lambda payload: MOCK_REPLY, chunk_size=2, chunk_delay=0.05) as server:
+        client = GeminiClient(api_key="test-key", base_url=server.base_url)
+        for chunk in client.stream_generate_content({"contents": []}):
+            pipeline.feed(chunk)
+        stream_done = time.monotonic()
+    pipeline.close()
+    pipeline.wait(timeout=5)
+
+    assert len(events) == 3
+    assert events[0][1] < stream_done
+
+
+def test_pipeline_collects_errors():
+    """Test that a failing synthesis does not stop later sentences"""
+    played = []
+
+    def synthesize(text):
+        if text.startswith("Rest"):
+            raise RuntimeError("synthesis failed")
+        return text
+
+    pipeline = SpeechPipeline(synthesize=synthesize, play=played.append)
+    pipeline.feed(MOCK_REPLY)
+    pipeline.close()
+    pipeline.wait(timeout=5)
+
+    assert len(played) == 2
+    assert len(pipeline.errors) == 1
@@ -0,0 +1,100 @@
+import threading
+import time
+import numpy as np
+import speech_recognition as sr
+from concurrent.futures import ThreadPoolExecutor
+from streaming_stt import StreamingTranscriber
+
+RATE = 16000
+CHUNK = 1024
+
+
+def word(seconds: float = 0.5, frequency: float = 220) -> np.ndarray:
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (6000 * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
+
+
+def pause(seconds: float) -> np.ndarray:
+    return np.random.default_rng(0).normal(0, 30, int(seconds * RATE)).astype(np.int16)
+
+
+class FakeRecognizer:
+    """Local recognizer that names each segment by its dominant pitch"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, audio: sr.AudioData) -> str:
+        with self.lock:
+            self.calls.append(time.monotonic())
+        time.sleep(self.delay)
+        samples = np.frombuffer(audio.get_raw_data(), dtype="<i2")
+        spectrum = np.abs(np.fft.rfft(samples))
+        return f"{round(np.argmax(spectrum) * RATE / len(samples), -1):.0f}hz"
+
+
+def stream(transcriber: StreamingTranscriber, samples: np.ndarray):
+    for start in range(0, len(samples), CHUNK):
+        transcriber.feed(samples[start:start + CHUNK].tobytes())
+
+
+def test_segments_are_transcribed_while_speaking():
+    """Test that segments cut at pauses are recognized before the patient stops"""
+    recognizer = FakeRecognizer()
+    transcriber = StreamingTranscriber(recognizer, RATE, pause_seconds=0.3, executor=ThreadPoolExecutor(2))
+    utterance = np.concatenate([word(frequency=200), pause(0.5), word(frequency=400), pause(0.5),
+                                word(frequency=800), pause(0.1)])
+    stream(transcriber, utterance)
+    # Both finished segments were handed to the recognizer before the patient stopped
+    assert len(transcriber.futures) == 2
+    for future in transcriber.futures:
+        future.result(timeout=5)
+    assert len(recognizer.calls) == 2
+    assert transcriber.finish() == "200hz 400hz 800hz"
+
+
+def test_transcript_keeps_segment_order():
+    """Test that slow early segments still come first in the stitched transcript"""
+    recognizer = FakeRecognizer(delay=0.05)
+    transcriber = StreamingTranscriber(recognizer, RATE, pause_seconds=0.3, executor=ThreadPoolExecutor(4))
+    utterance = np.concatenate([np.concatenate([word(frequency=f), pause(0.4)]) for f in (300, 600, 900)])
+    stream(transcriber, utterance)
+
+    assert transcriber.finish() == "300hz 600hz 900hz"
+    assert transcriber.partial_transcript() == "300hz 600hz 900hz"
+
+
+def test_silence_only_raises_unknown_value():
+    """Test that a recording without speech is reported as unrecognized"""
+    recognizer = FakeRecognizer()
+    transcriber = StreamingTranscriber(recognizer, RATE, executor=ThreadPoolExecutor(1))
+    stream(transcriber, pause(2.0))
+
+    try:
+        transcriber.finish()
+        assert False, "expected UnknownValueError"
+    except sr.UnknownValueError:
+        pass
+    assert recognizer.calls == []
+
+
+def test_segment_audio_is_bounded_and_accounted():
+    """Test that the segment being captured counts in the audio stats, spills past the cap and is freed"""
+    from audio_buffer import audio_memory_stats
+
+    before = audio_memory_stats()
+    recognizer = FakeRecognizer()
+    transcriber = StreamingTranscriber(recognizer, RATE, pause_seconds=0.3, max_segment_seconds=2,
+                                       executor=ThreadPoolExecutor(1), memory_cap=16 * 1024)
+    assert audio_memory_stats()["buffers"] == before["buffers"] + 1
+
+    # A long unbroken word spills to disk and is cut at the segment cap rather than held whole
+    stream(transcriber, word(seconds=1, frequency=500))
+    assert audio_memory_stats()["spilled_bytes"] > before["spilled_bytes"]
+    stream(transcriber, np.concatenate([word(seconds=4, frequency=500), pause(0.5)]))
+    assert transcriber._segment.length <= transcriber._segment.max_bytes
+    assert transcriber._segment.dropped == 0
+    assert transcriber.finish().startswith("500hz")
+    assert audio_memory_stats() == before
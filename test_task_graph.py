@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+from task_graph import TaskGraph
+
+
+def sleep_then(value, seconds=0.1):
+    time.sleep(seconds)
+    return value
+
+
+def test_dependents_receive_results_and_branches_overlap():
+    """Test that wall time is the longest chain, not the sum of the tasks"""
+    graph = TaskGraph()
+    started = time.perf_counter()
+    graph.add("diagnosis", sleep_then, args=({"risk_rating": 3}, 0.2))
+    graph.add("background", sleep_then, args=("independent", 0.2))
+    graph.add("save", lambda diagnosis: sleep_then(("saved", diagnosis["risk_rating"])), deps=("diagnosis",))
+    graph.add("summary", lambda diagnosis: sleep_then(("pdf", diagnosis["risk_rating"])), deps=("diagnosis",))
+
+    assert graph.result("save", timeout=5) == ("saved", 3)
+    assert graph.result("summary", timeout=5) == ("pdf", 3)
+    assert graph.result("background") == "independent"
+    # Sequentially this would take 0.7s; the longest chain is 0.3s
+    assert time.perf_counter() - started < 0.55
+
+
+def test_multiple_dependencies_are_passed_in_order():
+    graph = TaskGraph()
+    graph.add("a", lambda: 1)
+    graph.add("b", sleep_then, args=(2, 0.05))
+    graph.add("sum", lambda a, b: (a, b), deps=("a", "b"))
+    assert graph.result("sum", timeout=5) == (1, 2)
+
+
+def test_failure_propagates_downstream():
+    """Test that tasks after a failed one fail with its error instead of running"""
+    ran = []
+
+    def fail():
+        raise RuntimeError("service down")
+
+    graph = TaskGraph()
+    graph.add("diagnosis", fail)
+    graph.add("save", lambda diagnosis: ran.append(diagnosis), deps=("diagnosis",))
+    graph.add("other", lambda: "ok")
+
+    with pytest.raises(RuntimeError, match="service down"):
+        graph.result("save", timeout=5)
+    assert ran == []
+    assert graph.result("other", timeout=5) == "ok"
+    assert sorted(graph.as_completed(timeout=5)) == ["diagnosis", "other", "save"]
+
+
+def test_unknown_or_duplicate_tasks_are_rejected():
+    graph = TaskGraph()
+    graph.add("a", lambda: 1)
+    with pytest.raises(ValueError):
+        graph.add("a", lambda: 2)
+    with pytest.raises(ValueError):
+        graph.add("b", lambda x: x, deps=("missing",))
+
+
+def test_existing_futures_can_be_depended_on():
+    """Test that work started elsewhere, even if cancelled, feeds the graph"""
+    from concurrent.futures import CancelledError, Future
+
+    ready = Future()
+    graph = TaskGraph()
+    graph.add_future("diagnosis", ready)
+    graph.add("save", lambda diagnosis: diagnosis * 2, deps=("diagnosis",))
+    ready.set_result(21)
+    assert graph.result("save", timeout=5) == 42
+
+    cancelled = Future()
+    cancelled.cancel()
+    graph = TaskGraph()
+    graph.add_future("diagnosis", cancelled)
+    graph.add("save", lambda diagnosis: diagnosis, deps=("diagnosis",))
+    with pytest.raises(CancelledError):
+        graph.result("save", timeout=5)
@@ -0,0 +1,83 @@
+from speech_backends import SpeechClip, TextToSpeech
+from tts_cache import TTSCache
+
+GREETING = "Hello, I'm your AI doctor today. What brings you in today?"
+
+
+class CountingTextToSpeech(TextToSpeech):
+    language = "en"
+
+    def __init__(self):
+        self.calls = []
+
+    def synthesize(self, text: str) -> SpeechClip:
+        self.calls.append(text)
+        return SpeechClip(text.encode() * 10, ".mp3")
+
+
+def make_cache(tmp_path, **kwargs):
+    kwargs.setdefault("directory", str(tmp_path))
+    return TTSCache(backend="counting", tts=kwargs.pop("tts", CountingTextToSpeech()), **kwargs)
+
+
+def test_repeated_phrase_is_synthesized_once(tmp_path):
+    """Test that a repeated phrase is served from memory"""
+    cache = make_cache(tmp_path)
+    first = cache.synthesize(GREETING)
+    second = cache.synthesize("  Hello, I'm your AI doctor today.  What brings you in today? ")
+
+    assert first == second
+    assert cache.tts.calls == [GREETING]
+    assert cache.stats()["hits"] == 1
+
+
+def test_key_includes_language_and_voice(tmp_path):
+    """Test that the same text in another voice is a different clip"""
+    cache = make_cache(tmp_path)
+    key = cache.key(GREETING)
+    cache.tts.voice = "female"
+    assert cache.key(GREETING) != key
+
+
+def test_memory_tier_evicts_by_size(tmp_path):
+    """Test that the memory tier stays under its byte budget"""
+    cache = make_cache(tmp_path, directory="", max_memory_bytes=1000)
+    for i in range(20):
+        cache.synthesize(f"Sentence number {i}.")
+    assert cache.stats()["memory_bytes"] <= 1000
+    assert cache.get("Sentence number 0.") is None
+
+
+def test_disk_tier_and_warm_up(tmp_path):
+    """Test that warmed phrases survive a restart without another synthesis call"""
+    make_cache(tmp_path).warm_async([GREETING]).join()
+
+    tts = CountingTextToSpeech()
+    restarted = make_cache(tmp_path, tts=tts)
+    assert restarted.synthesize(GREETING).data == GREETING.encode() * 10
+    assert tts.calls == []
+    assert restarted.stats()["disk_hits"] == 1
+    assert restarted.warm_async([GREETING]) is not None
+    assert restarted.warm_async([GREETING]) is None
+
+
+def test_disk_tier_size_cap(tmp_path):
+    """Test that the oldest clips are deleted past the disk budget"""
+    cache = make_cache(tmp_path, max_disk_bytes=1500)
+    cache.warm([f"Sentence number {i}." for i in range(10)])
+    assert cache.stats()["disk_bytes"] <= 1500
+    assert len(list(tmp_path.iterdir())) == cache.stats()["disk_entries"]
+
+
+def test_only_fixed_phrases_reach_disk(tmp_path):
+    """Test that sentences spoken to a patient stay in memory and warmed phrases are private files"""
+    directory = tmp_path / "tts"
+    cache = make_cache(tmp_path, directory=str(directory))
+    cache.synthesize("Your chest pain started two days ago.")
+    assert list(directory.iterdir()) == []
+
+    cache.warm([GREETING])
+    files = list(directory.iterdir())
+    assert len(files) == 1
+    assert directory.stat().st_mode & 0o777 == 0o700
+    assert files[0].stat().st_mode & 0o777 == 0o600
@@ -0,0 +1,69 @@
+import io
+import tempfile
+import wave
+
+import numpy as np
+import pytest
+
+import voice
+from fake_audio import fake_microphone_manager
+
+
+@pytest.fixture
+def microphone(monkeypatch):
+    """Point the recorder at a fake device; call with FakeMicrophone options"""
+    def install(**stream_options):
+        manager = fake_microphone_manager(**stream_options)
+        monkeypatch.setattr(voice, "get_audio_manager", lambda: manager)
+        monkeypatch.setattr(voice, "STREAMING_TRANSCRIPTION", False)
+        return manager
+    return install
+
+
+def test_overflow_is_tolerated_and_device_failure_ends_recording(microphone):
+    """Test that an overflowed read keeps recording and a failing stream stops it with the error kept"""
+    microphone(overflow_at=2, fail_at=5)
+    recorder = voice.AudioRecorder()
+    recorder.start_recording()
+    recorder.record_thread.join(timeout=5)
+
+    assert not recorder.record_thread.is_alive()
+    assert not recorder.is_recording
+    assert isinstance(recorder.error, OSError) and "Stream closed" in str(recorder.error)
+    assert recorder.buffer.length == 5 * voice.CHUNK * voice.SAMPLE_WIDTH
+    # The noise captured before the failure is still handled like any other recording
+    assert recorder.stop_recording() == "Speech could not be recognized"
+    assert recorder.buffer is None
+
+    recorder.start_recording()
+    assert recorder.error is None
+    recorder.stop_recording()
+
+
+def test_recording_becomes_in_memory_audio(microphone, monkeypatch):
+    """Test that captured frames reach the recognizer as trimmed in-memory audio, with no temporary file"""
+    rate = voice.RATE
+    t = np.arange(rate) / rate
+    speech = (6000 * np.sin(2 * np.pi * 300 * t)).astype(np.int16)
+    microphone(audio=np.concatenate([np.zeros(rate // 2, dtype=np.int16), speech]))
+
+    def no_temp_files(*args, **kwargs):
+        raise AssertionError("recording used a temporary file")
+    for name in ("NamedTemporaryFile", "TemporaryFile", "mkstemp"):
+        monkeypatch.setattr(tempfile, name, no_temp_files)
+    heard = []
+    monkeypatch.setattr(voice, "recognize_speech", lambda audio: heard.append(audio) or "I have a headache")
+
+    recorder = voice.AudioRecorder()
+    recorder.start_recording()
+    recorder.record_thread.join(timeout=10)
+    assert recorder.auto_stopped  # ended by the trailing silence
+    assert recorder.stop_recording() == "I have a headache"
+
+    audio = heard[0]
+    assert audio.sample_rate == rate and audio.sample_width == voice.SAMPLE_WIDTH
+    # Leading and trailing silence is trimmed, keeping about the second of speech
+    assert 0.8 * rate < len(audio.get_raw_data()) // voice.SAMPLE_WIDTH < 1.6 * rate
+    with wave.open(io.BytesIO(audio.get_wav_data())) as wav:
+        assert wav.getframerate() == rate
+        assert wav.getnchannels() == voice.CHANNELS
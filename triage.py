@@ -0,0 +1,88 @@
+"""Doctor turns and symptom analyses, independent of any UI.
+
+Builds the Gemini requests for the doctor's next turn and for a symptom
+analysis, and turns the replies (or failures) into the shapes the app shows
+and stores. Shared by the Streamlit app and the headless diagnosis service.
+"""
+from typing import Optional, Tuple
+
+from conversation import ConversationContext
+from diagnosis import parse_diagnosis
+from gemini_client import extract_text
+
+# The doctor switches to giving a diagnosis from this many patient turns on
+DIAGNOSIS_AFTER_TURNS = 3
+
+DOCTOR_RETRY_REPLY = "I apologize, but I'm having trouble processing your response. Could you please repeat that?"
+DOCTOR_ERROR_REPLY = ("I apologize, but I'm experiencing some technical difficulties. "
+                      "Please try again or describe your symptoms in text.")
+
+
+def build_doctor_payload(conversation_history: list, context: Optional[ConversationContext] = None) -> dict:
+    """Build the Gemini request for the doctor's next turn"""
+    # Bring the bounded context up to date with any new turns
+    if context is None:
+        context = ConversationContext()
+    context.sync(conversation_history)
+
+    # Count patient responses to track conversation stage
+    patient_responses = context.patient_turns
+
+    if patient_responses < DIAGNOSIS_AFTER_TURNS:
+        # Initial responses - ask key diagnostic questions
+        prompt = f"""You are a concise medical doctor. Based on the patient's symptoms, ask ONE critical follow-up question.
+        Focus on: severity, duration, or key distinguishing symptoms. Keep your response to 1-2 sentences maximum.
+
+        {context.render()}
+        """
+    else:
+        # Provide diagnosis
+        prompt = f"""You are a concise medical doctor. Based on the symptoms described, provide a clear diagnosis with:
+        1. Medical term (in parentheses)
+        2. Simple explanation in everyday language
+        3. One key recommendation
+
+        Keep the entire response under 4 short sentences. Be direct and clear.
+
+        {context.render()}
+        """
+
+    return {
+        "contents": [{
+            "parts": [{
+                "text": prompt
+            }]
+        }]
+    }
+
+
+def doctor_reply(data: dict) -> str:
+    """The doctor's text from a Gemini response, or a request to repeat if it has none"""
+    text = extract_text(data)
+    return text if text is not None else DOCTOR_RETRY_REPLY
+
+
+def unavailable_diagnosis(reason: str) -> dict:
+    return {
+        "reasons": [reason],
+        "risk_rating": 0,
+        "life_threatening": "Assessment unavailable"
+    }
+
+
+def diagnosis_from_response(data: dict) -> Tuple[dict, Optional[str]]:
+    """Parse a symptom analysis response, returning the diagnosis and an error message if it had none"""
+    response_text = extract_text(data)
+    if response_text is None:
+        return (unavailable_diagnosis("Unable to analyze symptoms. Please try again or contact support."),
+                "Unable to get a response from the AI service. Please try again.")
+    return parse_diagnosis(response_text), None
+
+
+def failed_diagnosis(error: Exception, connection: bool) -> Tuple[dict, str]:
+    """The diagnosis and error message shown when an analysis could not be run"""
+    if connection:
+        return (unavailable_diagnosis("Unable to process symptoms. Please try again later."),
+                f"Error connecting to the AI service: {str(error)}")
+    return (unavailable_diagnosis("System error. Please try again or contact support."),
+            f"An unexpected error occurred: {str(error)}")
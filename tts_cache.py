@@ -0,0 +1,186 @@
+"""Content-addressed cache of synthesized speech.
+
+Clips are keyed on the backend, language, voice and text. Recent clips live in
+an in-memory tier bounded by total bytes. Fixed phrases such as the greeting are
+warmed at server start so they play without a synthesis call, and only those
+are also written to a disk tier that survives restarts; sentences spoken to a
+particular patient stay in memory. The disk tier lives in a directory readable
+by the app's user only.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from app_data import APP_DATA_DIR, private_dir
+from speech_backends import TTS_BACKEND, SpeechClip, TextToSpeech, get_tts
+
+TTS_CACHE_MEMORY_BYTES = int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+TTS_CACHE_DISK_BYTES = int(os.getenv("TTS_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(APP_DATA_DIR, "tts_cache"))
+
+logger = logging.getLogger(__name__)
+
+
+def clip_key(text: str, backend: str, language: str, voice: str) -> str:
+    parts = [backend, language, voice, " ".join(text.split())]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+
+class TTSCache:
+    def __init__(self, backend: str = TTS_BACKEND, tts: TextToSpeech = None, directory: str = TTS_CACHE_DIR,
+                 max_memory_bytes: int = TTS_CACHE_MEMORY_BYTES, max_disk_bytes: int = TTS_CACHE_DISK_BYTES):
+        self.backend = backend
+        self.tts = tts or get_tts(backend)
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self._memory = OrderedDict()
+        self._disk = OrderedDict()  # key -> (filename, size), oldest first
+        self._lock = threading.Lock()
+        self._warming = set()
+
+        if self.directory:
+            private_dir(self.directory)
+            entries = [e for e in os.scandir(self.directory) if e.is_file()]
+            for entry in sorted(entries, key=lambda e: e.stat().st_mtime):
+                if entry.name.endswith(".tmp"):
+                    continue
+                self._disk[entry.name.split(".", 1)[0]] = (entry.name, entry.stat().st_size)
+                self.disk_bytes += entry.stat().st_size
+
+    def key(self, text: str) -> str:
+        return clip_key(text, self.backend, getattr(self.tts, "language", ""), getattr(self.tts, "voice", "default"))
+
+    def _remember(self, key: str, clip: SpeechClip):
+        if key in self._memory:
+            self.memory_bytes -= len(self._memory.pop(key).data)
+        self._memory[key] = clip
+        self.memory_bytes += len(clip.data)
+        while self.memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self.memory_bytes -= len(evicted.data)
+
+    def _write_disk(self, key: str, clip: SpeechClip):
+        filename = key + clip.suffix
+        path = os.path.join(self.directory, filename)
+        temp_path = path + ".tmp"
+        with os.fdopen(os.open(temp_path, os.O_CREAT | os.O_TRUNC | os.O_WRONLY, 0o600), 'wb') as f:
+            f.write(clip.data)
+        os.replace(temp_path, path)
+        if key in self._disk:
+            self.disk_bytes -= self._disk.pop(key)[1]
+        self._disk[key] = (filename, len(clip.data))
+        self.disk_bytes += len(clip.data)
+        while self.disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+            _, (oldest, size) = self._disk.popitem(last=False)
+            self.disk_bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, oldest))
+            except FileNotFoundError:
+                pass
+
+    def _read_disk(self, key: str) -> Optional[SpeechClip]:
+        if key not in self._disk:
+            return None
+        filename, size = self._disk[key]
+        try:
+            with open(os.path.join(self.directory, filename), 'rb') as f:
+                clip = SpeechClip(f.read(), filename[len(key):])
+            self._disk.move_to_end(key)
+            return clip
+        except FileNotFoundError:
+            del self._disk[key]
+            self.disk_bytes -= size
+            return None
+
+    def get(self, text: str) -> Optional[SpeechClip]:
+        key = self.key(text)
+        with self._lock:
+            clip = self._memory.get(key)
+            if clip is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return clip
+            if self.directory:
+                clip = self._read_disk(key)
+                if clip is not None:
+                    self._remember(key, clip)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return clip
+            self.misses += 1
+            return None
+
+    def put(self, text: str, clip: SpeechClip, persist: bool = False):
+        """Cache a clip in memory, and on disk too if ``persist`` (fixed phrases only, never patient-specific text)"""
+        key = self.key(text)
+        with self._lock:
+            self._remember(key, clip)
+            if persist and self.directory:
+                self._write_disk(key, clip)
+
+    def synthesize(self, text: str) -> SpeechClip:
+        """Return a cached clip for ``text``, synthesizing and storing it on a miss"""
+        clip = self.get(text)
+        if clip is None:
+            clip = self.tts.synthesize(text)
+            self.put(text, clip)
+        return clip
+
+    def warm(self, phrases: list):
+        """Synthesize any fixed phrases that are not cached yet and keep them on disk"""
+        for phrase in phrases:
+            if self.get(phrase) is None:
+                self.put(phrase, self.tts.synthesize(phrase), persist=True)
+
+    def warm_async(self, phrases: list) -> Optional[threading.Thread]:
+        """Warm phrases on a background thread, once per process for each phrase set"""
+        with self._lock:
+            token = tuple(phrases)
+            if token in self._warming:
+                return None
+            self._warming.add(token)
+        thread = threading.Thread(target=self._warm_quietly, args=(phrases,), daemon=True)
+        thread.start()
+        return thread
+
+    def _warm_quietly(self, phrases: list):
+        try:
+            self.warm(phrases)
+        except Exception as e:
+            logger.warning("TTS cache warm-up failed: %s", e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self.memory_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self.disk_bytes,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_tts_cache() -> TTSCache:
+    """Return the process-wide speech cache, creating it on first use"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TTSCache()
+    return _cache
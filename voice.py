@@ -0,0 +1,134 @@
+"""Voice stack for the consultation: microphone capture, recognition and synthesis.
+
+Importing this module loads the audio libraries (SpeechRecognition, NumPy and
+the speech backends), so the app only imports it the first time a voice
+feature is used and never in text-only deployments. PortAudio itself is
+loaded later still, when the first stream is opened.
+"""
+import os
+import threading
+
+import speech_recognition as sr
+
+from audio_buffer import AudioBuffer, max_recording_bytes
+from audio_devices import get_audio_manager
+from audio_processing import Endpointer, speech_bounds
+from speech_backends import SpeechClip, get_stt
+from streaming_stt import StreamingTranscriber
+from tts_cache import get_tts_cache
+
+# Transcribe speech segment by segment while the patient is still talking
+STREAMING_TRANSCRIPTION = os.getenv("STREAMING_TRANSCRIPTION", "1") == "1"
+
+# Audio recording parameters: 16-bit mono PCM
+CHUNK = 1024
+SAMPLE_WIDTH = 2
+CHANNELS = 1
+RATE = 44100
+
+# Preallocate room for this many seconds of audio (up to the session memory cap); the buffer doubles beyond that
+RECORD_PREALLOC_SECONDS = 30
+
+
+class AudioRecorder:
+    def __init__(self):
+        self.is_recording = False
+        self.auto_stopped = False
+        self.buffer = None
+        self.error = None
+
+    def start_recording(self):
+        self.is_recording = True
+        self.auto_stopped = False
+        self.error = None
+        self.sample_width = SAMPLE_WIDTH
+        self.endpointer = Endpointer(RATE)
+        # Either way the captured audio sits in an AudioBuffer, bounded per session and
+        # spilled to a memory-mapped file past the memory cap
+        self.transcriber = StreamingTranscriber(recognize_speech, RATE, self.sample_width) if STREAMING_TRANSCRIPTION else None
+        if self.transcriber is None:
+            self.buffer = AudioBuffer(max_recording_bytes(RATE, CHANNELS, self.sample_width),
+                                      initial_bytes=RATE * CHANNELS * self.sample_width * RECORD_PREALLOC_SECONDS)
+        self.stream = get_audio_manager().acquire_input(RATE, CHANNELS, self.sample_width, CHUNK)
+
+        # Start recording in a separate thread
+        self.record_thread = threading.Thread(target=self._record)
+        self.record_thread.start()
+
+    def _record(self):
+        try:
+            while self.is_recording:
+                # A late read loses the overflowed samples rather than the whole recording
+                data = self.stream.read(CHUNK, exception_on_overflow=False)
+                if self.transcriber is not None:
+                    self.transcriber.feed(data)
+                else:
+                    self.buffer.write(data)
+                # End the turn on trailing silence or when the hard duration cap is hit
+                if self.endpointer.update(data):
+                    self.auto_stopped = True
+                    self.is_recording = False
+        except Exception as e:
+            # Keep what was captured; the app reports the error once the turn is finished
+            self.error = e
+        finally:
+            self.is_recording = False
+
+    def stop_recording(self):
+        self.is_recording = False
+        if hasattr(self, 'record_thread'):
+            self.record_thread.join()
+
+        # Hand the stream back; PortAudio stays initialized for the next turn
+        get_audio_manager().release(self.stream)
+
+        # Most segments are already transcribed; wait for the last one and stitch them together
+        if self.transcriber is not None:
+            return finish_transcription(self.transcriber)
+
+        # Trim leading and trailing silence, copying out only the speech
+        samples = self.buffer.samples()
+        bounds = speech_bounds(samples, RATE)
+        del samples  # release the buffer export so the storage can be freed
+        if bounds is not None:
+            start, end = bounds
+            frame_data = self.buffer.read(start * self.sample_width, end * self.sample_width)
+        self.buffer.close()
+        self.buffer = None
+        if bounds is None:
+            return "Speech could not be recognized"
+        audio = sr.AudioData(frame_data, RATE, self.sample_width)
+
+        # Transcribe the recording
+        return transcribe_audio(audio)
+
+
+def synthesize_speech(text: str) -> SpeechClip:
+    """Synthesize text with the configured text-to-speech backend, reusing cached clips"""
+    return get_tts_cache().synthesize(text)
+
+
+def recognize_speech(audio: sr.AudioData) -> str:
+    """Recognize captured audio with the configured speech-to-text backend, raising on failure"""
+    return get_stt().recognize(audio)
+
+
+def transcribe_audio(audio: sr.AudioData):
+    """Transcribe captured audio with the configured speech-to-text backend"""
+    try:
+        text = recognize_speech(audio)
+        return text
+    except sr.UnknownValueError:
+        return "Speech could not be recognized"
+    except sr.RequestError:
+        return "Could not request results"
+
+
+def finish_transcription(transcriber: StreamingTranscriber):
+    """Collect the stitched transcript from a streaming transcriber"""
+    try:
+        return transcriber.finish()
+    except sr.UnknownValueError:
+        return "Speech could not be recognized"
+    except sr.RequestError:
+        return "Could not request results"